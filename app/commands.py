@@ -0,0 +1,126 @@
+"""
+Commands served over the /ws protocol. See app/protocol.py for the framing.
+"""
+
+import logging
+from datetime import date
+
+from app import data_access
+from app.protocol import CommandError, CommandRouter, argument
+
+logger = logging.getLogger("websocket_logger")
+
+router = CommandRouter()
+
+# Upper bounds on client-supplied result sizes
+MAX_SEARCH_RESULTS = 100
+MAX_CONTACT_PAGE = 500
+MAX_EVENTS = 500
+MAX_SUMMARIES = 100
+
+
+def _limit(args, name, default, maximum):
+    value = argument(args, name, int, default)
+    if not 1 <= value <= maximum:
+        raise CommandError("invalid_args", f"'{name}' must be between 1 and {maximum}")
+    return value
+
+
+def _date(args, name, required=False):
+    value = argument(args, name, str) if required else argument(args, name, str, None)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError("invalid_args", f"'{name}' must be a YYYY-MM-DD date")
+
+
+def _checked(page):
+    # ContactPage and EventList report database failures in .error
+    if not page.ok:
+        raise CommandError("failed", page.error)
+    return page
+
+
+async def set_server_running(state, running):
+    """
+    Start or stop the backend on every worker.
+
+    Every client is sent a server.state event if this changed it.
+
+    Returns:
+        bool: True if the state changed.
+    """
+    changed = await state.set_running(running)
+    if changed:
+        logger.info(
+            f"N.E.X.U.S.-Sever {'started' if running else 'stopped'} "
+            f"by N.E.X.U.S.-Client request."
+        )
+    return changed
+
+
+@router.command("server.status", requires_running=False)
+async def server_status(session, args):
+    return {
+        "running": session.state.running,
+        "clients": await session.state.client_count(),
+        "commands": router.commands,
+    }
+
+
+@router.command("server.stop", requires_running=False)
+async def server_stop(session, args):
+    return {"changed": await set_server_running(session.state, False)}
+
+
+@router.command("server.start", requires_running=False)
+async def server_start(session, args):
+    return {"changed": await set_server_running(session.state, True)}
+
+
+@router.command("contacts.search")
+async def contacts_search(session, args):
+    query = argument(args, "query", str)
+    limit = _limit(args, "limit", 10, MAX_SEARCH_RESULTS)
+    return _checked(await data_access.search_contacts(query, limit))
+
+
+@router.command("contacts.list")
+async def contacts_list(session, args):
+    after_id = argument(args, "after_id", int, None)
+    limit = _limit(args, "limit", 100, MAX_CONTACT_PAGE)
+    return _checked(await data_access.list_contacts(after_id, limit))
+
+
+@router.command("calendar.next")
+async def calendar_next(session, args):
+    n = _limit(args, "n", 5, MAX_EVENTS)
+    return _checked(await data_access.next_events(n, _date(args, "from_date")))
+
+
+@router.command("calendar.between")
+async def calendar_between(session, args):
+    start = _date(args, "start", required=True)
+    end = _date(args, "end", required=True)
+    if end < start:
+        raise CommandError("invalid_args", "'end' is before 'start'")
+    limit = _limit(args, "limit", MAX_EVENTS, MAX_EVENTS)
+    return _checked(await data_access.events_between(start, end, limit))
+
+
+@router.command("email.summary")
+async def email_summary(session, args):
+    limit = _limit(args, "limit", 10, MAX_SUMMARIES)
+    summaries = await data_access.recent_email_summaries(limit)
+    return {
+        "summaries": [
+            {
+                "message_id": entry["message_key"],
+                "summary": entry["result"],
+                "created_at": entry["created_at"],
+            }
+            for entry in summaries
+        ]
+    }
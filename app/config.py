@@ -0,0 +1,99 @@
+import os
+import sys
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.utils import parse_logger_levels
+
+
+def websocket_settings():
+    """
+    Return the WebSocket connection and keepalive settings.
+
+    Read at call time, after main.py has loaded nexus.env.
+
+    Returns:
+        dict: send_queue_size and send_timeout for the ConnectionManager,
+        ping_interval and ping_timeout for uvicorn's keepalive pings.
+    """
+    return {
+        "send_queue_size": int(os.getenv("WS_SEND_QUEUE_SIZE", "256")),
+        "send_timeout": float(os.getenv("WS_SEND_TIMEOUT", "10")),
+        "ping_interval": float(os.getenv("WS_PING_INTERVAL", "20")),
+        "ping_timeout": float(os.getenv("WS_PING_TIMEOUT", "20")),
+    }
+
+
+def database_access_settings():
+    """
+    Return the limits for database calls made from the server's handlers.
+
+    Returns:
+        dict: query_timeout, statement_timeout and max_pending, all read
+        from the loaded environment.
+    """
+    return {
+        # Seconds a handler waits for a free database thread plus the query
+        "query_timeout": float(os.getenv("SERVER_DB_QUERY_TIMEOUT", "10")),
+        # Seconds before PostgreSQL aborts a statement the handler gave up on
+        "statement_timeout": float(os.getenv("SERVER_DB_STATEMENT_TIMEOUT", "15")),
+        # Calls in flight before new ones are rejected outright
+        "max_pending": int(os.getenv("SERVER_DB_MAX_PENDING", "100")),
+    }
+
+
+def email_result_cache_path():
+    """Path of the SQLite result cache written by the email worker."""
+    return os.getenv(
+        "EMAIL_RESULT_CACHE_PATH",
+        "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management/result_cache.sqlite3",
+    )
+
+
+def logging_settings():
+    """
+    Return the server's logging settings for shared.utils.configure_logging.
+
+    LOG_LEVELS overrides single loggers, e.g.
+    "infrastructure_logger=WARNING,websocket_logger.messages=DEBUG".
+    """
+    return {
+        "level": os.getenv("LOG_LEVEL", "DEBUG").upper(),
+        "logger_levels": parse_logger_levels(os.getenv("LOG_LEVELS", "")),
+        # Client messages are logged at most this many times per second
+        "sample_rates": {
+            "websocket_logger.messages": float(os.getenv("LOG_MESSAGE_RATE", "5"))
+        },
+        "max_bytes": int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20))),
+        "backup_count": int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    }
+
+
+def server_settings():
+    """
+    Return where and how the server listens.
+
+    With SERVER_WORKERS above 1, each worker process binds its own socket
+    with SO_REUSEPORT and the kernel spreads connections across them; the
+    workers then need a shared SERVER_STATE_BACKEND such as "postgres".
+    A scrape of the shared port would reach a random worker, so worker N
+    instead serves its metrics, labelled worker="N", on
+    SERVER_METRICS_HOST at SERVER_METRICS_PORT + N; scrape each of them.
+
+    Returns:
+        dict: host, port, workers, reuse_port, state_backend,
+        state_channel, metrics_host and metrics_port.
+    """
+    workers = max(1, int(os.getenv("SERVER_WORKERS", "1")))
+    return {
+        "host": os.getenv("SERVER_HOST", "192.168.1.147"),
+        "port": int(os.getenv("SERVER_PORT", "8000")),
+        "workers": workers,
+        "reuse_port": os.getenv("SERVER_REUSE_PORT", "1" if workers > 1 else "0") == "1",
+        "state_backend": os.getenv(
+            "SERVER_STATE_BACKEND", "postgres" if workers > 1 else "memory"
+        ),
+        "state_channel": os.getenv("SERVER_STATE_CHANNEL", "nexus_server"),
+        "metrics_host": os.getenv("SERVER_METRICS_HOST", "127.0.0.1"),
+        "metrics_port": int(os.getenv("SERVER_METRICS_PORT", "9110")),
+    }
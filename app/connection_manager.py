@@ -0,0 +1,198 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from shared.metrics import counter, gauge, histogram
+
+logger = logging.getLogger("websocket_logger")
+
+CLIENTS = gauge("nexus_ws_clients", "Connected WebSocket clients.")
+FRAMES_SENT = counter("nexus_ws_frames_sent_total", "Frames written to clients.")
+EVICTIONS = counter(
+    "nexus_ws_evictions_total", "Clients disconnected for falling behind.", ["reason"]
+)
+SEND_SECONDS = histogram(
+    "nexus_ws_send_seconds", "Time to write one frame to a client socket."
+)
+QUEUE_SECONDS = histogram(
+    "nexus_ws_queue_seconds", "Time a frame waited in a client's send queue."
+)
+
+# Close codes sent to clients the server drops
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Tells a client's sender task to stop
+_STOP = object()
+
+
+class Client:
+    """
+    One connected WebSocket and its bounded queue of outgoing frames.
+
+    Frames are str (sent as text) or bytes (sent as binary). A single sender
+    task drains the queue, so handlers never await a slow socket themselves.
+    """
+
+    def __init__(self, client_id, websocket, send_queue_size):
+        self.id = client_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=send_queue_size)
+        self.sender = None
+        self.closed = False
+
+    def __repr__(self):
+        return f"<Client {self.id}>"
+
+
+class ConnectionManager:
+    """
+    Tracks live WebSocket clients and fans messages out to them.
+
+    send() and broadcast() only enqueue; they never wait on the network.
+    A client whose queue is full, or whose socket takes longer than
+    send_timeout to accept a frame, is a slow consumer and is disconnected
+    so it cannot hold back anyone else.
+    """
+
+    def __init__(self, send_queue_size=256, send_timeout=10.0):
+        self.send_queue_size = send_queue_size
+        self.send_timeout = send_timeout
+        self._clients = {}
+        self._ids = itertools.count(1)
+        self.evictions = 0
+        # Close handshakes of evicted clients, referenced until they finish
+        self._closing = set()
+
+    def __len__(self):
+        return len(self._clients)
+
+    @property
+    def clients(self):
+        return list(self._clients.values())
+
+    async def connect(self, websocket: WebSocket):
+        """Accept a WebSocket and start its sender task."""
+        await websocket.accept()
+        client = Client(next(self._ids), websocket, self.send_queue_size)
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self._clients[client.id] = client
+        CLIENTS.inc()
+        logger.info(f"{client} connected ({len(self._clients)} connected)")
+        return client
+
+    async def disconnect(self, client):
+        """Forget a client that has gone away and stop its sender task."""
+        if self._clients.pop(client.id, None) is None:
+            return
+        CLIENTS.dec()
+        client.closed = True
+        self._stop_sender(client)
+        if client.sender is not None:
+            await asyncio.gather(client.sender, return_exceptions=True)
+        logger.info(f"{client} disconnected ({len(self._clients)} connected)")
+
+    def send(self, client, message):
+        """
+        Queue a frame for one client.
+
+        Returns:
+            bool: False if the client is gone or was evicted for falling
+            behind.
+        """
+        if client.closed:
+            return False
+        try:
+            client.queue.put_nowait((message, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            self._evict(
+                client, "queue_full", f"send queue full ({self.send_queue_size} frames)"
+            )
+            return False
+
+    def broadcast(self, message, exclude=None):
+        """
+        Queue the same frame for every connected client.
+
+        The message is serialized once by the caller and shared by every
+        queue.
+
+        Returns:
+            int: The number of clients it was queued for.
+        """
+        delivered = 0
+        for client in list(self._clients.values()):
+            if client is not exclude and self.send(client, message):
+                delivered += 1
+        return delivered
+
+    async def close_all(self, code=CLOSE_GOING_AWAY):
+        for client in list(self._clients.values()):
+            self._clients.pop(client.id, None)
+            CLIENTS.dec()
+            client.closed = True
+            self._stop_sender(client)
+            await self._close(client, code, "Server shutting down")
+
+    def _stop_sender(self, client):
+        try:
+            client.queue.put_nowait(_STOP)
+        except asyncio.QueueFull:
+            client.sender.cancel()
+
+    def _evict(self, client, kind, reason):
+        if client.closed:
+            return
+        client.closed = True
+        self.evictions += 1
+        EVICTIONS.labels(reason=kind).inc()
+        if self._clients.pop(client.id, None) is not None:
+            CLIENTS.dec()
+        logger.warning(f"Disconnecting slow client {client}: {reason}")
+        if client.sender is not None and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+        task = asyncio.create_task(
+            self._close(client, CLOSE_TRY_AGAIN_LATER, "Client too slow")
+        )
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, client, code, reason):
+        if client.websocket.application_state != WebSocketState.CONNECTED:
+            return
+        try:
+            await asyncio.wait_for(
+                client.websocket.close(code=code, reason=reason), self.send_timeout
+            )
+        except Exception as e:
+            logger.debug(f"Closing {client} failed: {str(e)}")
+
+    async def _send_loop(self, client):
+        websocket = client.websocket
+        while True:
+            item = await client.queue.get()
+            if item is _STOP:
+                return
+            message, queued_at = item
+            started = time.perf_counter()
+            QUEUE_SECONDS.observe(started - queued_at)
+            send = websocket.send_bytes if isinstance(message, bytes) else websocket.send_text
+            try:
+                await asyncio.wait_for(send(message), self.send_timeout)
+                SEND_SECONDS.observe(time.perf_counter() - started)
+                FRAMES_SENT.inc()
+            except asyncio.TimeoutError:
+                self._evict(
+                    client, "send_timeout", f"send took longer than {self.send_timeout}s"
+                )
+                return
+            except Exception as e:
+                # The receive loop sees the disconnect and cleans up
+                logger.info(f"Sending to {client} failed: {str(e)}")
+                client.closed = True
+                return
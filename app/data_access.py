@@ -0,0 +1,125 @@
+"""
+Non-blocking access to the contact and calendar cores, and the email
+summaries, for the server.
+
+The cores use the blocking psycopg2 pool, so every call is run on the
+shared DatabaseExecutor rather than on the event loop. Each call has a
+timeout (asyncio.TimeoutError) and can be cancelled while it waits for a
+database thread; the server's pool sets statement_timeout so a query the
+handler gave up on is also stopped in PostgreSQL.
+"""
+
+import sys
+import threading
+
+# Make the shared package, the autonomy core and the email results importable
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core")
+sys.path.append(
+    "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management"
+)
+from shared.infrastructure import get_async_pool, get_db_executor, get_pool
+from app.config import database_access_settings, email_result_cache_path
+
+from calendar_services import calendar_service
+from contact_management import contact_search, contact_service
+from result_cache import ResultCache
+
+
+def database_pool():
+    """
+    Return the blocking pool with the server's statement_timeout.
+
+    The first caller's settings win, so the server opens its pools through
+    here before any core touches them.
+    """
+    return get_pool(statement_timeout=database_access_settings()["statement_timeout"])
+
+
+def async_database_pool():
+    return get_async_pool(
+        statement_timeout=database_access_settings()["statement_timeout"]
+    )
+
+
+def database_executor():
+    settings = database_access_settings()
+    database_pool()
+    return get_db_executor(
+        max_pending=settings["max_pending"], timeout=settings["query_timeout"]
+    )
+
+
+def apply_schema_migrations():
+    """
+    Apply the idempotent schema migrations the server's queries rely on,
+    then start building the contact search index.
+
+    Run in a thread at server startup; it is not bounded by the query
+    timeout, and workers starting together take turns.
+    """
+    database_pool()
+    contact_search.ensure_search_schema()
+    calendar_service.ensure_event_schema()
+    contact_search.refresh_search_index()
+
+
+async def run_blocking(func, *args, timeout=None, **kwargs):
+    """Run a blocking core function on a database thread."""
+    return await database_executor().run(func, *args, timeout=timeout, **kwargs)
+
+
+async def search_contacts(query, limit=10, timeout=None):
+    """Ranked contact search; see contact_search.search_contacts_ranked."""
+    return await run_blocking(
+        contact_search.search_contacts_ranked, query, limit, timeout=timeout
+    )
+
+
+async def list_contacts(after_id=None, limit=None, columns=None, timeout=None):
+    """One keyset page of contacts; see contact_service.list_contacts."""
+    return await run_blocking(
+        contact_service.list_contacts,
+        after_id=after_id,
+        limit=limit or contact_service.CONTACT_PAGE_SIZE,
+        columns=columns,
+        timeout=timeout,
+    )
+
+
+async def view_contact(contact_id, timeout=None):
+    return await run_blocking(contact_service.view_contact, contact_id, timeout=timeout)
+
+
+async def next_events(n, from_date=None, timeout=None):
+    """The next n events; see calendar_service.next_n_events."""
+    return await run_blocking(
+        calendar_service.next_n_events, n, from_date, timeout=timeout
+    )
+
+
+async def events_between(start, end, limit=None, timeout=None):
+    """Events in a date range; see calendar_service.events_between."""
+    return await run_blocking(
+        calendar_service.events_between, start, end, limit, timeout=timeout
+    )
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def email_result_cache():
+    """Return the result cache the email worker stores its summaries in."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(email_result_cache_path())
+        return _result_cache
+
+
+async def recent_email_summaries(limit=10, timeout=None):
+    """The newest email summaries written by the email worker."""
+    return await run_blocking(
+        lambda: email_result_cache().recent_results("summary", limit), timeout=timeout
+    )
@@ -1,51 +1,83 @@
 import logging
+import multiprocessing
 import os
+import signal
+import socket
 import sys
 import psycopg2
 import asyncio
-import random
 from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.websockets import WebSocketDisconnect
 from fastapi import BackgroundTasks
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.infrastructure import (
+    close_all_async_pools,
+    close_all_pools,
+    shutdown_db_executors,
+)
+from shared.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from shared.metrics import counter, render as render_metrics
+from shared.metrics import set_constant_labels, start_metrics_server
+from shared.utils import configure_logging
+from app.config import logging_settings, server_settings, websocket_settings
+
 # Load environment variables
 load_dotenv(
     dotenv_path="/home/ncacord/N.E.X.U.S.-Server/nexus.env", verbose=True, override=True
 )
 
-# Configure logging
-log_file = "/home/ncacord/N.E.X.U.S.-Server/app/logs/websocket_server.log"
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-logging.basicConfig(
-    filename=log_file,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+# Configure logging; each worker process of a multi-worker server has its
+# own file so rotation never races
+worker_index = os.getenv("NEXUS_SERVER_WORKER")
+log_file = (
+    "/home/ncacord/N.E.X.U.S.-Server/app/logs/websocket_server.log"
+    if worker_index is None
+    else f"/home/ncacord/N.E.X.U.S.-Server/app/logs/websocket_server.worker-{worker_index}.log"
 )
+os.makedirs(os.path.dirname(log_file), exist_ok=True)
+configure_logging(log_file, **logging_settings())
 logger = logging.getLogger("websocket_logger")
+# Client message contents, rate-limited by the sampling in logging_settings()
+message_logger = logging.getLogger("websocket_logger.messages")
+
+# Imported once logging is configured: the cores set up logging on import
+from app.commands import router, set_server_running
+from app.connection_manager import ConnectionManager
+from app.data_access import (
+    apply_schema_migrations,
+    async_database_pool,
+    database_pool,
+)
+from app.protocol import Session
+from app.shared_state import ServerState, create_state_backend
 
-# Database connection details
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
+FRAMES_RECEIVED = counter(
+    "nexus_ws_frames_received_total", "Frames received from clients.", ["format"]
+)
 
-# Global variable to store server state
-server_running = True
+# Shared by every client connection
+_ws_settings = websocket_settings()
+_server_settings = server_settings()
+manager = ConnectionManager(
+    send_queue_size=_ws_settings["send_queue_size"],
+    send_timeout=_ws_settings["send_timeout"],
+)
+server_state = ServerState(create_state_backend(_server_settings), manager)
 
 
 def get_db_connection():
+    """
+    Borrow a connection from the shared database pool.
+
+    Return it with release_db_connection() once the work is done.
+    """
     try:
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-        )
+        conn = database_pool().getconn()
         logger.info("N.E.X.U.S.-Sever to N.E.X.U.S.-Database ESTABLISHED")
         return conn
     except psycopg2.Error as pe:
@@ -55,12 +87,24 @@ def get_db_connection():
         return None
 
 
+def release_db_connection(conn):
+    database_pool().putconn(conn)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup event: Execute tasks needed at server startup
-    asyncio.create_task(log_telemetry_periodically())
+    if await async_database_pool().health_check():
+        logger.info("N.E.X.U.S.-Sever async database pool ESTABLISHED")
+    await asyncio.to_thread(apply_schema_migrations)
+    await server_state.start()
     yield
     # Shutdown event: Clean up or shutdown tasks here, if needed
+    await manager.close_all()
+    await server_state.close()
+    await close_all_async_pools()
+    shutdown_db_executors(wait=False)
+    close_all_pools()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -109,69 +153,155 @@ async def get():
     )
 
 
-def should_log_message(message: str) -> bool:
-    """
-    Determine if a message should be logged based on its content, frequency, and randomness.
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    if worker_index is not None:
+        # Each request reaches whichever worker the kernel picked, so the
+        # series would jump between workers; see server_settings()
+        return Response(
+            "Scrape each worker at SERVER_METRICS_PORT + its index instead.\n",
+            status_code=404,
+            media_type="text/plain",
+        )
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
-    Args:
-        message (str): The message content.
 
-    Returns:
-        bool: True if the message should be logged, False otherwise.
+async def handle_legacy_message(client, data):
     """
-    if "error" in message.lower() or "important" in message.lower():
-        return True
-
-    if random.randint(1, 5) == 1:
-        return True
-
-    if len(message) < 10 or len(message) > 100:
-        return True
-
-    return False
-
-
-async def log_telemetry_periodically():
-    while True:
-        logger.info("N.E.X.U.S.-Server telemetry log: Server is running.")
-        await asyncio.sleep(300)
+    Answer the plain-text messages sent before the command protocol: the
+    STOP_SERVER/START_SERVER controls, with anything else echoed back.
+    """
+    if data == "STOP_SERVER":
+        await set_server_running(server_state, False)
+        manager.send(client, "N.E.X.U.S.-Sever stopped.")
+    elif data == "START_SERVER":
+        await set_server_running(server_state, True)
+    elif server_state.running:
+        message_logger.info(f"Message received: {data}")
+        manager.send(client, f"Message received: {data}")
+    else:
+        manager.send(client, "N.E.X.U.S.-Sever is currently stopped.")
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    global server_running
-    await websocket.accept()
+    # Idle clients stay connected; uvicorn's ping/pong keepalive drops the
+    # ones that have really gone away.
+    client = await manager.connect(websocket)
+    session = Session(client, manager, router, server_state)
 
     logger.info("N.E.X.U.S.-Sever to N.E.X.U.S.-Client ESTABLISHED")
 
     try:
-        while True:
-            data = await asyncio.wait_for(websocket.receive_text(), timeout=10)
-            if data == "STOP_SERVER":
-                server_running = False
-                logger.info("N.E.X.U.S.-Sever stopped by N.E.X.U.S.-Client request.")
-                await websocket.send_text("N.E.X.U.S.-Sever stopped.")
-            elif data == "START_SERVER":
-                server_running = True
-                logger.info("N.E.X.U.S.-Sever started by N.E.X.U.S.-Client request.")
+        while not client.closed:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                logger.info("N.E.X.U.S.-Client disconnected")
+                break
+            text = message.get("text")
+            if text is not None and not text.lstrip().startswith("{"):
+                FRAMES_RECEIVED.labels(format="legacy").inc()
+                await handle_legacy_message(client, text)
             else:
-                if server_running:
-                    if should_log_message(data):
-                        logger.info(f"Message received: {data}")
-                    await websocket.send_text(f"Message received: {data}")
-                else:
-                    await websocket.send_text("N.E.X.U.S.-Sever is currently stopped.")
-    except asyncio.TimeoutError:
-        logger.info("WebSocket receive timeout")
+                FRAMES_RECEIVED.labels(format="json" if text is not None else "msgpack").inc()
+                # Blocks while the client has too many requests running
+                await session.handle_frame(text if text is not None else message.get("bytes"))
     except WebSocketDisconnect:
         logger.info("N.E.X.U.S.-Client disconnected")
+    finally:
+        await session.close()
+        await manager.disconnect(client)
+
+
+def bind_socket(host, port, reuse_port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Every worker binds the same port; the kernel balances new
+        # connections across their accept queues
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def run_worker():
+    """Serve the app in this process, on its own socket."""
+    import uvicorn
+
+    if worker_index is not None:
+        set_constant_labels({"worker": worker_index})
+        start_metrics_server(
+            _server_settings["metrics_port"] + int(worker_index),
+            _server_settings["metrics_host"],
+        )
+    sock = bind_socket(
+        _server_settings["host"], _server_settings["port"], _server_settings["reuse_port"]
+    )
+    config = uvicorn.Config(
+        app,
+        host=_server_settings["host"],
+        port=_server_settings["port"],
+        ws_ping_interval=_ws_settings["ping_interval"],
+        ws_ping_timeout=_ws_settings["ping_timeout"],
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_workers(count):
+    """
+    Run count worker processes on one SO_REUSEPORT port, restarting any
+    that die, until SIGTERM or SIGINT.
+    """
+    # Spawned rather than forked, so no worker inherits this process's
+    # logging thread or database connections
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start(index):
+        os.environ["NEXUS_SERVER_WORKER"] = str(index)
+        process = context.Process(target=run_worker, name=f"nexus-worker-{index}")
+        process.start()
+        logger.info(f"Started server worker {index} (pid {process.pid})")
+        return process
+
+    def stop(*args):
+        nonlocal stopping
+        stopping = True
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+
+    workers = [start(index) for index in range(count)]
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping:
+        for index, process in enumerate(workers):
+            process.join(timeout=1)
+            if not process.is_alive() and not stopping:
+                logger.error(
+                    f"Server worker {index} exited with {process.exitcode}; restarting"
+                )
+                workers[index] = start(index)
+    for process in workers:
+        process.join()
 
 
 if __name__ == "__main__":
     db_conn = get_db_connection()
     if db_conn:
-        db_conn.close()
+        release_db_connection(db_conn)
 
-    import uvicorn
+    workers = _server_settings["workers"]
+    if workers > 1 and _server_settings["state_backend"] == "memory":
+        logger.error("The memory state backend cannot be shared by several workers.")
+        sys.exit("SERVER_WORKERS > 1 needs SERVER_STATE_BACKEND=postgres")
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("SERVER_WORKERS > 1 needs SO_REUSEPORT, which this platform lacks")
 
-    uvicorn.run(app, host="192.168.1.147", port=8000)
+    if workers > 1:
+        run_workers(workers)
+    else:
+        run_worker()
@@ -0,0 +1,281 @@
+"""
+Request/response protocol spoken over the /ws WebSocket.
+
+A request is one frame, JSON in a text frame or msgpack in a binary frame:
+
+    {"id": 7, "cmd": "contacts.search", "args": {"query": "jon", "limit": 5}}
+
+Requests on one socket run concurrently, so responses can arrive in any
+order; each carries the id of its request and uses the request's encoding:
+
+    {"id": 7, "ok": true, "result": {...}}
+    {"id": 7, "ok": false, "error": {"code": "timeout", "message": "..."}}
+
+Frames the server pushes unprompted carry "event" instead of "id":
+
+    {"event": "server.state", "data": {"running": false}}
+
+{"id": 8, "cmd": "cancel", "args": {"id": 7}} cancels request 7, which then
+answers with the "cancelled" error code.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+from datetime import date, datetime
+
+import msgpack
+
+from shared.infrastructure import DatabaseBusyError
+from shared.metrics import counter, histogram
+
+logger = logging.getLogger("websocket_logger")
+
+COMMANDS = counter(
+    "nexus_ws_commands_total", "Commands handled, by outcome.", ["cmd", "outcome"]
+)
+COMMAND_SECONDS = histogram(
+    "nexus_ws_command_seconds", "Time from receiving a command to its response.", ["cmd"]
+)
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Requests one socket may have running before the server stops reading from
+# it; TCP flow control then holds the client back
+MAX_IN_FLIGHT = 32
+
+
+class CommandError(Exception):
+    """A request that failed in a way the client should be told about."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _encode_value(value):
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def encode(frame, encoding=JSON):
+    """Serialize a frame to str (JSON) or bytes (msgpack)."""
+    if encoding == MSGPACK:
+        return msgpack.packb(frame, default=_encode_value, use_bin_type=True)
+    return json.dumps(frame, default=_encode_value, separators=(",", ":"))
+
+
+def decode(data):
+    """
+    Parse a request frame.
+
+    Returns:
+        tuple: (frame dict, encoding of the frame)
+    """
+    try:
+        if isinstance(data, bytes):
+            frame, encoding = msgpack.unpackb(data, raw=False), MSGPACK
+        else:
+            frame, encoding = json.loads(data), JSON
+    except (ValueError, msgpack.UnpackException) as e:
+        raise CommandError("bad_request", f"Malformed frame: {str(e)}")
+    if not isinstance(frame, dict):
+        raise CommandError("bad_request", "A request must be an object")
+    return frame, encoding
+
+
+def event(name, data, encoding=JSON):
+    """Encode a server-initiated frame."""
+    return encode({"event": name, "data": data}, encoding)
+
+
+def argument(args, name, kind, default=dataclasses.MISSING):
+    """
+    Return args[name], checking its type, or default when it is absent.
+    """
+    if name not in args or args[name] is None:
+        if default is dataclasses.MISSING:
+            raise CommandError("invalid_args", f"Missing argument '{name}'")
+        return default
+    value = args[name]
+    if (kind is int and isinstance(value, bool)) or not isinstance(value, kind):
+        raise CommandError(
+            "invalid_args", f"Argument '{name}' must be {kind.__name__}"
+        )
+    return value
+
+
+class CommandRouter:
+    """
+    Dispatch table from command names to async handlers.
+
+    A handler is called as handler(session, args) and returns the result to
+    send back; raising CommandError sends an error response instead.
+    """
+
+    def __init__(self):
+        self._handlers = {}
+
+    def command(self, name, requires_running=True):
+        """
+        Register the decorated coroutine function as the handler of name.
+
+        Commands with requires_running are refused while the backend has
+        been stopped with server.stop.
+        """
+
+        def register(handler):
+            self._handlers[name] = (handler, requires_running)
+            return handler
+
+        return register
+
+    @property
+    def commands(self):
+        return sorted(self._handlers)
+
+    def metric_name(self, name):
+        # Unknown names would give every typo its own time series
+        return name if name in self._handlers else "unknown"
+
+    async def dispatch(self, session, name, args):
+        if name not in self._handlers:
+            raise CommandError("unknown_command", f"Unknown command '{name}'")
+        handler, requires_running = self._handlers[name]
+        if requires_running and not session.state.running:
+            raise CommandError("stopped", "N.E.X.U.S.-Sever is currently stopped.")
+        return await handler(session, args)
+
+
+class Session:
+    """
+    The requests of one connected client.
+
+    Each request runs in its own task so a slow command does not hold up
+    the ones behind it. Responses are queued on the client through the
+    ConnectionManager.
+    """
+
+    def __init__(self, client, manager, router, state, max_in_flight=MAX_IN_FLIGHT):
+        self.client = client
+        self.manager = manager
+        self.router = router
+        self.state = state
+        self._tasks = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def handle_frame(self, data):
+        """Decode one frame and start its request."""
+        encoding = MSGPACK if isinstance(data, bytes) else JSON
+        try:
+            frame, encoding = decode(data)
+            request_id = frame.get("id")
+            name = frame.get("cmd")
+            args = frame.get("args") or {}
+            if not isinstance(name, str) or not isinstance(args, dict):
+                raise CommandError(
+                    "bad_request", "A request needs a string 'cmd' and object 'args'"
+                )
+            if isinstance(request_id, bool) or not isinstance(request_id, (int, str)):
+                raise CommandError("bad_request", "A request needs a string or integer 'id'")
+        except CommandError as e:
+            self._respond(encoding, None, error=e)
+            return
+
+        if request_id in self._tasks:
+            self._respond(
+                encoding,
+                request_id,
+                error=CommandError("bad_request", f"Request {request_id} is already running"),
+            )
+            return
+        if name == "cancel":
+            self._cancel(encoding, request_id, args)
+            return
+
+        await self._slots.acquire()
+        started = time.perf_counter()
+        task = asyncio.create_task(self._run(encoding, request_id, name, args))
+        self._tasks[request_id] = task
+        task.add_done_callback(
+            lambda finished: self._finished(encoding, request_id, name, started, finished)
+        )
+
+    def _cancel(self, encoding, request_id, args):
+        target_id = args.get("id")
+        target = self._tasks.get(target_id) if isinstance(target_id, (int, str)) else None
+        if target is not None:
+            target.cancel()
+        self._respond(encoding, request_id, result={"cancelled": target is not None})
+
+    async def _run(self, encoding, request_id, name, args):
+        # Returns the outcome recorded in the command metrics
+        try:
+            result = await self.router.dispatch(self, name, args)
+        except CommandError as e:
+            error = e
+        except asyncio.TimeoutError:
+            error = CommandError("timeout", f"'{name}' timed out")
+        except DatabaseBusyError as e:
+            error = CommandError("busy", str(e))
+        except Exception as e:
+            logger.exception(f"Command '{name}' failed: {str(e)}")
+            error = CommandError("internal", f"'{name}' failed")
+        else:
+            self._respond(encoding, request_id, result=result)
+            return "ok"
+        self._respond(encoding, request_id, error=error)
+        return error.code
+
+    def _finished(self, encoding, request_id, name, started, task):
+        # A done callback rather than a finally block, because a task
+        # cancelled before its first step never enters _run
+        self._tasks.pop(request_id, None)
+        self._slots.release()
+        outcome = "cancelled" if task.cancelled() else task.result()
+        metric_name = self.router.metric_name(name)
+        COMMANDS.labels(cmd=metric_name, outcome=outcome).inc()
+        COMMAND_SECONDS.labels(cmd=metric_name).observe(time.perf_counter() - started)
+        if task.cancelled():
+            self._respond(
+                encoding, request_id, error=CommandError("cancelled", f"'{name}' was cancelled")
+            )
+
+    def _respond(self, encoding, request_id, result=None, error=None):
+        if error is not None:
+            frame = {
+                "id": request_id,
+                "ok": False,
+                "error": {"code": error.code, "message": error.message},
+            }
+        else:
+            frame = {"id": request_id, "ok": True, "result": result}
+        try:
+            message = encode(frame, encoding)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Could not encode the response to {request_id}: {str(e)}")
+            message = encode(
+                {
+                    "id": request_id,
+                    "ok": False,
+                    "error": {"code": "internal", "message": "Unencodable result"},
+                },
+                encoding,
+            )
+        self.manager.send(self.client, message)
+
+    async def close(self):
+        """Cancel the requests of a client that has gone away."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,292 @@
+"""
+Server state shared by every worker process.
+
+ServerState holds the backend on/off flag and fans broadcasts out to the
+clients of every worker. Where the state lives is up to a backend:
+
+- "memory" keeps it in this process, for a single worker.
+- "postgres" keeps the flag in a table and delivers state changes and
+  broadcasts to every worker with LISTEN/NOTIFY, for several workers behind
+  one SO_REUSEPORT port.
+
+Each worker reads the flag from a local copy that the backend keeps
+current, so checking it on every request never waits on the network.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+
+from shared.config import database_settings
+from shared.infrastructure import get_async_pool
+from app.protocol import event
+
+logger = logging.getLogger("websocket_logger")
+
+# PostgreSQL drops NOTIFY payloads of 8000 bytes or more
+MAX_NOTIFY_BYTES = 7900
+
+# Workers that have not reported their client count for this long are
+# assumed to be gone
+WORKER_REPORT_INTERVAL = 15
+WORKER_EXPIRY = 60
+
+STATE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS nexus_server_state (
+    id integer PRIMARY KEY CHECK (id = 1),
+    running boolean NOT NULL
+);
+INSERT INTO nexus_server_state VALUES (1, true) ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS nexus_server_workers (
+    worker_id text PRIMARY KEY,
+    clients integer NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+# Arbitrary key that serializes the schema setup of workers starting together
+_SCHEMA_LOCK_KEY = 7_214_001
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemoryStateBackend:
+    """State for a single worker process; nothing leaves the process."""
+
+    def __init__(self):
+        self._on_message = None
+        self._running = True
+        self._clients = 0
+
+    async def start(self, on_message):
+        self._on_message = on_message
+
+    async def load_running(self):
+        return self._running
+
+    async def set_running(self, running):
+        # No await between the check and the write, so this is atomic on
+        # the event loop
+        if self._running == running:
+            return False
+        self._running = running
+        self._on_message({"type": "state", "running": running})
+        return True
+
+    async def publish(self, message):
+        self._on_message(message)
+
+    async def report_clients(self, count):
+        self._clients = count
+
+    async def client_count(self):
+        return self._clients
+
+    async def close(self):
+        pass
+
+
+class PostgresStateBackend:
+    """
+    State shared through PostgreSQL by any number of worker processes.
+
+    The flag is a one-row table changed with a conditional UPDATE, so of two
+    workers stopping the server at once exactly one reports a change. The
+    change and every broadcast are sent with pg_notify on channel, which
+    each worker LISTENs on over its own connection. Broadcast frames must
+    be text that fits in a NOTIFY payload.
+    """
+
+    def __init__(self, channel="nexus_server"):
+        self.channel = channel
+        self.worker_id = worker_id()
+        self._on_message = None
+        self._listener = None
+        self._reconnect = None
+        self._closing = False
+
+    async def start(self, on_message):
+        self._on_message = on_message
+        async with get_async_pool().connection() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", _SCHEMA_LOCK_KEY)
+                await conn.execute(STATE_SCHEMA_SQL)
+        await self._listen()
+
+    async def _listen(self):
+        # LISTEN belongs to a session, so it gets a connection of its own
+        # rather than one borrowed from the pool
+        import asyncpg
+
+        settings = {key: value for key, value in database_settings().items() if value}
+        self._listener = await asyncpg.connect(**settings)
+        await self._listener.add_listener(self.channel, self._notified)
+        self._listener.add_termination_listener(self._listener_lost)
+        logger.info(f"Listening for server state changes on '{self.channel}'")
+
+    def _notified(self, conn, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.error(f"Ignoring malformed notification on '{channel}'")
+            return
+        self._on_message(message)
+
+    def _listener_lost(self, conn):
+        if self._closing:
+            return
+        logger.error(f"Lost the LISTEN connection on '{self.channel}'; reconnecting")
+        self._reconnect = asyncio.get_running_loop().create_task(self._relisten())
+
+    async def _relisten(self):
+        delay = 1
+        while not self._closing:
+            try:
+                await self._listen()
+                # Changes made while disconnected were not delivered
+                self._on_message({"type": "state", "running": await self.load_running()})
+                return
+            except Exception as e:
+                logger.error(f"Reconnecting the LISTEN connection failed: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def load_running(self):
+        async with get_async_pool().connection() as conn:
+            return await conn.fetchval("SELECT running FROM nexus_server_state WHERE id = 1")
+
+    async def set_running(self, running):
+        message = json.dumps({"type": "state", "running": running})
+        async with get_async_pool().connection() as conn:
+            async with conn.transaction():
+                changed = await conn.fetchval(
+                    "UPDATE nexus_server_state SET running = $1 "
+                    "WHERE id = 1 AND running <> $1 RETURNING true",
+                    running,
+                )
+                if changed:
+                    # Delivered to every listener when the transaction commits
+                    await conn.execute("SELECT pg_notify($1, $2)", self.channel, message)
+        return bool(changed)
+
+    async def publish(self, message):
+        payload = json.dumps(message)
+        if len(payload.encode()) > MAX_NOTIFY_BYTES:
+            raise ValueError(
+                f"Broadcast of {len(payload)} bytes is too large to send to other workers"
+            )
+        async with get_async_pool().connection() as conn:
+            await conn.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    async def report_clients(self, count):
+        async with get_async_pool().connection() as conn:
+            await conn.execute(
+                "INSERT INTO nexus_server_workers (worker_id, clients, updated_at) "
+                "VALUES ($1, $2, now()) ON CONFLICT (worker_id) "
+                "DO UPDATE SET clients = $2, updated_at = now()",
+                self.worker_id,
+                count,
+            )
+
+    async def client_count(self):
+        async with get_async_pool().connection() as conn:
+            return await conn.fetchval(
+                "SELECT coalesce(sum(clients), 0) FROM nexus_server_workers "
+                "WHERE updated_at > now() - make_interval(secs => $1)",
+                float(WORKER_EXPIRY),
+            )
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect is not None:
+            self._reconnect.cancel()
+        if self._listener is not None:
+            await self._listener.close()
+        try:
+            async with get_async_pool().connection() as conn:
+                await conn.execute(
+                    "DELETE FROM nexus_server_workers WHERE worker_id = $1", self.worker_id
+                )
+        except Exception as e:
+            logger.warning(f"Could not unregister worker {self.worker_id}: {str(e)}")
+
+
+def create_state_backend(settings):
+    """Create the backend named by settings["state_backend"]."""
+    name = settings["state_backend"]
+    if name == "memory":
+        return MemoryStateBackend()
+    if name == "postgres":
+        return PostgresStateBackend(settings["state_channel"])
+    raise ValueError(f"Unknown state backend '{name}'; expected 'memory' or 'postgres'")
+
+
+class ServerState:
+    """
+    The on/off flag and broadcasts, as seen by this worker.
+
+    running is this worker's copy of the flag. set_running() and
+    broadcast() go through the backend, which delivers the result to every
+    worker, this one included, and each worker passes it on to its own
+    clients.
+    """
+
+    def __init__(self, backend, manager):
+        self.backend = backend
+        self.manager = manager
+        self._running = True
+        self._reporter = None
+
+    @property
+    def running(self):
+        return self._running
+
+    async def start(self):
+        await self.backend.start(self._deliver)
+        self._running = await self.backend.load_running()
+        self._reporter = asyncio.create_task(self._report_clients())
+
+    async def close(self):
+        if self._reporter is not None:
+            self._reporter.cancel()
+            await asyncio.gather(self._reporter, return_exceptions=True)
+        await self.backend.close()
+
+    async def set_running(self, running):
+        """
+        Returns:
+            bool: True if this call changed the state.
+        """
+        return await self.backend.set_running(running)
+
+    async def broadcast(self, frame):
+        """Send a text frame to the clients of every worker."""
+        await self.backend.publish({"type": "broadcast", "frame": frame})
+
+    async def client_count(self):
+        """Connected clients across every worker."""
+        await self.backend.report_clients(len(self.manager))
+        return await self.backend.client_count()
+
+    def _deliver(self, message):
+        if message.get("type") == "state":
+            running = bool(message.get("running"))
+            changed = running != self._running
+            self._running = running
+            if changed:
+                self.manager.broadcast(event("server.state", {"running": running}))
+        elif message.get("type") == "broadcast":
+            self.manager.broadcast(message["frame"])
+
+    async def _report_clients(self):
+        while True:
+            try:
+                await self.backend.report_clients(len(self.manager))
+            except Exception as e:
+                logger.warning(f"Could not report the client count: {str(e)}")
+            await asyncio.sleep(WORKER_REPORT_INTERVAL)
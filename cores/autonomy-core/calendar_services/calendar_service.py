@@ -1,21 +1,23 @@
 import logging
 import os
-from datetime import datetime
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional
 import psycopg2
 from dotenv import load_dotenv
-from psycopg2 import pool
 from regex import D
 
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.infrastructure import get_pool
+from shared.utils import configure_logging
+
 # Load environment variables from .env file
 load_dotenv(dotenv_path="/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/autonomy.env", verbose=True, override=True)
 
-# PostgreSQL database connection details
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-
 # Absolute path for the log file
 log_file = "/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/logs/calendar.log"
 
@@ -23,11 +25,7 @@ log_file = "/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/logs/calendar.lo
 os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
 # Configure logging to use the specified absolute path
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging(log_file, level=logging.INFO)
 logger = logging.getLogger("cal_logger")
 
 
@@ -37,23 +35,8 @@ def add_event(event_name, event_date_str):
         # Parse the event date
         event_date = datetime.strptime(event_date_str, "%Y-%m-%d").date()
 
-        # Create a connection pool if it doesn't exist
-        if "connection_pool" not in globals():
-            global connection_pool
-            connection_pool = pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=10,
-                host=db_host,
-                port=db_port,
-                database=db_name,
-                user=db_user,
-                password=db_password,
-            )
-
-        # Get a connection from the pool
-        conn = connection_pool.getconn()
-
-        try:
+        # Borrow a connection from the shared pool; it is returned on exit
+        with get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 insert_query = """
                 INSERT INTO events (event_name, event_date) 
@@ -61,10 +44,7 @@ def add_event(event_name, event_date_str):
                 """
                 cursor.execute(insert_query, (event_name, event_date))
                 conn.commit()
-
-        finally:
-            # Return the connection to the pool
-            connection_pool.putconn(conn)
+        invalidate_event_cache()
 
         logger.info(f"Event '{event_name}' added for {event_date}")
     except psycopg2.Error as pe:
@@ -78,13 +58,7 @@ def add_event(event_name, event_date_str):
 # Function to view upcoming events
 def view_events():
     try:
-        with psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-        ) as conn:
+        with get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 select_query = """
                 SELECT event_name, event_date 
@@ -118,13 +92,7 @@ def update_event(event_id, new_event_name, new_event_date_str):
         # Parse the new event date
         new_event_date = datetime.strptime(new_event_date_str, "%Y-%m-%d").date()
 
-        with psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-        ) as conn:
+        with get_pool().connection() as conn:
             with conn.cursor() as cursor:
                 update_query = """
                 UPDATE events 
@@ -133,6 +101,7 @@ def update_event(event_id, new_event_name, new_event_date_str):
                 """
                 cursor.execute(update_query, (new_event_name, new_event_date, event_id))
                 conn.commit()
+        invalidate_event_cache()
 
         logger.info(f"Event with ID {event_id} updated to '{new_event_name}' on {new_event_date}")
         return f"Event with ID {event_id} updated successfully."
@@ -145,4 +114,181 @@ def update_event(event_id, new_event_name, new_event_date_str):
     except Exception as e:
         logger.error(f"Error updating event: {str(e)}")
         return "Failed to update event"
-    
\ No newline at end of file
+
+
+# Index that keeps date-range and "what's next" queries proportional to the
+# size of the window rather than the whole calendar history. The advisory
+# lock makes processes starting together create it one at a time.
+EVENT_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(7214006);
+SET LOCAL statement_timeout = 0;
+CREATE INDEX IF NOT EXISTS events_event_date_idx ON events (event_date, event_id);
+"""
+
+# Number of days ahead held by the in-process upcoming events cache
+UPCOMING_CACHE_DAYS = 90
+
+EVENT_COLUMNS = ("event_id", "event_name", "event_date")
+
+
+@dataclass
+class EventList:
+    """Events ordered by date, or an error message if the query failed."""
+
+    events: list = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class UpcomingEventsCache:
+    """
+    Sorted copy of the events from today to UPCOMING_CACHE_DAYS ahead.
+
+    The window is loaded with one range query and reused until an event is
+    written or the date changes. A generation counter stops a load that
+    raced with an invalidation from repopulating the cache with stale rows.
+    """
+
+    def __init__(self, days=UPCOMING_CACHE_DAYS):
+        self.days = days
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._window = None
+        self._events = []
+        self._dates = []
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._window = None
+            self._events = []
+            self._dates = []
+
+    def _current(self):
+        today = date.today()
+        with self._lock:
+            if self._window is not None and self._window[0] == today:
+                return self._window, self._events, self._dates
+            generation = self._generation
+
+        window = (today, today + timedelta(days=self.days))
+        events = _query_events(*window)
+        dates = [event["event_date"] for event in events]
+        with self._lock:
+            if generation == self._generation:
+                self._window, self._events, self._dates = window, events, dates
+        return window, events, dates
+
+    def between(self, start, end):
+        """Return the cached events in [start, end], or None if not covered."""
+        (window_start, window_end), events, dates = self._current()
+        if start < window_start or end > window_end:
+            return None
+        return events[bisect_left(dates, start) : bisect_right(dates, end)]
+
+    def next_n(self, n, from_date):
+        """Return the next n cached events, or None if the window runs out."""
+        (window_start, _), events, dates = self._current()
+        if from_date < window_start:
+            return None
+        upcoming = events[bisect_left(dates, from_date) :]
+        return upcoming[:n] if len(upcoming) >= n else None
+
+
+_upcoming_cache = UpcomingEventsCache()
+
+
+# Function to drop cached upcoming events after the events table changes
+def invalidate_event_cache():
+    _upcoming_cache.invalidate()
+
+
+def _query_events(start, end, limit=None):
+    query = """
+    SELECT event_id, event_name, event_date
+    FROM events
+    WHERE event_date BETWEEN %s AND %s
+    ORDER BY event_date, event_id
+    """
+    params = [start, end]
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return [dict(zip(EVENT_COLUMNS, row)) for row in cursor.fetchall()]
+
+
+# Function to create the indexes used by the range queries; the server runs
+# it at startup (app/data_access.py apply_schema_migrations)
+def ensure_event_schema():
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(EVENT_SCHEMA_SQL)
+                conn.commit()
+        logger.info("Event schema is up to date.")
+        return "Event schema is up to date."
+    except psycopg2.Error as pe:
+        logger.error(f"Error applying the event schema: {str(pe)}")
+        return "Failed to apply the event schema"
+
+
+# Function to list the events between two dates, inclusive
+def events_between(start, end, limit=None):
+    """
+    Return events dated from start to end inclusive, ordered by date.
+
+    Windows inside the upcoming events cache are answered from memory;
+    anything else is a range scan on events_event_date_idx.
+
+    Returns:
+        EventList: Event dicts with event_id, event_name and event_date.
+    """
+    try:
+        events = _upcoming_cache.between(start, end)
+        if events is None:
+            events = _query_events(start, end, limit)
+        elif limit is not None:
+            events = events[:limit]
+        return EventList(events=list(events))
+    except psycopg2.Error as pe:
+        logger.error(f"Error retrieving events from database: {str(pe)}")
+        return EventList(error="Failed to retrieve events from the database")
+
+
+# Function to list the next n events from a date
+def next_n_events(n, from_date=None):
+    """
+    Return the next n events on or after from_date (default today).
+
+    Returns:
+        EventList: Event dicts with event_id, event_name and event_date.
+    """
+    from_date = from_date or date.today()
+    try:
+        events = _upcoming_cache.next_n(n, from_date)
+        if events is None:
+            with get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        SELECT event_id, event_name, event_date
+                        FROM events
+                        WHERE event_date >= %s
+                        ORDER BY event_date, event_id
+                        LIMIT %s
+                        """,
+                        (from_date, n),
+                    )
+                    events = [
+                        dict(zip(EVENT_COLUMNS, row)) for row in cursor.fetchall()
+                    ]
+        return EventList(events=list(events))
+    except psycopg2.Error as pe:
+        logger.error(f"Error retrieving events from database: {str(pe)}")
+        return EventList(error="Failed to retrieve events from the database")
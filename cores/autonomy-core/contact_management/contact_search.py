@@ -0,0 +1,463 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+
+import psycopg2
+
+from contact_management.contact_service import (
+    ContactPage,
+    get_db_connection,
+    iter_contacts,
+    on_contacts_changed,
+    release_db_connection,
+)
+
+logger = logging.getLogger("cont_search_logger")
+
+# Schema migration for database-side search: a denormalised, lower-cased
+# search_text column kept current by a trigger, with trigram and full-text
+# GIN indexes over it, and a version counter bumped by every statement that
+# writes contacts so each process can tell when its in-process index is out
+# of date. Every statement is idempotent, and the advisory lock makes
+# processes starting together apply it one at a time.
+SEARCH_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(7214004);
+SET LOCAL statement_timeout = 0;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS search_text text;
+
+CREATE OR REPLACE FUNCTION contacts_search_text_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_text := lower(concat_ws(' ', NEW.first_name, NEW.last_name,
+        NEW.email, NEW.phone, NEW.tags, NEW.notes));
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contacts_search_text_trigger ON contacts;
+CREATE TRIGGER contacts_search_text_trigger
+    BEFORE INSERT OR UPDATE ON contacts
+    FOR EACH ROW EXECUTE FUNCTION contacts_search_text_update();
+
+UPDATE contacts
+SET search_text = lower(concat_ws(' ', first_name, last_name, email, phone, tags, notes))
+WHERE search_text IS NULL;
+
+CREATE INDEX IF NOT EXISTS contacts_search_text_trgm_idx
+    ON contacts USING gin (search_text gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS contacts_search_text_fts_idx
+    ON contacts USING gin (to_tsvector('simple', coalesce(search_text, '')));
+
+CREATE TABLE IF NOT EXISTS contacts_search_version (
+    id integer PRIMARY KEY CHECK (id = 1),
+    version bigint NOT NULL
+);
+INSERT INTO contacts_search_version VALUES (1, 0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION contacts_search_version_bump() RETURNS trigger AS $$
+BEGIN
+    UPDATE contacts_search_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contacts_search_version_trigger ON contacts;
+CREATE TRIGGER contacts_search_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON contacts
+    FOR EACH STATEMENT EXECUTE FUNCTION contacts_search_version_bump();
+"""
+
+RANKED_SEARCH_SQL = """
+SELECT contact_id, first_name, last_name, email, phone,
+       ts_rank(to_tsvector('simple', coalesce(search_text, '')),
+               to_tsquery('simple', %(prefix_query)s)) * 2
+       + word_similarity(%(query)s, search_text) AS score
+FROM contacts
+WHERE to_tsvector('simple', coalesce(search_text, '')) @@ to_tsquery('simple', %(prefix_query)s)
+   OR %(query)s <%% search_text
+ORDER BY score DESC, contact_id
+LIMIT %(limit)s
+"""
+
+# Relative weight of a token depending on the field it came from
+FIELD_WEIGHTS = {
+    "first_name": 3.0,
+    "last_name": 3.0,
+    "email": 2.0,
+    "phone": 2.0,
+    "tags": 1.5,
+    "notes": 1.0,
+}
+
+# Columns kept in memory for each indexed contact and returned with results
+RESULT_COLUMNS = ("contact_id", "first_name", "last_name", "email", "phone")
+
+# Seconds before the in-process index is rebuilt even without invalidation
+INDEX_MAX_AGE = 300
+
+# Seconds between checks of contacts_search_version for contacts written by
+# other processes
+INDEX_CHECK_INTERVAL = 5
+
+# Minimum trigram similarity for a fuzzy token match
+FUZZY_THRESHOLD = 0.4
+
+# Below this many candidates, later query tokens are checked per candidate
+# instead of being expanded through the whole index
+CANDIDATE_SCAN_LIMIT = 2000
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(str(text).lower()) if text else []
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(left, right):
+    left_grams, right_grams = _trigrams(left), _trigrams(right)
+    return len(left_grams & right_grams) / len(left_grams | right_grams)
+
+
+# Function to apply the search schema migration; the server runs it at
+# startup (app/data_access.py apply_schema_migrations)
+def ensure_search_schema():
+    conn = get_db_connection()
+    if conn is None:
+        return "Failed to connect to the database"
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SEARCH_SCHEMA_SQL)
+            conn.commit()
+            logger.info("Contact search schema is up to date.")
+            return "Contact search schema is up to date."
+    except psycopg2.Error as pe:
+        conn.rollback()
+        logger.error(f"Error applying the contact search schema: {str(pe)}")
+        return "Failed to apply the contact search schema"
+    finally:
+        release_db_connection(conn)
+
+
+class ContactSearchIndex:
+    """
+    In-process prefix and trigram index over the contacts table.
+
+    Tokens from name, email, phone, tags and notes are kept in a sorted list
+    so a prefix lookup is a bisect plus a short scan, and a trigram map from
+    trigram to tokens handles typos. Every query token must match (prefix or
+    fuzzy) for a contact to be returned; results are ranked by the summed
+    field weights of the matches.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.built_at = None
+        self._sorted_tokens = []
+        self._postings = {}
+        self._contact_tokens = {}
+        self._trigram_tokens = {}
+
+    def build(self, chunks):
+        postings, contact_tokens, records = {}, {}, {}
+        for chunk in chunks:
+            for contact in chunk:
+                contact_id = contact["contact_id"]
+                records[contact_id] = {
+                    name: contact.get(name) for name in RESULT_COLUMNS
+                }
+                weights = {}
+                for field, weight in FIELD_WEIGHTS.items():
+                    for token in tokenize(contact.get(field)):
+                        weights[token] = max(weights.get(token, 0.0), weight)
+                contact_tokens[contact_id] = tuple(weights.items())
+                for token, weight in weights.items():
+                    postings.setdefault(token, {})[contact_id] = weight
+
+        trigram_tokens = {}
+        for token in postings:
+            for gram in _trigrams(token):
+                trigram_tokens.setdefault(gram, []).append(token)
+
+        self.records = records
+        self._postings = postings
+        self._contact_tokens = contact_tokens
+        self._trigram_tokens = trigram_tokens
+        self._sorted_tokens = sorted(postings)
+        self.built_at = time.monotonic()
+        return self
+
+    def _matching_tokens(self, query_token):
+        # Exact and prefix matches score 1.0 and 0.8; fuzzy matches only
+        # count when nothing matches by prefix.
+        matches = {}
+        tokens = self._sorted_tokens
+        for position in range(bisect_left(tokens, query_token), len(tokens)):
+            token = tokens[position]
+            if not token.startswith(query_token):
+                break
+            matches[token] = 1.0 if token == query_token else 0.8
+        if matches or len(query_token) < 3:
+            return matches
+
+        seen = set()
+        for gram in _trigrams(query_token):
+            for token in self._trigram_tokens.get(gram, ()):
+                if token not in seen:
+                    seen.add(token)
+                    similarity = _similarity(query_token, token)
+                    if similarity >= FUZZY_THRESHOLD:
+                        matches[token] = 0.6 * similarity
+        return matches
+
+    def _expand(self, query_token):
+        scores = {}
+        for token, quality in self._matching_tokens(query_token).items():
+            for contact_id, weight in self._postings[token].items():
+                score = weight * quality
+                if score > scores.get(contact_id, 0.0):
+                    scores[contact_id] = score
+        return scores
+
+    def _score_candidate(self, contact_id, query_token):
+        best = 0.0
+        for token, weight in self._contact_tokens[contact_id]:
+            if token.startswith(query_token):
+                quality = 1.0 if token == query_token else 0.8
+            elif len(query_token) >= 3:
+                similarity = _similarity(query_token, token)
+                quality = 0.6 * similarity if similarity >= FUZZY_THRESHOLD else 0.0
+            else:
+                continue
+            best = max(best, weight * quality)
+        return best
+
+    def search(self, query, limit=10):
+        """
+        Return up to limit (score, record) pairs for query, best first.
+        """
+        query_tokens = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not query_tokens:
+            return []
+
+        # The longest token is usually the most selective, so it seeds the
+        # candidate set and the rest narrow it down.
+        candidates = self._expand(query_tokens[0])
+        for query_token in query_tokens[1:]:
+            if not candidates:
+                break
+            if len(candidates) <= CANDIDATE_SCAN_LIMIT:
+                narrowed = {}
+                for contact_id, score in candidates.items():
+                    token_score = self._score_candidate(contact_id, query_token)
+                    if token_score:
+                        narrowed[contact_id] = score + token_score
+            else:
+                token_scores = self._expand(query_token)
+                narrowed = {
+                    contact_id: score + token_scores[contact_id]
+                    for contact_id, score in candidates.items()
+                    if contact_id in token_scores
+                }
+            candidates = narrowed
+
+        best = heapq.nlargest(
+            limit, candidates.items(), key=lambda item: (item[1], -item[0])
+        )
+        return [(score, self.records[contact_id]) for contact_id, score in best]
+
+
+_index = None
+_index_version = None
+_index_stale = True
+_index_checked_at = 0.0
+_refreshing = False
+# _index_lock guards the fields above and is never held during a build;
+# _build_lock makes builds run one at a time
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+# Function to mark the in-process index for rebuild
+def invalidate_search_index():
+    global _index_stale
+    with _index_lock:
+        _index_stale = True
+    refresh_search_index()
+
+
+on_contacts_changed(invalidate_search_index)
+
+
+def _contacts_version():
+    # None when the search schema has not been applied; the index then
+    # relies on local invalidation and INDEX_MAX_AGE alone
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM contacts_search_version WHERE id = 1")
+            row = cursor.fetchone()
+        return row[0] if row else None
+    except psycopg2.Error:
+        return None
+    finally:
+        # putconn rolls back the open read transaction, and discards the
+        # connection if it is broken
+        release_db_connection(conn)
+
+
+def _build_index():
+    # Called with _build_lock held
+    global _index, _index_version, _index_stale, _index_checked_at
+    with _index_lock:
+        # Cleared before reading so a write during the build triggers
+        # another rebuild rather than being lost
+        _index_stale = False
+    version = _contacts_version()
+    started = time.monotonic()
+    try:
+        index = ContactSearchIndex().build(
+            iter_contacts(columns=RESULT_COLUMNS + ("tags", "notes"))
+        )
+    except Exception:
+        with _index_lock:
+            _index_stale = True
+        raise
+    with _index_lock:
+        _index, _index_version = index, version
+        _index_checked_at = time.monotonic()
+    logger.info(
+        f"Built contact search index over {len(index.records)} contacts "
+        f"in {time.monotonic() - started:.2f}s."
+    )
+    return index
+
+
+def _needs_rebuild():
+    global _index_checked_at
+    with _index_lock:
+        if (
+            _index is None
+            or _index_stale
+            or time.monotonic() - _index.built_at > INDEX_MAX_AGE
+        ):
+            return True
+        version = _index_version
+    current = _contacts_version()
+    with _index_lock:
+        _index_checked_at = time.monotonic()
+    return current is not None and current != version
+
+
+def _refresh():
+    global _refreshing
+    try:
+        with _build_lock:
+            while _needs_rebuild():
+                _build_index()
+    except Exception as e:
+        logger.error(f"Error rebuilding contact search index: {str(e)}")
+    finally:
+        with _index_lock:
+            _refreshing = False
+
+
+# Function to rebuild the index in the background if it is out of date
+def refresh_search_index():
+    global _refreshing
+    with _index_lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh, name="contact-search-index", daemon=True).start()
+
+
+# Function to return the in-process index
+def get_search_index():
+    """
+    Return the in-process index.
+
+    Only a process's first search waits for a build. After that a stale
+    index keeps answering while a background thread builds its replacement
+    and swaps it in, so searches never wait on a rebuild.
+    """
+    with _index_lock:
+        index = _index
+        due = _index_stale or time.monotonic() - _index_checked_at > INDEX_CHECK_INTERVAL
+    if index is None:
+        with _build_lock:
+            with _index_lock:
+                index = _index
+            return index if index is not None else _build_index()
+    if due:
+        refresh_search_index()
+    return index
+
+
+def _prefix_tsquery(tokens):
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+# Function to search contacts by name, email, phone, tags and notes
+def search_contacts_ranked(query, limit=10, use_index=True):
+    """
+    Return contacts that best match a free-text query such as "jon s".
+
+    Hot lookups are served from the in-process index. With use_index=False,
+    or if the index cannot be built, the query runs against the trigram and
+    full-text indexes created by ensure_search_schema.
+
+    Returns:
+        ContactPage: Contact dicts with a "score" key, best match first.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return ContactPage()
+
+    if use_index:
+        try:
+            results = get_search_index().search(query, limit)
+            return ContactPage(
+                contacts=[{**record, "score": score} for score, record in results]
+            )
+        except psycopg2.Error as pe:
+            logger.error(f"Error building contact search index: {str(pe)}")
+
+    conn = get_db_connection()
+    if conn is None:
+        return ContactPage(error="Failed to connect to the database")
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                RANKED_SEARCH_SQL,
+                {
+                    "query": " ".join(tokens),
+                    "prefix_query": _prefix_tsquery(tokens),
+                    "limit": limit,
+                },
+            )
+            rows = cursor.fetchall()
+    except psycopg2.Error as pe:
+        logger.error(f"Error searching contacts in the database: {str(pe)}")
+        return ContactPage(error=f"Failed to search contacts for '{query}'")
+    finally:
+        release_db_connection(conn)
+
+    logger.info(f"Found {len(rows)} contact(s) matching '{query}'")
+    return ContactPage(
+        contacts=[dict(zip(RESULT_COLUMNS + ("score",), row)) for row in rows]
+    )
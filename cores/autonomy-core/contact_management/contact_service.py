@@ -1,10 +1,19 @@
 import logging
 import os
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Optional
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
 
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.infrastructure import get_pool
+from shared.utils import configure_logging
+
 # Load environment variables from .env file
 load_dotenv(
     dotenv_path="/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/autonomy.env",
@@ -12,13 +21,6 @@ load_dotenv(
     override=True,
 )
 
-# PostgreSQL database connection details
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-
 # Absolute path for the log file
 log_file = "/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/logs/contact.log"
 
@@ -26,13 +28,71 @@ log_file = "/home/ncacord/N.E.X.U.S.-Server/cores/autonomy-core/logs/contact.log
 os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
 # Configure logging
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging(log_file, level=logging.INFO)
 logger = logging.getLogger("cont_logger")
 
+# Columns accepted by add_contact and the bulk contact functions
+CONTACT_FIELDS = (
+    "first_name",
+    "last_name",
+    "email",
+    "phone",
+    "address",
+    "city",
+    "state",
+    "country",
+    "zip_code",
+    "birthday",
+    "relationship",
+    "profile_picture",
+    "social_media_links",
+    "notes",
+    "tags",
+    "is_favorite",
+)
+
+# Number of rows written per transaction by the bulk contact functions
+BULK_BATCH_SIZE = 1000
+
+# Columns that list/search may project; contact_id is always returned
+CONTACT_COLUMNS = ("contact_id",) + CONTACT_FIELDS + ("updated_at",)
+
+# Default page size for list_contacts and search_contacts
+CONTACT_PAGE_SIZE = 500
+
+# Rows fetched per round trip by the streaming iter_contacts generator
+CONTACT_STREAM_CHUNK_SIZE = 1000
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk contact operation, with one error entry per failed row."""
+
+    succeeded: int = 0
+    contact_ids: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    def add_error(self, index, message):
+        self.errors.append({"index": index, "error": message})
+
+
+@dataclass
+class ContactPage:
+    """
+    One keyset page of contacts.
+
+    contacts holds dicts keyed by column name. Pass next_cursor back as
+    after_id to fetch the following page; it is None on the last page.
+    """
+
+    contacts: list = field(default_factory=list)
+    next_cursor: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
 
 # Function to validate email format
 def validate_email(email):
@@ -48,22 +108,37 @@ def validate_phone(phone):
     return True
 
 
-# Function to establish a database connection
+# Callbacks run after contacts are written, e.g. to invalidate search caches
+_change_listeners = []
+
+
+# Function to register a callback for contact changes
+def on_contacts_changed(callback):
+    _change_listeners.append(callback)
+
+
+def _notify_contacts_changed():
+    for callback in _change_listeners:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Contact change listener failed: {str(e)}")
+
+
+# Function to borrow a connection from the shared database pool
 def get_db_connection():
     try:
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-        )
-        return conn
+        return get_pool().getconn()
     except psycopg2.Error as pe:
         logger.error(f"Error connecting to the database: {str(pe)}")
         return None
 
 
+# Function to return a borrowed connection to the shared database pool
+def release_db_connection(conn):
+    get_pool().putconn(conn)
+
+
 # Function to add a contact to the database
 def add_contact(
     first_name,
@@ -123,13 +198,14 @@ def add_contact(
                 ),
             )
             conn.commit()
+            _notify_contacts_changed()
             logger.info(f"Contact '{first_name} {last_name}' added successfully.")
             return f"Contact '{first_name} {last_name}' added successfully."
     except psycopg2.Error as pe:
         logger.error(f"Error adding contact to the database: {str(pe)}")
         return f"Failed to add contact '{first_name} {last_name}' to the database"
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 # Function to view a contact by ID
@@ -153,7 +229,7 @@ def view_contact(contact_id):
         logger.error(f"Error retrieving contact from the database: {str(pe)}")
         return f"Failed to retrieve contact with ID {contact_id}"
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 # Function to update a contact by ID
@@ -173,13 +249,14 @@ def update_contact(contact_id, **kwargs):
             update_query = f"UPDATE contacts SET {set_clause} WHERE contact_id = %s"
             cursor.execute(update_query, values)
             conn.commit()
+            _notify_contacts_changed()
             logger.info(f"Contact with ID {contact_id} updated successfully.")
             return f"Contact with ID {contact_id} updated successfully."
     except psycopg2.Error as pe:
         logger.error(f"Error updating contact in the database: {str(pe)}")
         return f"Failed to update contact with ID {contact_id}"
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 # Function to delete a contact by ID
@@ -193,65 +270,138 @@ def delete_contact(contact_id):
             delete_query = "DELETE FROM contacts WHERE contact_id = %s"
             cursor.execute(delete_query, (contact_id,))
             conn.commit()
+            _notify_contacts_changed()
             logger.info(f"Contact with ID {contact_id} deleted successfully.")
             return f"Contact with ID {contact_id} deleted successfully."
     except psycopg2.Error as pe:
         logger.error(f"Error deleting contact from the database: {str(pe)}")
         return f"Failed to delete contact with ID {contact_id}"
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
-# Function to search contacts by a given field and value
-def search_contacts(field, value):
+def _projection(columns):
+    # contact_id is always selected because it is the keyset cursor
+    columns = tuple(columns) if columns else CONTACT_COLUMNS
+    unknown = [name for name in columns if name not in CONTACT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown contact column(s): {', '.join(unknown)}")
+    if "contact_id" not in columns:
+        columns = ("contact_id",) + columns
+    return columns
+
+
+def _contact_page(where, params, after_id, limit, columns, description):
+    try:
+        columns = _projection(columns)
+    except ValueError as ve:
+        logger.error(str(ve))
+        return ContactPage(error=str(ve))
+
     conn = get_db_connection()
     if conn is None:
-        return "Failed to connect to the database"
+        return ContactPage(error="Failed to connect to the database")
+
+    conditions = list(where)
+    query_params = list(params)
+    if after_id is not None:
+        conditions.append(sql.SQL("contact_id > %s"))
+        query_params.append(after_id)
+    where_clause = (
+        sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        if conditions
+        else sql.SQL("")
+    )
+    # Ask for one extra row to learn whether another page exists
+    query_params.append(limit + 1)
 
     try:
         with conn.cursor() as cursor:
-            search_query = sql.SQL("SELECT * FROM contacts WHERE {} = %s").format(
-                sql.Identifier(field)
-            )
-            cursor.execute(search_query, (value,))
-            contacts = cursor.fetchall()
-            if contacts:
-                logger.info(
-                    f"Found {len(contacts)} contact(s) matching {field} = {value}"
-                )
-                return contacts
-            else:
-                logger.info(f"No contacts found matching {field} = {value}")
-                return f"No contacts found matching {field} = {value}"
+            select_query = sql.SQL(
+                "SELECT {} FROM contacts{} ORDER BY contact_id LIMIT %s"
+            ).format(sql.SQL(", ").join(map(sql.Identifier, columns)), where_clause)
+            cursor.execute(select_query, query_params)
+            rows = cursor.fetchall()
     except psycopg2.Error as pe:
-        logger.error(f"Error searching contacts in the database: {str(pe)}")
-        return f"Failed to search contacts by {field} = {value}"
+        logger.error(f"Error retrieving contacts from the database: {str(pe)}")
+        return ContactPage(error=f"Failed to retrieve {description}")
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+    has_more = len(rows) > limit
+    contacts = [dict(zip(columns, row)) for row in rows[:limit]]
+    logger.info(f"Retrieved {len(contacts)} {description}.")
+    return ContactPage(
+        contacts=contacts,
+        next_cursor=contacts[-1]["contact_id"] if has_more else None,
+    )
 
 
-# Function to list all contacts
-def list_contacts():
+# Function to search contacts by a given field and value
+def search_contacts(field, value, after_id=None, limit=CONTACT_PAGE_SIZE, columns=None):
+    """
+    Return one keyset page of contacts whose field equals value.
+
+    Returns:
+        ContactPage: Matching contacts ordered by contact_id.
+    """
+    return _contact_page(
+        [sql.SQL("{} = %s").format(sql.Identifier(field))],
+        [value],
+        after_id,
+        limit,
+        columns,
+        f"contact(s) matching {field} = {value}",
+    )
+
+
+# Function to list contacts a page at a time
+def list_contacts(after_id=None, limit=CONTACT_PAGE_SIZE, columns=None):
+    """
+    Return one keyset page of contacts.
+
+    Returns:
+        ContactPage: Contacts ordered by contact_id.
+    """
+    return _contact_page([], [], after_id, limit, columns, "contacts")
+
+
+# Function to stream contacts from a server-side cursor
+def iter_contacts(
+    columns=None, field=None, value=None, chunk_size=CONTACT_STREAM_CHUNK_SIZE
+):
+    """
+    Yield lists of up to chunk_size contact dicts from a named cursor.
+
+    Rows are streamed from the server as they are consumed, so memory stays
+    constant regardless of the size of the address book. The pooled
+    connection is held until the generator is exhausted or closed.
+    """
+    columns = _projection(columns)
     conn = get_db_connection()
     if conn is None:
-        return "Failed to connect to the database"
+        raise psycopg2.OperationalError("Failed to connect to the database")
+
+    select_query = sql.SQL("SELECT {} FROM contacts").format(
+        sql.SQL(", ").join(map(sql.Identifier, columns))
+    )
+    params = []
+    if field is not None:
+        select_query += sql.SQL(" WHERE {} = %s").format(sql.Identifier(field))
+        params.append(value)
+    select_query += sql.SQL(" ORDER BY contact_id")
 
     try:
-        with conn.cursor() as cursor:
-            select_query = "SELECT * FROM contacts"
-            cursor.execute(select_query)
-            contacts = cursor.fetchall()
-            if contacts:
-                logger.info(f"Retrieved {len(contacts)} contacts.")
-                return contacts
-            else:
-                logger.info("No contacts found.")
-                return "No contacts found."
-    except psycopg2.Error as pe:
-        logger.error(f"Error retrieving contacts from the database: {str(pe)}")
-        return "Failed to retrieve contacts"
+        with conn.cursor(name="contacts_stream") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(select_query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(zip(columns, row)) for row in rows]
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 # Function to list all favorite contacts
@@ -275,4 +425,396 @@ def list_favorite_contacts():
         logger.error(f"Error retrieving favorite contacts from the database: {str(pe)}")
         return "Failed to retrieve favorite contacts"
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+
+# Function to validate many contact rows in one pass per column
+def normalize_contact_id(value):
+    """
+    Return value as an int contact ID, or None if it is not one.
+
+    Accepts ints and integer strings such as "42", so IDs compare equal to
+    the ones PostgreSQL returns.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return None
+
+
+def validate_contact_rows(rows, require_email_and_phone=True):
+    """
+    Validate contact dicts with the same rules as add_contact.
+
+    Emails and phone numbers are checked column by column rather than row by
+    row. A missing email or phone is only an error when
+    require_email_and_phone is set; update rows only validate what they change.
+    A contact_id is normalized with normalize_contact_id; valid rows are
+    copies holding the int ID.
+
+    Returns:
+        tuple: (valid, errors) where valid is a list of (index, row) pairs and
+        errors is a list of (index, message) pairs.
+    """
+    allowed = set(CONTACT_FIELDS) | {"contact_id"}
+    emails = [row.get("email") for row in rows]
+    phones = [row.get("phone") for row in rows]
+    email_ok = [
+        (not require_email_and_phone) if value is None else validate_email(value)
+        for value in emails
+    ]
+    phone_ok = [
+        (not require_email_and_phone) if value is None else validate_phone(value)
+        for value in phones
+    ]
+
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        unknown = set(row) - allowed
+        if unknown:
+            errors.append((index, f"Unknown contact field(s): {', '.join(sorted(unknown))}"))
+        elif not email_ok[index]:
+            errors.append((index, f"Invalid email format: {emails[index]}"))
+        elif not phone_ok[index]:
+            errors.append((index, f"Invalid phone number: {phones[index]}"))
+        elif "contact_id" in row and normalize_contact_id(row["contact_id"]) is None:
+            errors.append((index, f"Invalid contact_id: {row['contact_id']!r}"))
+        elif "contact_id" in row:
+            valid.append(
+                (index, {**row, "contact_id": normalize_contact_id(row["contact_id"])})
+            )
+        else:
+            valid.append((index, row))
+    return valid, errors
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start : start + batch_size]
+
+
+def _write_rows_individually(conn, query, indexed_params, result, fetch_id=False):
+    # Fallback after a failed batch: one savepoint per row isolates the bad
+    # rows while the rest of the batch still commits in one transaction.
+    batch_result = BulkResult()
+    with conn.cursor() as cursor:
+        for index, params in indexed_params:
+            cursor.execute("SAVEPOINT bulk_row")
+            try:
+                cursor.execute(query, params)
+                row = cursor.fetchone() if fetch_id else None
+                cursor.execute("RELEASE SAVEPOINT bulk_row")
+            except psycopg2.Error as pe:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                batch_result.add_error(index, str(pe).strip())
+                continue
+            if fetch_id and row is None:
+                # An UPDATE ... RETURNING that matched no contact
+                batch_result.add_error(index, f"Contact with ID {params[-1]} not found.")
+                continue
+            contact_id = row[0] if fetch_id else None
+            batch_result.succeeded += 1
+            if fetch_id:
+                batch_result.contact_ids.append(contact_id)
+    conn.commit()
+
+    # Only merge once the batch is committed so a lost connection never
+    # reports rows as written
+    result.succeeded += batch_result.succeeded
+    result.contact_ids.extend(batch_result.contact_ids)
+    result.errors.extend(batch_result.errors)
+
+
+_contact_column_types = None
+
+
+def _column_types(cursor):
+    # VALUES lists carry no column types, so every value in a bulk UPDATE
+    # ... FROM (VALUES ...) is cast to the type of the column it is written to
+    global _contact_column_types
+    if _contact_column_types is None:
+        cursor.execute(
+            "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'contacts'::regclass AND attnum > 0 AND NOT attisdropped"
+        )
+        _contact_column_types = dict(cursor.fetchall())
+    return _contact_column_types
+
+
+def _fail_all(result, indexed_rows, message):
+    for index, _ in indexed_rows:
+        result.add_error(index, message)
+    return result
+
+
+# Function to add many contacts with multi-row inserts
+def add_contacts(contacts, batch_size=BULK_BATCH_SIZE):
+    """
+    Insert contact dicts (keys from CONTACT_FIELDS) in batches.
+
+    Each batch is a single multi-row INSERT committed in its own transaction.
+    If a batch is rejected by the database it is retried row by row so only
+    the offending rows fail.
+
+    Returns:
+        BulkResult: Inserted contact IDs and per-row errors keyed by the
+        row's index in contacts.
+    """
+    result = BulkResult()
+    valid, errors = validate_contact_rows(contacts)
+    for index, message in errors:
+        result.add_error(index, message)
+    if not valid:
+        return result
+
+    conn = get_db_connection()
+    if conn is None:
+        return _fail_all(result, valid, "Failed to connect to the database")
+
+    columns = sql.SQL(", ").join(map(sql.Identifier, CONTACT_FIELDS))
+    batch_query = sql.SQL(
+        "INSERT INTO contacts ({}) VALUES %s RETURNING contact_id"
+    ).format(columns)
+    row_query = sql.SQL("INSERT INTO contacts ({}) VALUES ({}) RETURNING contact_id").format(
+        columns, sql.SQL(", ").join(sql.Placeholder() * len(CONTACT_FIELDS))
+    )
+
+    position = 0
+    try:
+        for batch in _batches(valid, batch_size):
+            params = [
+                (
+                    index,
+                    tuple(
+                        row.get(name, False if name == "is_favorite" else None)
+                        for name in CONTACT_FIELDS
+                    ),
+                )
+                for index, row in batch
+            ]
+            try:
+                with conn.cursor() as cursor:
+                    inserted = execute_values(
+                        cursor,
+                        batch_query,
+                        [values for _, values in params],
+                        page_size=batch_size,
+                        fetch=True,
+                    )
+                conn.commit()
+                result.succeeded += len(inserted)
+                result.contact_ids.extend(row[0] for row in inserted)
+            except psycopg2.Error as pe:
+                conn.rollback()
+                logger.warning(f"Bulk insert batch failed, retrying row by row: {str(pe)}")
+                _write_rows_individually(conn, row_query, params, result, fetch_id=True)
+            position += len(batch)
+    except psycopg2.Error as pe:
+        logger.error(f"Error adding contacts to the database: {str(pe)}")
+        _fail_all(result, valid[position:], f"Failed to add contact: {str(pe).strip()}")
+    finally:
+        release_db_connection(conn)
+
+    if result.succeeded:
+        _notify_contacts_changed()
+    logger.info(
+        f"Bulk add: {result.succeeded} contact(s) added, {len(result.errors)} failed."
+    )
+    return result
+
+
+# Function to update many contacts in batched transactions
+def update_contacts(updates, batch_size=BULK_BATCH_SIZE):
+    """
+    Apply update dicts, each holding a contact_id plus the fields to change.
+
+    Updates that change the same set of fields share one UPDATE ... FROM
+    (VALUES ...) statement per page, one transaction per batch.
+
+    Returns:
+        BulkResult: Updated contact IDs and per-row errors, including IDs
+        that did not exist and repeated IDs after the first, keyed by the
+        row's index in updates.
+    """
+    result = BulkResult()
+    valid, errors = validate_contact_rows(updates, require_email_and_phone=False)
+    for index, message in errors:
+        result.add_error(index, message)
+
+    groups = {}
+    seen_ids = set()
+    for index, row in valid:
+        if "contact_id" not in row:
+            result.add_error(index, "Missing contact_id")
+            continue
+        columns = tuple(sorted(key for key in row if key != "contact_id"))
+        if not columns:
+            result.add_error(index, "No fields to update")
+            continue
+        # One UPDATE ... FROM (VALUES ...) applies only one of several rows
+        # for the same contact, so later ones are refused
+        if row["contact_id"] in seen_ids:
+            result.add_error(index, f"Duplicate update for contact ID {row['contact_id']}.")
+            continue
+        seen_ids.add(row["contact_id"])
+        groups.setdefault(columns, []).append((index, row))
+    if not groups:
+        return result
+
+    conn = get_db_connection()
+    if conn is None:
+        rows = [item for group in groups.values() for item in group]
+        return _fail_all(result, rows, "Failed to connect to the database")
+
+    batches = [
+        (columns, batch)
+        for columns, rows in groups.items()
+        for batch in _batches(rows, batch_size)
+    ]
+    position = 0
+    try:
+        for columns, batch in batches:
+            assignments = sql.SQL(", ").join(
+                sql.SQL("{0} = v.{0}").format(sql.Identifier(name)) for name in columns
+            )
+            value_names = sql.SQL(", ").join(
+                map(sql.Identifier, ("contact_id",) + columns + ("updated_at",))
+            )
+            batch_query = sql.SQL(
+                "UPDATE contacts AS c SET {}, updated_at = v.updated_at "
+                "FROM (VALUES %s) AS v ({}) "
+                "WHERE c.contact_id = v.contact_id RETURNING c.contact_id"
+            ).format(assignments, value_names)
+            row_query = sql.SQL(
+                "UPDATE contacts SET {}, updated_at = %s WHERE contact_id = %s "
+                "RETURNING contact_id"
+            ).format(
+                sql.SQL(", ").join(
+                    sql.SQL("{} = %s").format(sql.Identifier(name)) for name in columns
+                )
+            )
+            updated_at = datetime.now()
+            try:
+                with conn.cursor() as cursor:
+                    types = _column_types(cursor)
+                    template = "({})".format(
+                        ", ".join(
+                            f"%s::{types[name]}"
+                            for name in ("contact_id",) + columns + ("updated_at",)
+                        )
+                    )
+                    updated = execute_values(
+                        cursor,
+                        batch_query,
+                        [
+                            (row["contact_id"],)
+                            + tuple(row[name] for name in columns)
+                            + (updated_at,)
+                            for _, row in batch
+                        ],
+                        template=template,
+                        page_size=batch_size,
+                        fetch=True,
+                    )
+                conn.commit()
+                updated_ids = {row[0] for row in updated}
+                for index, row in batch:
+                    if row["contact_id"] in updated_ids:
+                        result.succeeded += 1
+                        result.contact_ids.append(row["contact_id"])
+                    else:
+                        result.add_error(
+                            index, f"Contact with ID {row['contact_id']} not found."
+                        )
+            except psycopg2.Error as pe:
+                conn.rollback()
+                logger.warning(
+                    f"Bulk update batch failed, retrying row by row: {str(pe)}"
+                )
+                params = [
+                    (
+                        index,
+                        tuple(row[name] for name in columns)
+                        + (updated_at, row["contact_id"]),
+                    )
+                    for index, row in batch
+                ]
+                _write_rows_individually(conn, row_query, params, result, fetch_id=True)
+            position += 1
+    except psycopg2.Error as pe:
+        logger.error(f"Error updating contacts in the database: {str(pe)}")
+        unwritten = [item for _, batch in batches[position:] for item in batch]
+        _fail_all(result, unwritten, f"Failed to update contact: {str(pe).strip()}")
+    finally:
+        release_db_connection(conn)
+
+    if result.succeeded:
+        _notify_contacts_changed()
+    logger.info(
+        f"Bulk update: {result.succeeded} contact(s) updated, {len(result.errors)} failed."
+    )
+    return result
+
+
+# Function to delete many contacts by ID
+def delete_contacts(contact_ids, batch_size=BULK_BATCH_SIZE):
+    """
+    Delete contacts by ID with one DELETE ... = ANY(...) per batch.
+
+    Returns:
+        BulkResult: Deleted contact IDs and per-row errors for IDs that were
+        invalid, repeated or did not exist, keyed by the ID's index in
+        contact_ids.
+    """
+    result = BulkResult()
+    indexed_ids, seen_ids = [], set()
+    for index, value in enumerate(contact_ids):
+        contact_id = normalize_contact_id(value)
+        if contact_id is None:
+            result.add_error(index, f"Invalid contact_id: {value!r}")
+        elif contact_id in seen_ids:
+            result.add_error(index, f"Duplicate contact ID {contact_id}.")
+        else:
+            seen_ids.add(contact_id)
+            indexed_ids.append((index, contact_id))
+    if not indexed_ids:
+        return result
+
+    conn = get_db_connection()
+    if conn is None:
+        return _fail_all(result, indexed_ids, "Failed to connect to the database")
+
+    position = 0
+    try:
+        for batch in _batches(indexed_ids, batch_size):
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM contacts WHERE contact_id = ANY(%s) RETURNING contact_id",
+                    ([contact_id for _, contact_id in batch],),
+                )
+                deleted = {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            for index, contact_id in batch:
+                if contact_id in deleted:
+                    result.succeeded += 1
+                    result.contact_ids.append(contact_id)
+                else:
+                    result.add_error(index, f"Contact with ID {contact_id} not found.")
+            position += len(batch)
+    except psycopg2.Error as pe:
+        logger.error(f"Error deleting contacts from the database: {str(pe)}")
+        _fail_all(
+            result, indexed_ids[position:], f"Failed to delete contact: {str(pe).strip()}"
+        )
+    finally:
+        release_db_connection(conn)
+
+    if result.succeeded:
+        _notify_contacts_changed()
+    logger.info(
+        f"Bulk delete: {result.succeeded} contact(s) deleted, {len(result.errors)} failed."
+    )
+    return result
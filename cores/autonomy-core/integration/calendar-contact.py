@@ -18,9 +18,14 @@ python_path = os.getenv("PYTHONPATH")
 if python_path:
     sys.path.append(python_path)
 
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+
 # Now you can import your modules after setting the PYTHONPATH
-from calendar_services.calendar_service import add_event, update_event
+from calendar_services.calendar_service import invalidate_event_cache, update_event
 from contact_management.contact_service import view_contact
+from shared.infrastructure import get_pool
+from shared.utils import configure_logging
 
 
 # Configure logging
@@ -34,70 +39,225 @@ if not os.path.exists(log_file):
     with open(log_file, "w") as f:
         pass  # Create the file
 
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+configure_logging(log_file, level=logging.INFO)
 logger = logging.getLogger("calendar_contact_logger")
 
-# Fetch PostgreSQL connection details
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT")
-db_name = os.getenv("DB_NAME")
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-
 
 def get_db_connection():
     try:
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password,
-        )
-        return conn
+        return get_pool().getconn()
     except psycopg2.Error as pe:
         logger.error(f"Error connecting to the database: {str(pe)}")
         return None
 
 
-def add_contact_birthdays_to_calendar():
+def release_db_connection(conn):
+    get_pool().putconn(conn)
+
+
+# Schema for the set-based birthday sync. Birthday events record the
+# contact and year they were made for, and a partial unique index over just
+# those rows backs ON CONFLICT, so other events may still share a name and
+# date. Birthday events made before these columns existed are adopted by
+# name, one per contact and year; nothing is deleted. contacts.changed_at
+# is stamped by the database on every write, so incremental syncs do not
+# depend on client clocks, and a watermark table records how far they have
+# got.
+BIRTHDAY_SYNC_SCHEMA_SQL = """
+SELECT pg_advisory_xact_lock(7214005);
+
+DROP INDEX IF EXISTS events_event_name_event_date_key;
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS contact_id integer
+    REFERENCES contacts (contact_id) ON DELETE CASCADE;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS birthday_year integer;
+
+CREATE UNIQUE INDEX IF NOT EXISTS events_contact_birthday_key
+    ON events (contact_id, birthday_year) WHERE contact_id IS NOT NULL;
+
+UPDATE events e
+SET contact_id = adopted.contact_id, birthday_year = adopted.year
+FROM (
+    SELECT DISTINCT ON (c.contact_id, extract(year FROM ev.event_date))
+           ev.event_id, c.contact_id, extract(year FROM ev.event_date)::int AS year
+    FROM events ev
+    JOIN contacts c
+      ON ev.event_name = concat(c.first_name, ' ', c.last_name, '''s Birthday')
+    WHERE ev.contact_id IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM events taken
+          WHERE taken.contact_id = c.contact_id
+            AND taken.birthday_year = extract(year FROM ev.event_date)
+      )
+    ORDER BY c.contact_id, extract(year FROM ev.event_date), ev.event_id
+) adopted
+WHERE e.event_id = adopted.event_id;
+
+ALTER TABLE contacts ADD COLUMN IF NOT EXISTS changed_at timestamptz
+    NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION contacts_changed_at_update() RETURNS trigger AS $$
+BEGIN
+    NEW.changed_at := clock_timestamp();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS contacts_changed_at_trigger ON contacts;
+CREATE TRIGGER contacts_changed_at_trigger
+    BEFORE INSERT OR UPDATE ON contacts
+    FOR EACH ROW EXECUTE FUNCTION contacts_changed_at_update();
+
+CREATE INDEX IF NOT EXISTS contacts_changed_at_idx ON contacts (changed_at);
+
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    sync_name text PRIMARY KEY,
+    watermark timestamptz NOT NULL
+);
+ALTER TABLE sync_watermarks ALTER COLUMN watermark TYPE timestamptz;
+"""
+
+# Birthdays are moved to the requested year; make_interval turns 29 February
+# into 28 February in non-leap years instead of failing. Each changed
+# contact's event for the year is created, brought up to date with its name
+# and birthday, or removed when the birthday was cleared.
+BIRTHDAY_SYNC_SQL = """
+WITH changed AS (
+    SELECT contact_id, first_name, last_name, birthday
+    FROM contacts
+    WHERE TRUE {incremental_filter}
+), source AS (
+    SELECT contact_id,
+           concat(first_name, ' ', last_name, '''s Birthday') AS event_name,
+           (birthday + make_interval(
+               years => %(year)s - extract(year FROM birthday)::int))::date AS event_date
+    FROM changed
+    WHERE birthday IS NOT NULL
+), removed AS (
+    DELETE FROM events e
+    USING changed c
+    WHERE e.contact_id = c.contact_id
+      AND e.birthday_year = %(year)s
+      AND c.birthday IS NULL
+    RETURNING 1
+), upserted AS (
+    INSERT INTO events (event_name, event_date, contact_id, birthday_year)
+    SELECT event_name, event_date, contact_id, %(year)s FROM source
+    ON CONFLICT (contact_id, birthday_year) WHERE contact_id IS NOT NULL
+    DO UPDATE SET event_name = EXCLUDED.event_name, event_date = EXCLUDED.event_date
+    WHERE (events.event_name, events.event_date)
+          IS DISTINCT FROM (EXCLUDED.event_name, EXCLUDED.event_date)
+    RETURNING xmax = 0 AS inserted
+)
+SELECT (SELECT count(*) FILTER (WHERE inserted) FROM upserted),
+       (SELECT count(*) FILTER (WHERE NOT inserted) FROM upserted),
+       (SELECT count(*) FROM removed),
+       (SELECT count(*) FROM changed)
+"""
+
+# A contact written by a transaction still open when a sync starts can
+# commit after it with an earlier changed_at, so the next sync resumes from
+# the start of the oldest open writing transaction rather than from the
+# newest change it saw. Run as its own statement before the sync, so
+# anything that commits in between is visible to the sync's snapshot.
+# xact_start is only visible for sessions of the same database role.
+SYNC_BOUND_SQL = """
+SELECT least(clock_timestamp(), min(xact_start))
+FROM pg_stat_activity
+WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid()
+"""
+
+# Watermarks of the earlier updated_at-based sync are kept under the old
+# name and ignored
+BIRTHDAY_SYNC_NAME = "contact_birthday_events"
+
+
+def ensure_birthday_sync_schema():
     conn = get_db_connection()
     if conn is None:
         return "Failed to connect to the database"
 
     try:
         with conn.cursor() as cursor:
-            cursor.execute(
-                "SELECT contact_id, first_name, last_name, birthday FROM contacts WHERE birthday IS NOT NULL"
-            )
-            contacts = cursor.fetchall()
+            cursor.execute(BIRTHDAY_SYNC_SCHEMA_SQL)
+            conn.commit()
+            logger.info("Birthday sync schema is up to date.")
+            return "Birthday sync schema is up to date."
+    except psycopg2.Error as pe:
+        conn.rollback()
+        logger.error(f"Error applying the birthday sync schema: {str(pe)}")
+        return "Failed to apply the birthday sync schema"
+    finally:
+        release_db_connection(conn)
+
+
+def add_contact_birthdays_to_calendar(incremental=False, year=None):
+    """
+    Sync this year's birthday events with the contacts in a single statement.
+
+    Each contact has at most one birthday event per year, found by
+    (contact_id, birthday_year): it is created if missing, renamed or moved
+    when the contact's name or birthday changed, and removed when the
+    birthday was cleared, so the whole sync is one round trip and one
+    commit. With incremental=True only contacts changed since the last
+    sync's watermark are considered, and the watermark is advanced in the
+    same transaction. Each year has its own watermark, so the first sync of
+    a year is a full pass.
+    """
+    year = year or datetime.now().year
+    sync_name = f"{BIRTHDAY_SYNC_NAME}:{year}"
+    conn = get_db_connection()
+    if conn is None:
+        return "Failed to connect to the database"
 
-            for contact in contacts:
-                contact_id, first_name, last_name, birthday = contact
-                event_name = f"{first_name} {last_name}'s Birthday"
-                event_date = birthday.replace(
-                    year=datetime.now().year
-                )  # Set event for this year
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SYNC_BOUND_SQL)
+            bound = cursor.fetchone()[0]
 
-                # Check if the event already exists
+            params = {"year": year}
+            incremental_filter = ""
+            if incremental:
                 cursor.execute(
-                    "SELECT * FROM events WHERE event_name = %s AND event_date = %s",
-                    (event_name, event_date),
+                    "SELECT watermark FROM sync_watermarks WHERE sync_name = %s",
+                    (sync_name,),
                 )
-                if cursor.fetchone():
-                    logger.info(f"Event '{event_name}' already exists in the calendar.")
-                else:
-                    add_event(event_name, event_date.strftime("%Y-%m-%d"))
-                    logger.info(f"Added event '{event_name}' to the calendar.")
+                row = cursor.fetchone()
+                if row:
+                    params["watermark"] = row[0]
+                    incremental_filter = "AND changed_at >= %(watermark)s"
+
+            cursor.execute(
+                BIRTHDAY_SYNC_SQL.format(incremental_filter=incremental_filter), params
+            )
+            added, updated, removed, considered = cursor.fetchone()
 
+            cursor.execute(
+                """
+                INSERT INTO sync_watermarks (sync_name, watermark)
+                VALUES (%s, %s)
+                ON CONFLICT (sync_name) DO UPDATE
+                SET watermark = GREATEST(sync_watermarks.watermark, EXCLUDED.watermark)
+                """,
+                (sync_name, bound),
+            )
+            conn.commit()
+
+        if added or updated or removed:
+            invalidate_event_cache()
+        logger.info(
+            f"Birthday sync over {considered} contact(s): {added} event(s) added, "
+            f"{updated} updated, {removed} removed."
+        )
+        return (
+            f"Birthday events: {added} added, {updated} updated, {removed} removed."
+        )
     except Exception as e:
-        logger.error(f"Error adding birthdays to calendar: {str(e)}")
+        conn.rollback()
+        logger.error(f"Error syncing birthdays to calendar: {str(e)}")
+        return "Failed to sync birthdays to the calendar"
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 
 def update_calendar_events_for_contact(contact_id):
@@ -122,5 +282,6 @@ def update_calendar_events_for_contact(contact_id):
 
 # Example usage
 if __name__ == "__main__":
-    add_contact_birthdays_to_calendar()
+    ensure_birthday_sync_schema()
+    add_contact_birthdays_to_calendar(incremental=True)
     update_calendar_events_for_contact(1)
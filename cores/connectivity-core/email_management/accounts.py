@@ -0,0 +1,181 @@
+"""
+Email accounts and their IMAP connections.
+
+Accounts are listed in config.json under "accounts":
+
+    {"name": "personal", "host": "imap.gmail.com", "port": 993,
+     "user": "me@gmail.com", "password_env": "PERSONAL_EMAIL_PASS",
+     "ssl": true, "rate_limit": 10, "burst": 20}
+
+Passwords are never stored in config.json; password_env names the
+environment variable that holds it. "ssl": false connects without TLS,
+e.g. to the local stand-in server in imap_standin.py (see
+check_accounts.py). rate_limit and burst bound the IMAP
+commands per second sent to that account.
+
+Without "accounts", the single account from EMAIL_HOST, EMAIL_PORT,
+EMAIL_USER and EMAIL_PASS is used as before.
+"""
+
+import imaplib
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.metrics import histogram
+from shared.utils import TokenBucket
+
+DEFAULT_RATE_LIMIT = 10
+DEFAULT_BURST = 20
+
+IMAP_COMMAND_SECONDS = histogram(
+    "nexus_imap_command_seconds",
+    "IMAP command round trips, from sending the command to its tagged "
+    "response, including any rate limit wait.",
+    ["account", "command"],
+)
+IMAP_RATE_LIMIT_SECONDS = histogram(
+    "nexus_imap_rate_limit_wait_seconds",
+    "Time IMAP commands waited for the account's rate limiter.",
+    ["account"],
+)
+
+
+@dataclass
+class EmailAccount:
+    name: str
+    host: str
+    port: int
+    user: str
+    password: str
+    ssl: bool = True
+    rate_limit: float = DEFAULT_RATE_LIMIT
+    burst: float = DEFAULT_BURST
+
+
+class _RateLimitedMixin:
+    # Set per connection; every IMAP command takes a token first
+    rate_limiter = None
+    account_name = None
+
+    def _command(self, name, *args):
+        if self.rate_limiter is not None:
+            started = time.perf_counter()
+            self.rate_limiter.acquire()
+            IMAP_RATE_LIMIT_SECONDS.labels(account=self.account_name or "").observe(
+                time.perf_counter() - started
+            )
+        return super()._command(name, *args)
+
+    def _simple_command(self, name, *args):
+        # UID FETCH, UID STORE... are told apart by their first argument
+        command = f"UID {args[0].upper()}" if name == "UID" and args else name
+        started = time.perf_counter()
+        try:
+            return super()._simple_command(name, *args)
+        finally:
+            IMAP_COMMAND_SECONDS.labels(
+                account=self.account_name or "", command=command
+            ).observe(time.perf_counter() - started)
+
+
+class RateLimitedIMAP4(_RateLimitedMixin, imaplib.IMAP4):
+    pass
+
+
+class RateLimitedIMAP4_SSL(_RateLimitedMixin, imaplib.IMAP4_SSL):
+    pass
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def _rate_limiter(account):
+    # One bucket per account, shared by all of its connections, which may
+    # be opened from several account threads at once
+    with _rate_limiters_lock:
+        if account.name not in _rate_limiters:
+            _rate_limiters[account.name] = TokenBucket(account.rate_limit, account.burst)
+        return _rate_limiters[account.name]
+
+
+def account_from_env():
+    """
+    Return the single account described by the EMAIL_* environment
+    variables, or None if any of them is missing or invalid.
+    """
+    host = os.getenv("EMAIL_HOST", "")
+    port = os.getenv("EMAIL_PORT", "")
+    user = os.getenv("EMAIL_USER", "")
+    password = os.getenv("EMAIL_PASS", "")
+    if not all([host, port, user, password]):
+        logging.error("Missing one or more required environment variables.")
+        return None
+    try:
+        port = int(port)
+    except ValueError:
+        logging.error("EMAIL_PORT is not a valid integer.")
+        return None
+    return EmailAccount(name=user, host=host, port=port, user=user, password=password)
+
+
+def load_accounts(config):
+    """
+    Return the configured EmailAccounts, skipping (and logging) invalid ones.
+    """
+    entries = config.get("accounts") or []
+    if not entries:
+        account = account_from_env()
+        return [account] if account else []
+
+    accounts = []
+    for entry in entries:
+        name = entry.get("name") or entry.get("user")
+        password = os.getenv(entry.get("password_env", ""), "")
+        try:
+            accounts.append(
+                EmailAccount(
+                    name=name,
+                    host=entry["host"],
+                    port=int(entry.get("port", 993 if entry.get("ssl", True) else 143)),
+                    user=entry["user"],
+                    password=password,
+                    ssl=entry.get("ssl", True),
+                    rate_limit=entry.get("rate_limit", DEFAULT_RATE_LIMIT),
+                    burst=entry.get("burst", DEFAULT_BURST),
+                )
+            )
+        except (KeyError, ValueError) as e:
+            logging.error(f"Skipping invalid email account '{name}': {str(e)}")
+            continue
+        if not password:
+            logging.warning(f"No password in ${entry.get('password_env')} for account '{name}'.")
+    return accounts
+
+
+def connect_to_account(account):
+    """
+    Log in to an account over a rate-limited connection.
+
+    Returns:
+        The IMAP connection, or None if connecting or logging in failed.
+    """
+    connection_class = RateLimitedIMAP4_SSL if account.ssl else RateLimitedIMAP4
+    try:
+        mail = connection_class(account.host, account.port)
+        mail.rate_limiter = _rate_limiter(account)
+        mail.account_name = account.name
+        mail.login(account.user, account.password)
+        logging.info(f"Connected to {account.host} as '{account.name}' successfully.")
+        return mail
+    except imaplib.IMAP4.error as e:
+        logging.error(f"IMAP error during connection for '{account.name}': {str(e)}")
+    except Exception as e:
+        logging.error(f"Failed to connect to {account.host} for '{account.name}': {str(e)}")
+    return None
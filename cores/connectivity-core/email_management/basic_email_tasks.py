@@ -4,6 +4,15 @@ import logging
 import json
 import os
 from datetime import datetime, timedelta, timezone
+from imap_utils import (
+    IMAP_BATCH_SIZE,
+    compress_uid_set,
+    parse_fetch_response,
+    quote_astring,
+    uid_batches,
+)
+from sorting_rules import load_sorting_rules
+from sync_state import MailboxSync, get_sync_state
 
 # Load configuration settings from the config.json file
 try:
@@ -53,22 +62,19 @@ def process_email(mail, e_id, sorting_rules, config):
                 date = msg.get("Date")
 
                 if subject and from_:
-                    subject_lower = subject.lower()
-                    from_lower = from_.lower()
                     labels_applied = []
 
-                    for rule in sorting_rules:
-                        if rule["condition"](subject_lower, from_lower):
-                            status, _ = mail.store(e_id, "+X-GM-LABELS", rule["label"])
-                            if status == "OK":
-                                logging.info(
-                                    f"Labeled email from {from_} with subject '{subject}' as '{rule['label']}' on {date}"
-                                )
-                                labels_applied.append(rule["label"])
-                            else:
-                                logging.error(
-                                    f"Failed to label email from {from_} with subject '{subject}' as '{rule['label']}'"
-                                )
+                    for label in sorting_rules.match(subject, from_):
+                        status, _ = mail.store(e_id, "+X-GM-LABELS", label)
+                        if status == "OK":
+                            logging.info(
+                                f"Labeled email from {from_} with subject '{subject}' as '{label}' on {date}"
+                            )
+                            labels_applied.append(label)
+                        else:
+                            logging.error(
+                                f"Failed to label email from {from_} with subject '{subject}' as '{label}'"
+                            )
 
                     if labels_applied and config.get("auto_archive_after_sort", False):
                         mail.store(e_id, "+FLAGS", "\\Archive")
@@ -85,91 +91,154 @@ def process_email(mail, e_id, sorting_rules, config):
         )
 
 
-def automatically_sort_emails(mail, config):
-    try:
-        sorting_rules = config.get(
-            "custom_sorting_rules",
-            [
-                {
-                    "condition": lambda subject, from_: "invoice" in subject,
-                    "label": "Invoices",
-                },
-                {
-                    "condition": lambda subject, from_: "newsletter" in subject,
-                    "label": "Newsletters",
-                },
-                {
-                    "condition": lambda subject, from_: "order confirmation" in subject
-                    or "purchase" in subject,
-                    "label": "Shopping",
-                },
-                {
-                    "condition": lambda subject, from_: "shipment" in subject
-                    or "tracking" in subject,
-                    "label": "Shipping",
-                },
-                {
-                    "condition": lambda subject, from_: "game" in subject
-                    or "gaming" in subject,
-                    "label": "Gaming",
-                },
-                {
-                    "condition": lambda subject, from_: "sale" in subject
-                    or "discount" in subject,
-                    "label": "Promotions",
-                },
-                {
-                    "condition": lambda subject, from_: "subscription" in subject
-                    or "renewal" in subject,
-                    "label": "Subscriptions",
-                },
-                {
-                    "condition": lambda subject, from_: "support" in subject
-                    or "help" in subject,
-                    "label": "Support",
-                },
-                {
-                    "condition": lambda subject, from_: "social" in subject
-                    or "friend request" in subject,
-                    "label": "Social",
-                },
-                {
-                    "condition": lambda subject, from_: "security alert" in subject
-                    or "password reset" in subject,
-                    "label": "Security",
-                },
-            ],
-        )
+def sort_emails_batched(mail, uids, sorting_rules, config):
+    """
+    Label messages with a handful of round trips per batch of UIDs.
 
-        if not config.get("rescan_all", False) and not config.get(
-            "only_sort_recent", False
-        ):
-            # Skip emails that already have one of the labels
-            label_conditions = " ".join(
-                [f'"{rule["label"]}"' for rule in sorting_rules]
-            )
-            search_criteria = f"ALL NOT X-GM-LABELS {label_conditions}"
-        elif config.get("only_sort_recent", False):
-            # Only sort emails received within the last 24 hours
-            search_criteria = f'(SINCE "{(datetime.now(timezone.utc) - timedelta(days=1)).strftime("%d-%b-%Y")}")'
-        else:
-            search_criteria = "ALL"
+    Headers for the whole batch come back from one UID FETCH, the rules are
+    evaluated locally, and each label is applied with one UID STORE over the
+    message set of every UID that matched it.
 
+    Returns:
+        bool: True if every batch was processed without an error.
+    """
+    batch_size = config.get("imap_batch_size", IMAP_BATCH_SIZE)
+    complete = True
+    for batch in uid_batches(uids, batch_size):
         try:
-            status, response = mail.search(None, search_criteria)
-            if status == "OK":
-                all_msg_nums = response[0].split()[
-                    : config.get("max_emails_per_run", 100)
-                ]
-            else:
-                logging.error("Failed to search for all emails.")
-                return
+            status, data = mail.uid(
+                "FETCH",
+                compress_uid_set(batch),
+                "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE)])",
+            )
+            if status != "OK":
+                logging.error(f"Failed to fetch headers for {len(batch)} emails.")
+                complete = False
+                continue
+
+            uids_by_label = {}
+            for uid, items in parse_fetch_response(data).items():
+                msg = email.message_from_bytes(next(iter(items.values())))
+                subject = msg["Subject"]
+                from_ = msg.get("From")
+                if not (subject and from_):
+                    logging.warning(f"Email UID {uid} has no subject or from address.")
+                    continue
+
+                for label in sorting_rules.match(subject, from_):
+                    uids_by_label.setdefault(label, []).append(uid)
+
+            for label, label_uids in uids_by_label.items():
+                status, _ = mail.uid(
+                    "STORE",
+                    compress_uid_set(label_uids),
+                    "+X-GM-LABELS",
+                    quote_astring(label),
+                )
+                if status == "OK":
+                    logging.info(f"Labeled {len(label_uids)} email(s) as '{label}'")
+                else:
+                    complete = False
+                    logging.error(
+                        f"Failed to label {len(label_uids)} email(s) as '{label}'"
+                    )
+
+            if uids_by_label and config.get("auto_archive_after_sort", False):
+                labeled = {uid for uids in uids_by_label.values() for uid in uids}
+                mail.uid("STORE", compress_uid_set(labeled), "+FLAGS", "\\Archive")
+                logging.info(f"Archived {len(labeled)} email(s) after labeling.")
         except Exception as e:
-            logging.error(f"An error occurred while searching for emails: {str(e)}")
+            complete = False
+            logging.error(
+                f"An error occurred while sorting a batch of {len(batch)} emails: {str(e)}"
+            )
+    return complete
+
+
+def sort_new_emails(mail, sorting_rules, config):
+    """
+    Sort only the messages that arrived since the last run.
+
+    The UIDs above the stored watermark are sorted in ascending batches and
+    the watermark is advanced after each, so a crash resumes where it left
+    off. max_emails_per_run caps a run without starving older messages:
+    the next run continues from the watermark.
+    """
+    sync = MailboxSync(get_sync_state(config), "sort").begin(mail)
+    uids = sync.new_uids(mail)
+    limit = config.get("max_emails_per_run")
+    truncated = bool(limit) and len(uids) > limit
+    if truncated:
+        logging.info(f"Sorting the oldest {limit} of {len(uids)} new emails this run.")
+        uids = uids[:limit]
+
+    for batch in uid_batches(uids, config.get("imap_batch_size", IMAP_BATCH_SIZE)):
+        if not sort_emails_batched(mail, batch, sorting_rules, config):
+            logging.error("Stopping at a failed batch; the next run retries it.")
             return
+        sync.checkpoint(batch[-1])
+
+    if not truncated:
+        sync.finish()
+    logging.info(f"Sorted {len(uids)} new email(s).")
+
+
+def sort_emails_by_search(mail, sorting_rules, config):
+    """
+    Sort the messages matched by the rescan_all / only_sort_recent search.
+
+    Returns:
+        bool: False if the search itself failed.
+    """
+    if not config.get("rescan_all", False) and not config.get(
+        "only_sort_recent", False
+    ):
+        # Skip emails that already have one of the labels
+        label_conditions = " ".join(
+            [f'"{label}"' for label in sorting_rules.labels]
+        )
+        search_criteria = f"ALL NOT X-GM-LABELS {label_conditions}"
+    elif config.get("only_sort_recent", False):
+        # Only sort emails received within the last 24 hours
+        search_criteria = f'(SINCE "{(datetime.now(timezone.utc) - timedelta(days=1)).strftime("%d-%b-%Y")}")'
+    else:
+        search_criteria = "ALL"
+
+    batch_sort = config.get("batch_sort", True)
+    try:
+        if batch_sort:
+            status, response = mail.uid("SEARCH", None, search_criteria)
+        else:
+            status, response = mail.search(None, search_criteria)
+        if status == "OK":
+            all_msg_nums = response[0].split()[
+                : config.get("max_emails_per_run", 100)
+            ]
+        else:
+            logging.error("Failed to search for all emails.")
+            return False
+    except Exception as e:
+        logging.error(f"An error occurred while searching for emails: {str(e)}")
+        return False
 
+    if batch_sort:
+        sort_emails_batched(
+            mail, [int(uid) for uid in all_msg_nums], sorting_rules, config
+        )
+    else:
         for e_id in all_msg_nums:
             process_email(mail, e_id, sorting_rules, config)
+    return True
+
+
+def automatically_sort_emails(mail, config):
+    try:
+        sorting_rules = load_sorting_rules(config)
+
+        if config.get("incremental_sync", True):
+            sort_new_emails(mail, sorting_rules, config)
+        elif not sort_emails_by_search(mail, sorting_rules, config):
+            return
 
         try:
             mail.expunge()
@@ -0,0 +1,196 @@
+"""
+Microbenchmark for email body extraction.
+
+Builds a synthetic mbox of plain, HTML-only, multipart/alternative, nested
+multipart/mixed with attachments and non-UTF-8 messages, then times the
+previous header-by-header conversion against extract_email and reports how
+many bodies each recovers.
+
+    python benchmark_email_parsing.py --messages 2000 --repeat 3
+"""
+
+import argparse
+import email
+import logging
+import mailbox
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from email.header import decode_header
+from email.message import EmailMessage
+from email.policy import default as email_policy_default
+
+from email_parsing import extract_email
+
+WORDS = (
+    "meeting invoice project update schedule report budget review team client "
+    "deadline proposal contract shipment order summary follow-up quarterly "
+    "Grüße café naïve résumé"
+).split()
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraphs(rng, count):
+    return "\n\n".join(" ".join(_sentence(rng) for _ in range(5)) for _ in range(count))
+
+
+def build_message(rng, index):
+    kind = index % 5
+    msg = EmailMessage()
+    msg["Subject"] = f"{_sentence(rng, 5)} #{index}"
+    msg["From"] = f"Sender {index} <sender{index}@example.com>"
+    msg["To"] = "me@example.com"
+    msg["Message-ID"] = f"<bench-{index}@example.com>"
+    text = _paragraphs(rng, rng.randint(1, 6))
+    html = "<html><head><style>p{color:red}</style></head><body>" + "".join(
+        f"<p>{paragraph}</p>" for paragraph in text.split("\n\n")
+    ) + "</body></html>"
+
+    if kind == 0:
+        msg.set_content(text)
+    elif kind == 1:
+        msg.set_content(html, subtype="html")
+    elif kind == 2:
+        msg.set_content(text)
+        msg.add_alternative(html, subtype="html")
+    elif kind == 3:
+        msg.set_content(text)
+        msg.add_alternative(html, subtype="html")
+        msg.add_attachment(
+            os.urandom(rng.randint(20_000, 200_000)),
+            maintype="application",
+            subtype="pdf",
+            filename="report.pdf",
+        )
+    else:
+        msg.set_content(text, charset="iso-8859-1", cte="quoted-printable")
+    return msg
+
+
+def write_corpus(path, count, seed):
+    rng = random.Random(seed)
+    box = mailbox.mbox(path)
+    box.lock()
+    try:
+        for index in range(count):
+            box.add(build_message(rng, index))
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+
+
+def read_corpus(path):
+    return [message.as_bytes() for message in mailbox.mbox(path)]
+
+
+# The conversion used before extract_email, kept here as the baseline
+
+
+def _legacy_clean_header(header, value):
+    if not value:
+        return None
+    value = value.replace("\n", "").replace("\r", "")
+    decoded_value = decode_header(value)[0][0]
+    if isinstance(decoded_value, bytes):
+        decoded_value = decoded_value.decode("utf-8", errors="replace")
+    value = re.sub(r"[^\x20-\x7E]", "", decoded_value)
+    return value or None
+
+
+def _legacy_convert(msg):
+    if not isinstance(msg, EmailMessage):
+        new_msg = EmailMessage(policy=email_policy_default)
+        for header, value in msg.items():
+            cleaned_value = _legacy_clean_header(header, value)
+            if cleaned_value:
+                try:
+                    new_msg[header] = cleaned_value
+                except ValueError:
+                    pass
+        if msg.is_multipart():
+            new_msg.make_mixed()
+            for part in msg.iter_parts():
+                new_msg.attach(part.get_content_type())
+        else:
+            new_msg.set_content(msg.get_content())
+        msg = new_msg
+    return msg
+
+
+def _legacy_body(msg, content_type):
+    if msg.is_multipart():
+        parts = []
+        for part in msg.iter_parts():
+            if part.get_content_type() == content_type:
+                payload = part.get_payload(decode=True)
+                if isinstance(payload, bytes):
+                    payload = payload.decode("utf-8", errors="replace")
+                parts.append(payload)
+        return "\n".join(parts)
+    payload = msg.get_payload(decode=True)
+    return payload.decode("utf-8", errors="replace") if isinstance(payload, bytes) else payload
+
+
+def legacy_extract(raw):
+    try:
+        msg = _legacy_convert(email.message_from_bytes(raw))
+        return _legacy_body(msg, "text/plain")
+    except Exception:
+        return None
+
+
+def current_extract(raw):
+    return extract_email(raw).text
+
+
+def run(name, extract, corpus, repeat):
+    timings = []
+    bodies = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [extract(raw) for raw in corpus]
+        timings.append(time.perf_counter() - started)
+        bodies = sum(1 for result in results if result and result.strip())
+    best = min(timings)
+    print(
+        f"{name:<10}{len(corpus) / best:>12.0f} msg/s"
+        f"{best / len(corpus) * 1e6:>12.1f} us/msg"
+        f"{statistics.median(timings):>10.2f} s median"
+        f"{bodies:>8}/{len(corpus)} bodies"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email body extraction.")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mbox", help="Existing mbox to use instead of a synthetic one")
+    args = parser.parse_args()
+
+    # The legacy path logs a warning per message it mangles
+    logging.disable(logging.WARNING)
+
+    if args.mbox:
+        corpus = read_corpus(args.mbox)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "corpus.mbox")
+            write_corpus(path, args.messages, args.seed)
+            corpus = read_corpus(path)
+
+    size = sum(len(raw) for raw in corpus) / 2**20
+    print(f"{len(corpus)} messages, {size:.1f} MiB")
+    run("legacy", legacy_extract, corpus, args.repeat)
+    run("extract", current_extract, corpus, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
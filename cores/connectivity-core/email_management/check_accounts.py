@@ -0,0 +1,144 @@
+"""
+Check the multi-account email run against the IMAP stand-in server.
+
+Starts imap_standin with one slow account, one tightly rate-limited account
+and several fast ones, loads them with load_accounts ("ssl": false) and
+runs run_all_accounts over them with a small IMAP workload in place of the
+real email tasks. It then checks that:
+
+- no more than --concurrency accounts were logged in at once,
+- the rate-limited account's commands kept to its rate_limit and burst,
+- the total wall time tracked the slowest account, not the sum of all.
+
+    python check_accounts.py --accounts 6 --concurrency 3
+
+Exits with status 1 if a check fails.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from email.message import EmailMessage
+
+import email_management
+from accounts import load_accounts
+from imap_standin import IMAPStandIn, StandInMailbox
+
+# Commands in the workload after LOGIN: SELECT, UID SEARCH, the NOOPs,
+# UID FETCH and LOGOUT
+WORKLOAD_NOOPS = 6
+WORKLOAD_COMMANDS = WORKLOAD_NOOPS + 4
+
+
+def _message(index):
+    msg = EmailMessage()
+    msg["Subject"] = f"Stand-in message {index}"
+    msg["From"] = "sender@example.com"
+    msg.set_content(f"Body of message {index}.")
+    return msg.as_bytes()
+
+
+def workload(mail):
+    # Stands in for run_email_tasks: a fixed number of IMAP round trips
+    mail.select("inbox")
+    mail.uid("SEARCH", None, "UNSEEN")
+    for _ in range(WORKLOAD_NOOPS):
+        mail.noop()
+    mail.uid("FETCH", "1:*", "(BODY.PEEK[])")
+
+
+def build(args):
+    mailboxes, entries = {}, []
+    for index in range(args.accounts):
+        name = f"account{index}"
+        delay = args.slow_delay if index == 0 else args.fast_delay
+        mailboxes[name] = StandInMailbox(
+            messages={uid: _message(uid) for uid in range(1, 4)},
+            unseen={1, 2},
+            delay=delay,
+        )
+        os.environ[f"STANDIN_{index}_PASS"] = "password"
+        entry = {
+            "name": name,
+            "host": "127.0.0.1",
+            "user": name,
+            "password_env": f"STANDIN_{index}_PASS",
+            "ssl": False,
+        }
+        if index == 1:
+            entry.update(rate_limit=args.rate_limit, burst=args.burst)
+        entries.append(entry)
+    return mailboxes, entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--slow-delay", type=float, default=0.3)
+    parser.add_argument("--fast-delay", type=float, default=0.01)
+    parser.add_argument("--rate-limit", type=float, default=5)
+    parser.add_argument("--burst", type=float, default=2)
+    args = parser.parse_args()
+    if args.accounts < 3:
+        parser.error("--accounts must be at least 3")
+
+    mailboxes, entries = build(args)
+    server = IMAPStandIn(mailboxes).start()
+    for entry in entries:
+        entry["port"] = server.port
+    email_management.run_email_tasks = workload
+
+    try:
+        accounts = load_accounts({"accounts": entries})
+        started = time.monotonic()
+        elapsed = asyncio.run(
+            email_management.run_all_accounts(accounts, max_concurrency=args.concurrency)
+        )
+        total = time.monotonic() - started
+    finally:
+        server.stop()
+
+    failures = []
+    errors = [result for result in elapsed if isinstance(result, Exception)]
+    if errors:
+        failures.append(f"{len(errors)} account(s) failed: {errors[0]}")
+    elapsed = [result for result in elapsed if not isinstance(result, Exception)]
+
+    if server.max_sessions > args.concurrency:
+        failures.append(
+            f"{server.max_sessions} accounts were connected at once, "
+            f"limit {args.concurrency}"
+        )
+
+    times = server.command_times("account1")
+    if len(times) != WORKLOAD_COMMANDS:
+        failures.append(f"account1 sent {len(times)} commands, expected {WORKLOAD_COMMANDS}")
+    # LOGIN took a token before the first recorded command, so at most
+    # burst - 1 were left for the rest
+    minimum_span = (len(times) - args.burst) / args.rate_limit
+    span = times[-1] - times[0] if times else 0.0
+    if span < minimum_span * 0.95:
+        failures.append(
+            f"account1 sent {len(times)} commands in {span:.2f}s, "
+            f"faster than rate_limit {args.rate_limit}/s with burst {args.burst}"
+        )
+
+    slowest = max(elapsed, default=0.0)
+    print(
+        f"{len(accounts)} accounts in {total:.2f}s; slowest {slowest:.2f}s, "
+        f"sum {sum(elapsed):.2f}s; at most {server.max_sessions} connected at once; "
+        f"rate-limited account took {span:.2f}s for {len(times)} commands"
+    )
+    if total > slowest * 1.2 + 0.5:
+        failures.append(f"Total {total:.2f}s does not track the slowest account ({slowest:.2f}s)")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,17 @@
-import imaplib
+import asyncio
 import os
 import logging
 import json
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from accounts import account_from_env, connect_to_account, load_accounts
 from basic_email_tasks import count_unread_emails, automatically_sort_emails
-from nlp_email_tasks import summarize_important_emails, detect_email_sentiment
-import email
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.utils import configure_logging
 
 # Load environment variables from the .env file
 load_dotenv(
@@ -22,12 +27,6 @@ with open(
 ) as config_file:
     config = json.load(config_file)
 
-# Fetch email credentials from the environment variables
-EMAIL_HOST = os.getenv("EMAIL_HOST", "")
-EMAIL_PORT = os.getenv("EMAIL_PORT", "")
-EMAIL_USER = os.getenv("EMAIL_USER", "")
-EMAIL_PASS = os.getenv("EMAIL_PASS", "")
-
 # Setup logging based on the config settings
 log_level = getattr(logging, config.get("log_level", "INFO").upper(), logging.INFO)
 log_file = (
@@ -35,39 +34,18 @@ log_file = (
 )
 os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
-logging.basicConfig(
-    filename=log_file,
-    level=log_level,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+configure_logging(log_file, level=log_level, logger_levels=config.get("log_levels"))
 
 
-def connect_to_email():
-    # Check if all required environment variables are set
-    if not all([EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASS]):
-        logging.error("Missing one or more required environment variables.")
-        return None
-
-    try:
-        # Convert port to an integer safely
-        port = int(EMAIL_PORT)
-    except ValueError:
-        logging.error("EMAIL_PORT is not a valid integer.")
-        return None
-
-    try:
-        # Establish connection to the email server
-        mail = imaplib.IMAP4_SSL(EMAIL_HOST, port)
-        mail.login(EMAIL_USER, EMAIL_PASS)
-        logging.info(f"Connected to {EMAIL_HOST} successfully.")
-        return mail
-    except imaplib.IMAP4.error as e:
-        logging.error(f"IMAP error during connection: {str(e)}")
-    except Exception as e:
-        logging.error(f"Failed to connect to {EMAIL_HOST}: {str(e)}")
-
-    return None
+def connect_to_email(account=None):
+    """
+    Connect to account, or to the EMAIL_* account from the environment.
+    """
+    if account is None:
+        account = account_from_env()
+        if account is None:
+            return None
+    return connect_to_account(account)
 
 
 def disconnect_from_email(mail):
@@ -79,24 +57,81 @@ def disconnect_from_email(mail):
         logging.error(f"Failed to disconnect: {str(e)}")
 
 
-if __name__ == "__main__":
-    mail_connection = connect_to_email()
-    if mail_connection:
-        # Perform any tasks with the mail connection here
+def run_email_tasks(mail):
+    """
+    Run the configured basic and NLP tasks over an open connection.
+    """
+    # Basic Tasks
+    if not config.get("skip_standard_tasks", False):
+        count_unread_emails(mail)
+        automatically_sort_emails(mail, config)
+
+    # NLP Tasks
+    if not config.get("skip_nlp_tasks", False):
+        # Imported here so runs that skip NLP never load the model stack
+        from nlp_email_tasks import run_nlp_pipeline
+
+        run_nlp_pipeline(mail)
+
+    logging.info("All tasks completed.")
+
+
+def run_account(account):
+    """
+    Connect to one account, run the email tasks and disconnect.
+
+    Returns:
+        float: Seconds the account took.
+    """
+    started = time.monotonic()
+    mail = connect_to_email(account)
+    if mail:
+        try:
+            run_email_tasks(mail)
+        finally:
+            disconnect_from_email(mail)
+    elapsed = time.monotonic() - started
+    logging.info(f"Finished account '{account.name}' in {elapsed:.1f}s.")
+    return elapsed
+
+
+async def run_all_accounts(accounts, max_concurrency=None):
+    """
+    Run the email tasks for every account concurrently.
+
+    imaplib is blocking, so each account runs on a bounded thread pool and
+    at most max_concurrency accounts are processed at once. Total wall
+    time tracks the slowest account rather than the sum of all of them.
+    """
+    max_concurrency = max(1, max_concurrency or config.get("max_concurrent_accounts", 4))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="email-account"
+    ) as executor:
+
+        async def run_one(account):
+            async with semaphore:
+                return await loop.run_in_executor(executor, run_account, account)
+
+        results = await asyncio.gather(
+            *(run_one(account) for account in accounts), return_exceptions=True
+        )
 
-        # Basic Tasks
-        if not config.get("skip_standard_tasks", False):
-            count_unread_emails(mail_connection)
-            automatically_sort_emails(mail_connection, config)
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            logging.error(f"Email tasks failed for account '{account.name}': {str(result)}")
+    return results
 
-        # NLP Tasks
-        if not config.get("skip_nlp_tasks", False):
-            summarize_important_emails(mail_connection)
-            detect_email_sentiment(mail_connection)
 
+if __name__ == "__main__":
+    accounts = load_accounts(config)
+    if len(accounts) > 1:
+        started = time.monotonic()
+        asyncio.run(run_all_accounts(accounts))
         logging.info(
-            "All tasks completed. Waiting for 5 seconds before disconnecting..."
+            f"Processed {len(accounts)} accounts in {time.monotonic() - started:.1f}s."
         )
-        time.sleep(5)  # Wait for 5 seconds
-
-        disconnect_from_email(mail_connection)
+    elif accounts:
+        run_account(accounts[0])
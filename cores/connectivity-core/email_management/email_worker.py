@@ -0,0 +1,348 @@
+import fcntl
+import imaplib
+import logging
+import os
+import select
+import signal
+import ssl
+import sys
+import threading
+import time
+from datetime import datetime
+
+from basic_email_tasks import automatically_sort_emails, sort_emails_batched
+from accounts import load_accounts
+from email_management import config, connect_to_email, disconnect_from_email, run_email_tasks
+from imap_utils import parse_uid_search
+from sorting_rules import load_sorting_rules
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.metrics import histogram, start_metrics_server
+from shared.utils import CronSchedule, next_run_time
+
+JOB_SECONDS = histogram(
+    "nexus_email_job_seconds", "Duration of email worker jobs.", ["account", "job"]
+)
+
+# Defaults for the "worker" config block
+DEFAULT_SCHEDULE = ["0 0,6,12,18 * * *"]
+DEFAULT_LOCK_FILE = "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management/email_worker.lock"
+
+# RFC 2177 asks clients to re-issue IDLE at least every 29 minutes
+MAX_IDLE_SECONDS = 29 * 60
+
+# Connection errors after which the session is dropped and re-established
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+class ImapSession:
+    """
+    A long-lived IMAP connection that is checked before each use and
+    re-established with exponential backoff when it has gone away.
+    """
+
+    def __init__(self, account, max_backoff=300):
+        self.account = account
+        self.mail = None
+        self.max_backoff = max_backoff
+        self._backoff = 1
+
+    def ensure(self, stop_event):
+        """
+        Return a live connection, reconnecting as needed. Returns None only
+        if stop_event is set while waiting to reconnect.
+        """
+        if self.mail is not None:
+            try:
+                self.mail.noop()
+                return self.mail
+            except CONNECTION_ERRORS + (imaplib.IMAP4.error,) as e:
+                logging.warning(f"IMAP connection lost, reconnecting: {str(e)}")
+                self.mail = None
+
+        while not stop_event.is_set():
+            self.mail = connect_to_email(self.account)
+            if self.mail is not None:
+                self._backoff = 1
+                return self.mail
+            logging.warning(f"Reconnecting to the email server in {self._backoff}s.")
+            stop_event.wait(self._backoff)
+            self._backoff = min(self._backoff * 2, self.max_backoff)
+        return None
+
+    def reset(self):
+        self.mail = None
+
+    def close(self):
+        disconnect_from_email(self.mail)
+        self.mail = None
+
+
+def supports_idle(mail):
+    return "IDLE" in mail.capabilities
+
+
+def _response_waiting(mail):
+    # True if a response is already readable without blocking: in imaplib's
+    # buffered file (e.g. an EXISTS that arrived with "+ idling"), in the
+    # TLS layer or on the socket. peek() only reads from the socket when
+    # its buffer is empty, so nothing buffered is lost.
+    previous = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(previous)
+
+
+def idle_until_new_mail(mail, timeout, stop_event):
+    """
+    Hold an IMAP IDLE for up to timeout seconds.
+
+    Returns:
+        bool: True if the server announced new messages (* n EXISTS).
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    response = mail.readline()
+    if not response.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {response!r}")
+
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    try:
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Wake up regularly so a shutdown request is noticed promptly;
+            # select() alone misses responses imaplib or TLS already buffered
+            if not _response_waiting(mail):
+                readable, _, _ = select.select([mail.sock], [], [], min(remaining, 5))
+                if not readable:
+                    continue
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE")
+            if line.rstrip().endswith(b"EXISTS"):
+                new_mail = True
+                break
+    finally:
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+            if line.startswith(tag):
+                mail.tagged_commands.pop(tag, None)
+                break
+            if line.rstrip().endswith(b"EXISTS"):
+                new_mail = True
+    return new_mail
+
+
+def uid_next(mail):
+    status, data = mail.status("INBOX", "(UIDNEXT)")
+    if status != "OK":
+        raise imaplib.IMAP4.error("STATUS UIDNEXT failed")
+    return int(data[0].split(b"UIDNEXT", 1)[1].strip(b" )"))
+
+
+def process_new_mail(mail, first_uid):
+    """
+    Sort and run the NLP tasks for messages with a UID of at least first_uid.
+
+    With incremental_sync the sync watermarks already bound the work to new
+    messages, so the regular incremental tasks are run instead.
+    """
+    if config.get("incremental_sync", True):
+        if not config.get("skip_standard_tasks", False):
+            automatically_sort_emails(mail, config)
+    else:
+        mail.select("inbox")
+        status, response = mail.uid("SEARCH", None, f"UID {first_uid}:*")
+        if status != "OK":
+            logging.error("Failed to search for new emails.")
+            return
+        # "n:*" always matches the newest message, even below n
+        uids = [uid for uid in parse_uid_search(response) if uid >= first_uid]
+        if not uids:
+            return
+        logging.info(f"Processing {len(uids)} new email(s).")
+        if not config.get("skip_standard_tasks", False):
+            sort_emails_batched(mail, uids, load_sorting_rules(config), config)
+
+    if not config.get("skip_nlp_tasks", False):
+        from nlp_email_tasks import run_nlp_pipeline
+
+        run_nlp_pipeline(mail)
+
+
+def warm_models():
+    """Load the NLP models up front so the first run does not pay for it."""
+    from nlp_email_tasks import get_sentiment_model, get_seq2seq_model
+
+    loaders = []
+    if not config.get("skip_summarization", False):
+        loaders.append(get_seq2seq_model)
+    if not config.get("skip_sentiment_analysis", False):
+        loaders.append(get_sentiment_model)
+    for loader in loaders:
+        try:
+            loader()
+        except Exception as e:
+            logging.error(f"Failed to preload model: {str(e)}")
+
+
+class EmailWorker:
+    """
+    In-process email service.
+
+    Runs the full email tasks on cron schedules over one persistent IMAP
+    session. Between runs it either holds an IMAP IDLE, processing new mail
+    as soon as the server announces it, or sleeps until the next run.
+
+    Each account gets its own worker thread, so runs of one account never
+    overlap; run_slots bounds how many accounts run their tasks at once. A
+    run that overshoots the next scheduled time coalesces the missed runs
+    into one.
+    """
+
+    def __init__(self, settings, account, stop_event, run_slots):
+        self.settings = settings
+        self.account = account
+        self.stop_event = stop_event
+        self.run_slots = run_slots
+        self.session = ImapSession(account, settings.get("reconnect_max_backoff", 300))
+        self.jitter = settings.get("jitter_seconds", 60)
+        self.schedules = [
+            CronSchedule(expression)
+            for expression in settings.get("schedule", DEFAULT_SCHEDULE)
+        ]
+        self.idle = settings.get("idle", True)
+        self.idle_timeout = min(settings.get("idle_timeout", MAX_IDLE_SECONDS), MAX_IDLE_SECONDS)
+        self._next_runs = [next_run_time(schedule, None, self.jitter) for schedule in self.schedules]
+
+    def _run_guarded(self, job, *args):
+        try:
+            with self.run_slots:
+                with JOB_SECONDS.labels(account=self.account.name, job=job.__name__).time():
+                    job(*args)
+        except CONNECTION_ERRORS as e:
+            logging.error(
+                f"IMAP connection failed during {job.__name__} "
+                f"for '{self.account.name}': {str(e)}"
+            )
+            self.session.reset()
+        except Exception as e:
+            logging.error(
+                f"Email worker job {job.__name__} failed for '{self.account.name}': {str(e)}"
+            )
+
+    def _run_due_jobs(self):
+        now = datetime.now()
+        due = [i for i, run_at in enumerate(self._next_runs) if run_at <= now]
+        if not due:
+            return
+        mail = self.session.ensure(self.stop_event)
+        if mail is None:
+            return
+        logging.info(f"Running scheduled email tasks for '{self.account.name}'.")
+        self._run_guarded(run_email_tasks, mail)
+        finished = datetime.now()
+        for i in due:
+            self._next_runs[i] = next_run_time(self.schedules[i], finished, self.jitter)
+
+    def _seconds_until_next_run(self):
+        return max(0.0, (min(self._next_runs) - datetime.now()).total_seconds())
+
+    def _wait_for_mail(self, timeout):
+        mail = self.session.ensure(self.stop_event)
+        if mail is None:
+            return
+        if not (self.idle and supports_idle(mail)):
+            self.stop_event.wait(timeout)
+            return
+
+        try:
+            mail.select("inbox")
+            first_uid = uid_next(mail)
+            if idle_until_new_mail(mail, min(timeout, self.idle_timeout), self.stop_event):
+                self._run_guarded(process_new_mail, mail, first_uid)
+        except CONNECTION_ERRORS as e:
+            logging.error(f"IMAP connection failed while idling: {str(e)}")
+            self.session.reset()
+        except imaplib.IMAP4.error as e:
+            logging.error(f"IMAP IDLE failed, falling back to polling: {str(e)}")
+            self.idle = False
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                self._run_due_jobs()
+                timeout = self._seconds_until_next_run()
+                if timeout > 0 and not self.stop_event.is_set():
+                    self._wait_for_mail(timeout)
+        finally:
+            self.session.close()
+
+
+def main():
+    settings = config.get("worker", {})
+    lock_path = settings.get("lock_file", DEFAULT_LOCK_FILE)
+    with open(lock_path, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.error(f"Another email worker holds {lock_path}; exiting.")
+            return
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+
+        accounts = load_accounts(config)
+        if not accounts:
+            logging.error("No email accounts configured; exiting.")
+            return
+
+        stop_event = threading.Event()
+
+        def stop(*args):
+            logging.info("Email worker stopping.")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        if settings.get("metrics_port"):
+            start_metrics_server(
+                settings["metrics_port"], settings.get("metrics_host", "127.0.0.1")
+            )
+
+        if settings.get("warm_models", True) and not config.get("skip_nlp_tasks", False):
+            warm_models()
+
+        run_slots = threading.BoundedSemaphore(
+            max(1, config.get("max_concurrent_accounts", 4))
+        )
+        threads = [
+            threading.Thread(
+                target=EmailWorker(settings, account, stop_event, run_slots).run,
+                name=f"email-worker-{account.name}",
+            )
+            for account in accounts
+        ]
+        for thread in threads:
+            thread.start()
+        logging.info(f"Email worker started for {len(accounts)} account(s).")
+
+        # Wait in short slices so the main thread keeps handling signals
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    main()
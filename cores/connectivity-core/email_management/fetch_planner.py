@@ -0,0 +1,218 @@
+import binascii
+import codecs
+import quopri
+import re
+from dataclasses import dataclass
+from itertools import takewhile
+from typing import Optional
+
+from imap_utils import compress_uid_set, parse_fetch_items
+
+# Headers the NLP tasks need, fetched together with the BODYSTRUCTURE
+HEADER_FIELDS = "MESSAGE-ID SUBJECT FROM DATE"
+
+STRUCTURE_ITEMS = f"(UID BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS ({HEADER_FIELDS})])"
+
+# Worst-case bytes per decoded character for UTF-8 text
+_MAX_BYTES_PER_CHAR = 4
+
+_INCOMPLETE_QP_ESCAPE = re.compile(rb"=(?:[0-9A-Fa-f]?|\r)$")
+_NON_BASE64 = re.compile(rb"[^A-Za-z0-9+/=]")
+
+
+@dataclass
+class TextPart:
+    """The body part chosen for the NLP tasks, from a BODYSTRUCTURE."""
+
+    section: str
+    subtype: str
+    charset: str
+    encoding: str
+    size: int
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    return value or ""
+
+
+def _params(value):
+    if not isinstance(value, list):
+        return {}
+    return {
+        _text(value[i]).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)
+    }
+
+
+def _is_attachment(part, disposition_index):
+    if len(part) <= disposition_index:
+        return False
+    disposition = part[disposition_index]
+    return (
+        isinstance(disposition, list)
+        and bool(disposition)
+        and _text(disposition[0]).lower() == "attachment"
+    )
+
+
+def _text_parts(structure, prefix=()):
+    # Yield (section, single-part body) for every inline text part in MIME
+    # order, without descending into attached messages
+    if not isinstance(structure, list) or not structure:
+        return
+    if isinstance(structure[0], list):
+        # A multipart lists its parts first, then its subtype and extensions
+        for number, child in enumerate(
+            takewhile(lambda item: isinstance(item, list), structure), start=1
+        ):
+            yield from _text_parts(child, prefix + (number,))
+        return
+
+    if _text(structure[0]).lower() != "text" or len(structure) < 7:
+        return
+    # Text parts have a line count before the extension fields, so the
+    # disposition is the 10th field
+    if _is_attachment(structure, 9):
+        return
+    section = ".".join(str(number) for number in prefix) or "1"
+    yield section, structure
+
+
+def choose_text_part(structure):
+    """
+    Pick the first inline text/plain part, or failing that text/html.
+
+    Returns:
+        TextPart or None if the message has no inline text.
+    """
+    html = None
+    for section, part in _text_parts(structure):
+        subtype = _text(part[1]).lower()
+        if subtype not in ("plain", "html"):
+            continue
+        try:
+            size = int(part[6])
+        except (TypeError, ValueError):
+            size = 0
+        chosen = TextPart(
+            section=section,
+            subtype=subtype,
+            charset=_params(part[2]).get("charset", "utf-8"),
+            encoding=_text(part[5]).lower() or "7bit",
+            size=size,
+        )
+        if subtype == "plain":
+            return chosen
+        html = html or chosen
+    return html
+
+
+def fetch_size(part, max_chars, max_fetch_bytes=None):
+    """
+    Bytes of the encoded part needed to decode max_chars characters.
+    """
+    if max_fetch_bytes:
+        return max_fetch_bytes
+    raw = max_chars * _MAX_BYTES_PER_CHAR
+    if part.encoding == "base64":
+        # 4 characters per 3 bytes, plus CRLF every 76 characters
+        encoded = -(-raw // 3) * 4
+        return encoded + encoded // 76 * 2 + 4
+    if part.encoding == "quoted-printable":
+        return raw * 3
+    return raw
+
+
+def decode_partial(data, encoding, charset):
+    """
+    Decode the first bytes of a transfer-encoded body part.
+
+    Trailing base64 quanta, quoted-printable escapes and multi-byte
+    characters cut off by the byte range are dropped rather than turned
+    into garbage.
+    """
+    if encoding == "base64":
+        compact = _NON_BASE64.sub(b"", data)
+        compact = compact[: len(compact) // 4 * 4]
+        try:
+            data = binascii.a2b_base64(compact)
+        except binascii.Error:
+            data = b""
+    elif encoding == "quoted-printable":
+        data = quopri.decodestring(_INCOMPLETE_QP_ESCAPE.sub(b"", data))
+
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return decoder.decode(data, final=False)
+
+
+@dataclass
+class PlannedMessage:
+    uid: int
+    headers: bytes
+    part: Optional[TextPart]
+    text: Optional[str] = None
+
+
+def _headers(items):
+    for name, value in items.items():
+        if name.startswith("BODY[HEADER"):
+            return value if isinstance(value, bytes) else b""
+    return b""
+
+
+def _body_item(items, section):
+    prefix = f"BODY[{section}]"
+    for name, value in items.items():
+        if name.startswith(prefix):
+            return value if isinstance(value, bytes) else b""
+    return b""
+
+
+def fetch_text_parts(mail, uids, max_chars, max_fetch_bytes=None):
+    """
+    Fetch just enough of each message for the NLP tasks.
+
+    One UID FETCH returns the BODYSTRUCTURE and a few headers for every
+    message; the first text part of each is then fetched with one
+    BODY.PEEK[section]<0.N> per distinct (section, N), so attachments are
+    never downloaded. Neither command sets \\Seen.
+
+    Returns:
+        list: PlannedMessage per UID that came back, in UID order.
+    """
+    status, data = mail.uid("FETCH", compress_uid_set(uids), STRUCTURE_ITEMS)
+    if status != "OK":
+        raise RuntimeError(f"Failed to fetch the structure of {len(uids)} emails.")
+
+    planned = {}
+    for uid, items in parse_fetch_items(data).items():
+        part = choose_text_part(items.get("BODYSTRUCTURE"))
+        planned[uid] = PlannedMessage(uid=uid, headers=_headers(items), part=part)
+
+    requests = {}
+    for message in planned.values():
+        if message.part is not None:
+            size = fetch_size(message.part, max_chars, max_fetch_bytes)
+            requests.setdefault((message.part.section, size), []).append(message.uid)
+
+    for (section, size), section_uids in requests.items():
+        status, data = mail.uid(
+            "FETCH", compress_uid_set(section_uids), f"(UID BODY.PEEK[{section}]<0.{size}>)"
+        )
+        if status != "OK":
+            raise RuntimeError(
+                f"Failed to fetch part {section} of {len(section_uids)} emails."
+            )
+        for uid, items in parse_fetch_items(data).items():
+            message = planned.get(uid)
+            if message is None:
+                continue
+            message.text = decode_partial(
+                _body_item(items, section), message.part.encoding, message.part.charset
+            )
+
+    return [planned[uid] for uid in sorted(planned)]
@@ -0,0 +1,176 @@
+"""
+A small in-process IMAP server for exercising the account code locally.
+
+It speaks just enough IMAP4rev1 over plain TCP for imaplib: CAPABILITY,
+LOGIN, SELECT/EXAMINE, NOOP, UID SEARCH, UID FETCH and LOGOUT. Each user
+has its own mailbox and an optional delay added to every command, so slow
+accounts can be simulated. Every command and session is recorded for
+checks such as check_accounts.py.
+
+    server = IMAPStandIn({"alice": StandInMailbox(delay=0.2)})
+    server.start()
+    ... connect to ("127.0.0.1", server.port) with "ssl": false ...
+    server.stop()
+"""
+
+import re
+import socketserver
+import threading
+import time
+from dataclasses import dataclass, field
+
+_COMMAND_PATTERN = re.compile(rb"^(\S+) (\S+)(?: (.*))?$")
+
+
+@dataclass
+class StandInMailbox:
+    """The INBOX of one stand-in user: {uid: raw message bytes}."""
+
+    password: str = "password"
+    messages: dict = field(default_factory=dict)
+    unseen: set = field(default_factory=set)
+    delay: float = 0.0
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server.standin
+        user = None
+        self._send(b"* OK IMAP stand-in ready")
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                match = _COMMAND_PATTERN.match(line.rstrip(b"\r\n"))
+                if not match:
+                    self._send(b"* BAD malformed command")
+                    continue
+                tag, command, arguments = match.groups()
+                command = command.upper().decode()
+                arguments = (arguments or b"").decode()
+                if user is not None:
+                    server.record(user, command)
+                    time.sleep(server.mailboxes[user].delay)
+
+                if command == "CAPABILITY":
+                    self._send(b"* CAPABILITY IMAP4rev1 IDLE")
+                    self._ok(tag, command)
+                elif command == "LOGIN":
+                    name, _, password = arguments.partition(" ")
+                    name, password = name.strip('"'), password.strip('"')
+                    mailbox = server.mailboxes.get(name)
+                    if mailbox is None or mailbox.password != password:
+                        self._send(tag + b" NO LOGIN failed")
+                        continue
+                    user = name
+                    server.session_started(user)
+                    self._ok(tag, command)
+                elif command in ("SELECT", "EXAMINE") and user is not None:
+                    mailbox = server.mailboxes[user]
+                    self._send(f"* {len(mailbox.messages)} EXISTS".encode())
+                    self._send(b"* OK [UIDVALIDITY 1] UIDs valid")
+                    self._send(f"* OK [UIDNEXT {max(mailbox.messages, default=0) + 1}]".encode())
+                    self._ok(tag, command, b"[READ-WRITE] ")
+                elif command == "NOOP":
+                    self._ok(tag, command)
+                elif command == "UID" and user is not None:
+                    self._uid_command(tag, server.mailboxes[user], arguments)
+                elif command == "LOGOUT":
+                    self._send(b"* BYE logging out")
+                    self._ok(tag, command)
+                    return
+                else:
+                    self._send(tag + b" BAD unsupported command")
+        finally:
+            if user is not None:
+                server.session_ended(user)
+
+    def _uid_command(self, tag, mailbox, arguments):
+        name, _, rest = arguments.partition(" ")
+        name = name.upper()
+        if name == "SEARCH":
+            uids = sorted(mailbox.unseen if "UNSEEN" in rest.upper() else mailbox.messages)
+            self._send(("* SEARCH " + " ".join(map(str, uids))).rstrip().encode())
+        elif name == "FETCH":
+            message_set, _, _ = rest.partition(" ")
+            for position, uid in enumerate(sorted(mailbox.messages), start=1):
+                if _in_set(uid, message_set):
+                    body = mailbox.messages[uid]
+                    self._send(
+                        f"* {position} FETCH (UID {uid} BODY[] {{{len(body)}}}".encode()
+                    )
+                    self.wfile.write(body)
+                    self._send(b")")
+        else:
+            self._send(tag + b" BAD unsupported UID command")
+            return
+        self._ok(tag, f"UID {name}")
+
+    def _ok(self, tag, command, code=b""):
+        self._send(tag + b" OK " + code + str(command).encode() + b" completed")
+
+    def _send(self, line):
+        self.wfile.write(line + b"\r\n")
+        self.wfile.flush()
+
+
+def _in_set(uid, message_set):
+    for part in message_set.split(","):
+        start, _, end = part.partition(":")
+        low = int(start)
+        high = low if not end else (uid if end == "*" else int(end))
+        if low <= uid <= high:
+            return True
+    return False
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class IMAPStandIn:
+    """
+    The server and what it observed.
+
+    commands holds (user, command, monotonic time) per command received
+    after login; max_sessions is the most users logged in at once.
+    """
+
+    def __init__(self, mailboxes, host="127.0.0.1", port=0):
+        self.mailboxes = mailboxes
+        self.commands = []
+        self.sessions = 0
+        self.max_sessions = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _Handler)
+        self._server.standin = self
+        self.host, self.port = self._server.server_address
+
+    def record(self, user, command):
+        with self._lock:
+            self.commands.append((user, command, time.monotonic()))
+
+    def session_started(self, user):
+        with self._lock:
+            self.sessions += 1
+            self.max_sessions = max(self.max_sessions, self.sessions)
+
+    def session_ended(self, user):
+        with self._lock:
+            self.sessions -= 1
+
+    def command_times(self, user):
+        with self._lock:
+            return [at for name, _, at in self.commands if name == user]
+
+    def start(self):
+        threading.Thread(
+            target=self._server.serve_forever, name="imap-standin", daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,155 @@
+import re
+
+# Number of UIDs sent in one UID FETCH/STORE command; keeps command lines well
+# under server limits even when the UIDs do not compress into ranges
+IMAP_BATCH_SIZE = 500
+
+_MESSAGE_ITEM_PATTERN = re.compile(r"BODY\[[^\]]*\](?:<\d+>)?|RFC822(?:\.HEADER|\.TEXT)?")
+
+
+def compress_uid_set(uids):
+    """
+    Build an IMAP message set such as "1:5,7,9:12" from UIDs.
+
+    Args:
+        uids (Iterable[int]): UIDs in any order; duplicates are ignored.
+
+    Returns:
+        str: The message set, with consecutive UIDs collapsed into ranges.
+    """
+    ranges = []
+    for uid in sorted(set(int(uid) for uid in uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(
+        str(start) if start == end else f"{start}:{end}" for start, end in ranges
+    )
+
+
+def uid_batches(uids, batch_size=IMAP_BATCH_SIZE):
+    """
+    Split UIDs into sorted lists of at most batch_size.
+    """
+    ordered = sorted(set(int(uid) for uid in uids))
+    for start in range(0, len(ordered), batch_size):
+        yield ordered[start : start + batch_size]
+
+
+def parse_uid_search(response):
+    """
+    Turn the data of a UID SEARCH response into a list of ints.
+    """
+    return [int(uid) for uid in response[0].split()] if response and response[0] else []
+
+
+def quote_astring(value):
+    """
+    Quote a label or mailbox name for use as an IMAP command argument.
+    """
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+_TOKEN_PATTERN = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|(\{\d+\})\s*$|'
+    rb"((?:BODY|BINARY)(?:\.PEEK)?\[[^\]]*\](?:<\d+>)?)|([^\s()\"]+))"
+)
+
+
+def _fetch_tokens(data):
+    # Flatten imaplib's mix of lines and (line, literal) tuples into tokens:
+    # "(", ")", ("atom", str) and ("string", bytes). Literals and quoted
+    # strings both become strings; NIL becomes None.
+    for part in data or []:
+        text, literal = part if isinstance(part, tuple) else (part, None)
+        position = 0
+        while position < len(text):
+            match = _TOKEN_PATTERN.match(text, position)
+            if not match or match.end() == position:
+                break
+            position = match.end()
+            open_paren, close_paren, quoted, literal_marker, section, atom = match.groups()
+            if open_paren:
+                yield "("
+            elif close_paren:
+                yield ")"
+            elif quoted is not None:
+                yield ("string", re.sub(rb"\\(.)", rb"\1", quoted))
+            elif literal_marker:
+                yield ("string", literal if literal is not None else b"")
+            elif section:
+                yield ("atom", section.decode())
+            elif atom == b"NIL":
+                yield None
+            elif atom:
+                yield ("atom", atom.decode(errors="replace"))
+
+
+def _build_lists(tokens):
+    stack = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) > 1:
+                finished = stack.pop()
+                stack[-1].append(finished)
+        else:
+            stack[-1].append(token[1] if token is not None else None)
+    while len(stack) > 1:
+        finished = stack.pop()
+        stack[-1].append(finished)
+    return stack[0]
+
+
+def parse_fetch_items(data):
+    """
+    Parse a UID FETCH response into its data items, whatever mix of quoted
+    strings, literals and nested lists (e.g. BODYSTRUCTURE) it contains.
+
+    Returns:
+        dict: {uid: {item name: value}}. Item names are upper-cased, e.g.
+        "BODYSTRUCTURE" or "BODY[1]<0>"; strings are bytes, atoms str,
+        NIL None and parenthesised lists Python lists.
+    """
+    messages = {}
+    for element in _build_lists(_fetch_tokens(data)):
+        if not isinstance(element, list):
+            continue
+        items = {}
+        for position in range(0, len(element) - 1, 2):
+            name = element[position]
+            if isinstance(name, bytes):
+                name = name.decode(errors="replace")
+            if isinstance(name, str):
+                items[name.upper()] = element[position + 1]
+        if "UID" in items:
+            messages[int(items.pop("UID"))] = items
+    return messages
+
+
+def parse_fetch_response(data):
+    """
+    Group the message content of a UID FETCH response by UID.
+
+    Each message's items are parsed as one FETCH list (see
+    parse_fetch_items), so content is attributed correctly wherever the
+    server puts UID in the list.
+
+    Returns:
+        dict: {uid: {item_name: bytes}} where item_name is e.g.
+        "BODY[HEADER.FIELDS (SUBJECT FROM DATE)]" or "RFC822". Messages
+        without content (e.g. BODY[] NIL) are left out.
+    """
+    messages = {}
+    for uid, items in parse_fetch_items(data).items():
+        content = {
+            name: value
+            for name, value in items.items()
+            if isinstance(value, bytes) and _MESSAGE_ITEM_PATTERN.fullmatch(name)
+        }
+        if content:
+            messages[uid] = content
+    return messages
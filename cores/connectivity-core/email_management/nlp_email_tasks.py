@@ -1,14 +1,50 @@
 import imaplib
 import os
+import sys
+import threading
 import logging
 import email
-from email.message import EmailMessage
-from email.policy import default as email_policy_default
+from dataclasses import dataclass
+from typing import Optional
 from dotenv import load_dotenv
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
-import torch # Ensure that PyTorch is installed
 import json
-import re
+from imap_utils import (
+    IMAP_BATCH_SIZE,
+    compress_uid_set,
+    parse_fetch_response,
+    parse_uid_search,
+    uid_batches,
+)
+from result_cache import (
+    DEFAULT_CACHE_PATH,
+    DEFAULT_MAX_AGE_DAYS,
+    DEFAULT_MAX_ENTRIES,
+    ResultCache,
+    body_hash,
+    model_version,
+)
+from sync_state import MailboxSync, account_of, get_sync_state
+from fetch_planner import fetch_text_parts
+from email_parsing import (
+    decode_header_value,
+    decode_part,
+    extract_email,
+    html_to_text,
+    iter_text_parts,
+)
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.metrics import histogram
+from shared.model_optimization import load_optimized
+from shared.model_registry import get_model_registry
+
+MODEL_BATCH_SECONDS = histogram(
+    "nexus_model_batch_seconds", "Inference time per model batch.", ["task"]
+)
+MODEL_BATCH_SIZE = histogram(
+    "nexus_model_batch_size", "Emails per model batch.", ["task"], lowest=1, highest=1024
+)
 
 # Load environment variables from the .env file
 load_dotenv(
@@ -17,15 +53,6 @@ load_dotenv(
     override=True,
 )
 
-# Load the NLP model path from the environment variables
-SEQ2SEQ_MODEL = os.getenv("SEQ2SEQ_MODEL_PATH")
-if SEQ2SEQ_MODEL is None:
-    raise ValueError("SEQ2SEQ_MODEL_PATH environment variable is not set.")
-
-# Load the NLP model
-tokenizer = AutoTokenizer.from_pretrained(SEQ2SEQ_MODEL)
-model = AutoModelForSeq2SeqLM.from_pretrained(SEQ2SEQ_MODEL)
-
 # Load configuration settings from the config.json file
 try:
     with open(
@@ -38,180 +65,600 @@ except Exception as e:
     config = {}
 
 
-# Function to clean and sanitize email headers
-from email.header import decode_header
+def load_model(model_class_name, model_path, kind):
+    """
+    Load a model for the registry, applying the opt-in "cpu_optimized" mode.
+    """
+    return load_optimized(
+        model_class_name,
+        model_path,
+        config.get("cpu_optimized", {}),
+        kind,
+        mmap_weights=config.get("mmap_model_weights", True),
+    )
+
+
+def _model_variant():
+    settings = config.get("cpu_optimized", {})
+    if not settings.get("enabled", False):
+        return "fp32"
+    return "int8" if settings.get("quantize_int8", True) else "optimized-fp32"
+
 
-def clean_header(header, value):
+def get_seq2seq_model():
     """
-    Cleans and sanitizes email header values by removing invalid characters.
+    Return the (tokenizer, model) pair used for summarization.
+
+    The model is loaded from SEQ2SEQ_MODEL_PATH on first use and cached in the
+    shared model registry, so importing this module stays cheap.
     """
-    if not value:
-        return None
-    # Remove linefeeds and carriage returns
-    value = value.replace("\n", "").replace("\r", "")
-    # Decode the header value if it is encoded
-    decoded_value = decode_header(value)[0][0]
-    if isinstance(decoded_value, bytes):
-        decoded_value = decoded_value.decode("utf-8", errors="replace")
-    # Replace invalid characters with a placeholder
-    value = re.sub(r"[^\x20-\x7E]", "", decoded_value)  # Keep only printable ASCII characters
-    if not value:
-        logging.warning(f"Header '{header}' was empty after sanitization.")
+    model_path = os.getenv("SEQ2SEQ_MODEL_PATH")
+    if model_path is None:
+        raise ValueError("SEQ2SEQ_MODEL_PATH environment variable is not set.")
+    return get_model_registry().get(
+        f"seq2seq:{model_path}:{_model_variant()}",
+        lambda: load_model("AutoModelForSeq2SeqLM", model_path, "seq2seq"),
+    )
+
+
+@dataclass
+class ParsedEmail:
+    """An unread email parsed once and shared by every NLP consumer."""
+
+    uid: int
+    message_id: Optional[str]
+    subject: Optional[str]
+    body: Optional[str]
+    html_body: Optional[str]
+
+    @property
+    def cache_key(self):
+        """(message key, body hash) identifying this message's content."""
+        hashed = body_hash(self.body)
+        return (self.message_id or f"sha256:{hashed}", hashed)
+
+
+def parse_email(uid, raw_message):
+    extracted = extract_email(raw_message)
+    return ParsedEmail(
+        uid=uid,
+        message_id=extracted.message_id,
+        subject=extracted.subject,
+        body=extracted.text,
+        html_body=extracted.html,
+    )
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Return the persistent result cache configured by "result_cache", or None
+    when it is disabled.
+    """
+    global _result_cache
+    settings = config.get("result_cache", {})
+    if not settings.get("enabled", True):
         return None
-    return value
-
-
-def convert_to_email_message(msg):
-    """Convert a general Message object to an EmailMessage object."""
-    if not isinstance(msg, EmailMessage):
-        new_msg = EmailMessage(policy=email_policy_default)
-        for header, value in msg.items():
-            cleaned_value = clean_header(header, value)
-            if cleaned_value:
-                try:
-                    new_msg[header] = cleaned_value
-                except ValueError as e:
-                    logging.error(f"Failed to set header '{header}': {str(e)}")
-            else:
-                logging.warning(
-                    f"Skipping header '{header}' due to invalid characters."
+    # Account threads may ask for it at the same time
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                settings.get("path", DEFAULT_CACHE_PATH),
+                max_age_days=settings.get("max_age_days", DEFAULT_MAX_AGE_DAYS),
+                max_entries=settings.get("max_entries", DEFAULT_MAX_ENTRIES),
+            )
+        return _result_cache
+
+
+def parse_planned_email(planned):
+    """
+    Build a ParsedEmail from the headers and partial text part fetched by
+    the fetch planner.
+    """
+    headers = email.message_from_bytes(planned.headers)
+    text = planned.text
+    is_html = planned.part is not None and planned.part.subtype == "html"
+    return ParsedEmail(
+        uid=planned.uid,
+        message_id=decode_header_value(headers["Message-ID"]),
+        subject=decode_header_value(headers["Subject"]),
+        body=html_to_text(text) if is_html else text,
+        html_body=text if is_html else None,
+    )
+
+
+def fetch_unread_batch(mail, batch):
+    """
+    Download and parse one batch of UIDs without setting \\Seen.
+
+    With partial_fetch, only the BODYSTRUCTURE, a few headers and the
+    first max_email_body_length characters' worth of the first text part
+    are downloaded; otherwise whole messages are fetched with BODY.PEEK[].
+    """
+    parsed = []
+    if config.get("partial_fetch", True):
+        planned_messages = fetch_text_parts(
+            mail,
+            batch,
+            config.get("max_email_body_length", 512),
+            config.get("max_fetch_bytes"),
+        )
+        for planned in planned_messages:
+            try:
+                parsed.append(parse_planned_email(planned))
+            except Exception as e:
+                logging.error(f"Failed to parse email UID {planned.uid}: {str(e)}")
+        return parsed
+
+    status, data = mail.uid("FETCH", compress_uid_set(batch), "(BODY.PEEK[])")
+    if status != "OK":
+        raise RuntimeError(f"Failed to fetch {len(batch)} unread emails.")
+    for uid, items in parse_fetch_response(data).items():
+        try:
+            parsed.append(parse_email(uid, next(iter(items.values()))))
+        except Exception as e:
+            logging.error(f"Failed to parse email UID {uid}: {str(e)}")
+    return parsed
+
+
+def _uidvalidity(mail):
+    _, data = mail.response("UIDVALIDITY")
+    return int(data[0]) if data and data[0] else 0
+
+
+def _unread_uids(mail, consumer):
+    """
+    Return (uidvalidity, uids, sync) for the unread messages to process.
+
+    With incremental_sync, only unread messages above the consumer's
+    watermark are returned, plus older ones marked unread again since the
+    last run (when the server supports CONDSTORE). sync is None otherwise.
+    """
+    if config.get("incremental_sync", True):
+        sync = MailboxSync(get_sync_state(config), consumer).begin(mail)
+        uids = sync.changed_uids(mail, "UNSEEN") + sync.new_uids(mail, "UNSEEN")
+        return sync.uidvalidity, uids, sync
+
+    mail.select("inbox")
+    uidvalidity = _uidvalidity(mail)
+    status, response = mail.uid("SEARCH", None, "UNSEEN")
+    if status != "OK":
+        raise RuntimeError("Failed to search for unread emails.")
+    return uidvalidity, parse_uid_search(response), None
+
+
+def iter_unread_emails(mail, cache=None, versions=None, consumer="nlp"):
+    """
+    Yield batches of parsed unread emails from the inbox.
+
+    The unread UIDs are found with one UID SEARCH and downloaded by
+    fetch_unread_batch in batches of imap_batch_size messages; each message
+    is parsed exactly once.
+
+    With incremental_sync, batches are yielded in ascending UID order and
+    the consumer's watermark is advanced once the caller has finished with
+    each batch, so an interrupted run resumes after the last finished batch.
+    A caller that fails on a batch must let the exception leave its loop
+    rather than carry on, or the batch is checkpointed without results.
+
+    With a cache and versions ({kind: model version}), messages that already
+    have every result are skipped before their bodies are fetched.
+    """
+    try:
+        uidvalidity, uids, sync = _unread_uids(mail, consumer)
+    except RuntimeError as e:
+        logging.error(str(e))
+        return
+
+    # UIDs are only unique within one account's mailbox
+    mailbox = f"{account_of(mail)}/INBOX"
+    if cache is not None and versions:
+        completed = cache.completed_uids(mailbox, uidvalidity, uids, versions)
+        if completed:
+            logging.info(f"Skipping {len(completed)} unread email(s) with cached results.")
+            uids = [uid for uid in uids if uid not in completed]
+
+    for batch in uid_batches(uids, config.get("imap_batch_size", IMAP_BATCH_SIZE)):
+        try:
+            parsed = fetch_unread_batch(mail, batch)
+        except RuntimeError as e:
+            logging.error(str(e))
+            if sync is not None:
+                # Keep the watermark below this batch so the next run retries it
+                return
+            continue
+
+        if cache is not None:
+            cache.remember_uids(
+                mailbox, uidvalidity, [(p.uid,) + p.cache_key for p in parsed]
+            )
+        yield parsed
+        if sync is not None:
+            sync.checkpoint(batch[-1])
+
+    if sync is not None:
+        sync.finish()
+
+
+def cached_results(cache, kind, version, emails, compute):
+    """
+    Return one result per email, computing only those missing from cache.
+
+    Args:
+        compute (Callable): Takes a list of emails and returns their results
+            in the same order.
+    """
+    if cache is None:
+        return compute(emails)
+
+    keys = [parsed.cache_key for parsed in emails]
+    cached = cache.get_many(kind, version, keys)
+    pending = [parsed for parsed, key in zip(emails, keys) if key not in cached]
+    if pending:
+        computed = list(zip([parsed.cache_key for parsed in pending], compute(pending)))
+        cache.put_many(kind, version, computed)
+        cached.update(computed)
+    return [cached[key] for key in keys]
+
+
+# Generation settings for each latency tier, selected with "summary_preset".
+# Without a preset the individual num_beams/no_repeat_ngram_size/early_stopping
+# config keys are used as before.
+SUMMARY_PRESETS = {
+    "quality": {"num_beams": 4, "no_repeat_ngram_size": 2, "early_stopping": True},
+    "balanced": {"num_beams": 2, "no_repeat_ngram_size": 2, "early_stopping": True},
+    "fast": {"num_beams": 1, "no_repeat_ngram_size": 2, "do_sample": False},
+}
+
+_threads_configured = False
+
+# Accounts are processed on several threads; model calls take turns so they
+# do not oversubscribe the inference thread pool
+_inference_lock = threading.Lock()
+
+
+def configure_inference_threads():
+    """Apply "inference_threads" to PyTorch's intra-op thread pool once."""
+    global _threads_configured
+    import torch
+
+    if not _threads_configured:
+        threads = config.get("inference_threads")
+        if threads:
+            torch.set_num_threads(int(threads))
+            logging.info(f"Using {threads} threads for model inference.")
+        _threads_configured = True
+
+
+def summary_generation_settings():
+    preset = config.get("summary_preset")
+    if preset:
+        if preset not in SUMMARY_PRESETS:
+            logging.warning(f"Unknown summary_preset '{preset}', using 'quality'.")
+        return dict(SUMMARY_PRESETS.get(preset, SUMMARY_PRESETS["quality"]))
+    return {
+        "num_beams": config.get("num_beams", 4),
+        "no_repeat_ngram_size": config.get("no_repeat_ngram_size", 2),
+        "early_stopping": config.get("early_stopping", True),
+    }
+
+
+def length_buckets(encoded, batch_size):
+    """
+    Yield lists of indices into encoded, grouped by similar token length.
+    """
+    order = sorted(
+        range(len(encoded["input_ids"])), key=lambda i: len(encoded["input_ids"][i])
+    )
+    for start in range(0, len(order), batch_size):
+        yield order[start : start + batch_size]
+
+
+def pad_batch(tokenizer, encoded, indices):
+    return tokenizer.pad(
+        {
+            "input_ids": [encoded["input_ids"][i] for i in indices],
+            "attention_mask": [encoded["attention_mask"][i] for i in indices],
+        },
+        padding="longest",
+        return_tensors="pt",
+    )
+
+
+def summarize_texts(bodies):
+    """
+    Summarize email bodies in length-bucketed, dynamically padded batches.
+
+    Bodies are tokenized without padding, sorted by token length and cut into
+    batches of "summary_batch_size", so each batch is only padded to its own
+    longest member. Results are returned in the order of bodies.
+    """
+    if not bodies:
+        return []
+
+    import torch
+
+    configure_inference_threads()
+    tokenizer, model = get_seq2seq_model()
+    max_length = config.get("max_email_body_length", 512)
+    batch_size = max(1, int(config.get("summary_batch_size", 8)))
+    generation = summary_generation_settings()
+
+    encoded = tokenizer(
+        ["summarize: " + body[:max_length] for body in bodies],
+        max_length=max_length,
+        truncation=True,
+    )
+
+    summaries = [None] * len(bodies)
+    with _inference_lock, torch.inference_mode():
+        for indices in length_buckets(encoded, batch_size):
+            batch = pad_batch(tokenizer, encoded, indices)
+            MODEL_BATCH_SIZE.labels(task="summary").observe(len(indices))
+            with MODEL_BATCH_SECONDS.labels(task="summary").time():
+                summary_ids = model.generate(
+                    **batch,
+                    max_length=config.get("max_summary_length", 100),
+                    **generation,
                 )
-        if msg.is_multipart():
-            new_msg.make_mixed()  # Create a new multipart message
-            for part in msg.iter_parts():
-                new_msg.attach(part.get_content_type())
-        else:
-            new_msg.set_content(msg.get_content())
-        msg = new_msg
-    return msg
+            decoded = tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+            for i, summary in zip(indices, decoded):
+                summaries[i] = summary
+    return summaries
+
+
+def summary_model_version():
+    return model_version(
+        os.getenv("SEQ2SEQ_MODEL_PATH"),
+        _model_variant(),
+        summary_generation_settings(),
+        config.get("max_email_body_length", 512),
+        config.get("max_summary_length", 100),
+    )
+
+
+def _summarize_eligible(emails):
+    # Ensure that body is a string before summarizing; others get None
+    eligible = [i for i, parsed in enumerate(emails) if isinstance(parsed.body, str)]
+    summaries = [None] * len(emails)
+    for i, summary in zip(eligible, summarize_texts([emails[i].body for i in eligible])):
+        summaries[i] = summary
+    return summaries
+
+
+def summarize_emails(emails, cache=None):
+    summaries = cached_results(
+        cache, "summary", summary_model_version(), emails, _summarize_eligible
+    )
+    for parsed, summary in zip(emails, summaries):
+        if summary is not None:
+            logging.info(f"Summary of email '{parsed.subject}': {summary}")
+    return [summary for summary in summaries if summary is not None]
+
+
+DEFAULT_SENTIMENT_LABELS = [
+    "Negative",
+    "Positive",
+    "Neutral",
+    "Mixed",
+    "Unknown",
+    "Error",
+    "Not Applicable",
+]
+
+
+def get_sentiment_model():
+    """
+    Return the (tokenizer, model) pair of the sequence-classification model at
+    SENTIMENT_MODEL_PATH, loading it on first use.
+
+    This is a small distilled classifier with real class logits, separate
+    from the seq2seq summarization model.
+    """
+    model_path = os.getenv("SENTIMENT_MODEL_PATH")
+    if model_path is None:
+        raise ValueError("SENTIMENT_MODEL_PATH environment variable is not set.")
+    return get_model_registry().get(
+        f"sentiment:{model_path}:{_model_variant()}",
+        lambda: load_model(
+            "AutoModelForSequenceClassification", model_path, "classification"
+        ),
+    )
+
 
+def _map_model_labels(model, sentiment_labels):
+    # Match the model's own label names (e.g. "NEGATIVE", "positive") to the
+    # configured labels; anything unrecognised becomes "Unknown".
+    by_name = {label.lower(): label for label in sentiment_labels}
+    return [
+        by_name.get(model.config.id2label[i].lower(), "Unknown")
+        for i in range(model.config.num_labels)
+    ]
 
-def summarize_important_emails(mail):
+
+def score_sentiment(texts):
+    """
+    Classify texts in length-bucketed batches.
+
+    Logits are divided by "sentiment_temperature" before the softmax so the
+    confidences can be calibrated per model. Predictions whose confidence is
+    below "sentiment_neutral_threshold" are reported as "Neutral".
+
+    Returns:
+        list: (label, confidence) per text, in the order of texts.
+    """
+    if not texts:
+        return []
+
+    import torch
+
+    configure_inference_threads()
+    tokenizer, model = get_sentiment_model()
+    sentiment_labels = config.get("sentiment_labels", DEFAULT_SENTIMENT_LABELS)
+    model_labels = _map_model_labels(model, sentiment_labels)
+    temperature = float(config.get("sentiment_temperature", 1.0))
+    neutral_threshold = float(config.get("sentiment_neutral_threshold", 0.0))
+    batch_size = max(1, int(config.get("sentiment_batch_size", 32)))
+
+    encoded = tokenizer(
+        texts, max_length=config.get("max_email_body_length", 512), truncation=True
+    )
+    results = [None] * len(texts)
+    with _inference_lock, torch.inference_mode():
+        for indices in length_buckets(encoded, batch_size):
+            MODEL_BATCH_SIZE.labels(task="sentiment").observe(len(indices))
+            with MODEL_BATCH_SECONDS.labels(task="sentiment").time():
+                logits = model(**pad_batch(tokenizer, encoded, indices)).logits
+            probabilities = torch.softmax(logits / temperature, dim=-1)
+            confidences, predictions = probabilities.max(dim=-1)
+            for i, prediction, confidence in zip(
+                indices, predictions.tolist(), confidences.tolist()
+            ):
+                label = model_labels[prediction]
+                if confidence < neutral_threshold and "Neutral" in sentiment_labels:
+                    label = "Neutral"
+                results[i] = (label, confidence)
+    return results
+
+
+def sentiment_model_version():
+    return model_version(
+        os.getenv("SENTIMENT_MODEL_PATH"),
+        _model_variant(),
+        config.get("sentiment_labels", DEFAULT_SENTIMENT_LABELS),
+        config.get("sentiment_temperature", 1.0),
+        config.get("sentiment_neutral_threshold", 0.0),
+        config.get("max_email_body_length", 512),
+    )
+
+
+def _classify_eligible(emails):
+    # Ensure that body is a non-empty string before classifying; others get None
+    eligible = [
+        i for i, parsed in enumerate(emails) if isinstance(parsed.body, str) and parsed.body
+    ]
+    results = [None] * len(emails)
+    for i, result in zip(eligible, score_sentiment([emails[i].body for i in eligible])):
+        results[i] = list(result)
+    return results
+
+
+def classify_email_sentiment(emails, cache=None):
+    results = cached_results(
+        cache, "sentiment", sentiment_model_version(), emails, _classify_eligible
+    )
+    scored = []
+    for parsed, result in zip(emails, results):
+        if result is not None:
+            label, confidence = result
+            logging.info(
+                f"Sentiment of email '{parsed.subject}': {label} ({confidence:.2f})"
+            )
+            scored.append((label, confidence))
+    return scored
+
+
+def _enabled_versions():
+    versions = {}
+    if not config.get("skip_summarization", False):
+        versions["summary"] = summary_model_version()
+    if not config.get("skip_sentiment_analysis", False):
+        versions["sentiment"] = sentiment_model_version()
+    return versions
+
+
+def _finish_run(cache):
+    if cache is None:
+        return
+    removed = cache.evict()
+    stats = cache.stats()
+    logging.info(
+        f"Result cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+        f"{stats['skipped_fetches']} fetch(es) skipped, {stats['entries']} "
+        f"entries, {removed} evicted."
+    )
+
+
+def summarize_important_emails(mail, emails=None):
     if config.get("skip_summarization", False):
         logging.info("Summarization skipped as per configuration.")
         return
 
     try:
-        mail.select("inbox")
-        status, response = mail.search(None, "UNSEEN")
-        unread_msg_nums = response[0].split() if response[0] else []
-
-        for e_id in unread_msg_nums:
-            _, msg_data = mail.fetch(e_id, "(RFC822)")
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    msg = convert_to_email_message(
-                        msg
-                    )  # Convert the msg to EmailMessage
-                    subject = msg["Subject"]
-                    body = get_email_body(msg, content_type="text/plain")  # Function to extract the plain text email body
-                    html_body = get_email_body(msg, content_type="text/html")  # Function to extract the HTML email body
-
-                    # Ensure that body is a string before slicing
-                    if isinstance(body, str):
-                        # Tokenize the input
-                        inputs = tokenizer.encode(
-                            "summarize: "
-                            + body[: config.get("max_email_body_length", 512)],
-                            return_tensors="pt",
-                            max_length=config.get("max_email_body_length", 512),
-                            truncation=True,
-                        )
-
-                        # Generate the summary
-                        summary_ids = model.generate(
-                            inputs,
-                            max_length=config.get("max_summary_length", 100),
-                            num_beams=config.get("num_beams", 4),
-                            no_repeat_ngram_size=config.get("no_repeat_ngram_size", 2),
-                            early_stopping=config.get("early_stopping", True),
-                        )
-                        summary = tokenizer.decode(
-                            summary_ids[0], skip_special_tokens=True
-                        )
-
-                        logging.info(f"Summary of email '{subject}': {summary}")
+        cache = get_result_cache()
+        if emails is not None:
+            summarize_emails(emails, cache)
+            return
+        versions = {"summary": summary_model_version()}
+        for batch in iter_unread_emails(mail, cache, versions, "summary"):
+            summarize_emails(batch, cache)
+        _finish_run(cache)
     except Exception as e:
         logging.error(f"Failed to summarize important emails: {str(e)}")
 
 
-def detect_email_sentiment(mail):
+def detect_email_sentiment(mail, emails=None):
     if config.get("skip_sentiment_analysis", False):
         logging.info("Sentiment analysis skipped as per configuration.")
         return
 
     try:
-        mail.select("inbox")
-        status, response = mail.search(None, "UNSEEN")
-        unread_msg_nums = response[0].split() if response[0] else []
-
-        for e_id in unread_msg_nums:
-            _, msg_data = mail.fetch(e_id, "(RFC822)")
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    msg = convert_to_email_message(
-                        msg
-                    )  # Convert the msg to EmailMessage
-                    subject = msg["Subject"]
-                    body = get_email_body(msg)  # Function to extract the email body
-
-                    # Ensure that body is a string before tokenization
-                    if isinstance(body, str):
-                        # Tokenize the input
-                        inputs = tokenizer(
-                            body,
-                            return_tensors="pt",
-                            max_length=config.get("max_email_body_length", 512),
-                            truncation=True,
-                        )
-
-                        # Perform sentiment analysis (assuming you have a suitable classification model)
-                        outputs = model(**inputs)
-                        sentiment = outputs.logits.argmax(dim=1).item()
-
-                        sentiment_labels = config.get(
-                            "sentiment_labels",
-                            [
-                                "Negative",
-                                "Positive",
-                                "Neutral",
-                                "Mixed",
-                                "Unknown",
-                                "Error",
-                                "Not Applicable"
-                            ],
-                        )
-                        logging.info(
-                            f"Sentiment of email '{subject}': {sentiment_labels[sentiment]}"
-                        )
+        cache = get_result_cache()
+        if emails is not None:
+            classify_email_sentiment(emails, cache)
+            return
+        versions = {"sentiment": sentiment_model_version()}
+        for batch in iter_unread_emails(mail, cache, versions, "sentiment"):
+            classify_email_sentiment(batch, cache)
+        _finish_run(cache)
     except Exception as e:
         logging.error(f"Failed to detect email sentiment: {str(e)}")
 
 
+def run_nlp_pipeline(mail):
+    """
+    Fetch and parse the unread emails once and fan each batch out to the
+    summarization and sentiment consumers.
+
+    Messages whose results are all in the result cache are not fetched, so
+    a run over an unchanged inbox costs one UID SEARCH.
+    """
+    if config.get("skip_summarization", False) and config.get(
+        "skip_sentiment_analysis", False
+    ):
+        logging.info("All NLP tasks skipped as per configuration.")
+        return
+
+    summarize = not config.get("skip_summarization", False)
+    classify = not config.get("skip_sentiment_analysis", False)
+    try:
+        cache = get_result_cache()
+        for batch in iter_unread_emails(mail, cache, _enabled_versions()):
+            # Failures end the run here, before iter_unread_emails checkpoints
+            # the batch, so the next run retries it
+            if summarize:
+                summarize_emails(batch, cache)
+            if classify:
+                classify_email_sentiment(batch, cache)
+        _finish_run(cache)
+    except Exception as e:
+        logging.error(f"Failed to run the NLP email pipeline: {str(e)}")
+
+
 def get_email_body(msg, content_type="text/plain"):
-    if isinstance(msg, EmailMessage):
-        if msg.is_multipart():
-            parts = []
-            for part in msg.iter_parts():
-                if part.get_content_type() == content_type:
-                    payload = part.get_payload(decode=True)
-                    if isinstance(payload, bytes):
-                        payload = payload.decode("utf-8", errors="replace")
-                    parts.append(payload)
-            return "\n".join(parts)
-        else:
-            payload = msg.get_payload(decode=True)
-            return (
-                payload.decode("utf-8", errors="replace")
-                if isinstance(payload, bytes)
-                else payload
-            )
-    else:
-        raise TypeError(
-            f"msg is not an instance of EmailMessage, actual type: {type(msg).__name__}"
-        )
+    """
+    Return the inline parts of content_type in msg, decoded and joined, or
+    "" if there are none. Nested multiparts are walked at any depth.
+    """
+    maintype, subtype = content_type.split("/")
+    return "\n".join(
+        decode_part(part)
+        for part in iter_text_parts(msg)
+        if part.get_content_subtype() == subtype and maintype == "text"
+    )
 
 
 # Example usage
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Defaults for the "result_cache" config block
+DEFAULT_CACHE_PATH = "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management/result_cache.sqlite3"
+DEFAULT_MAX_AGE_DAYS = 30
+DEFAULT_MAX_ENTRIES = 50000
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS results (
+    kind TEXT NOT NULL,
+    message_key TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (kind, message_key, body_hash, model_version)
+);
+CREATE INDEX IF NOT EXISTS results_last_used_idx ON results (last_used_at);
+CREATE INDEX IF NOT EXISTS results_kind_created_idx ON results (kind, created_at);
+
+CREATE TABLE IF NOT EXISTS message_uids (
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    message_key TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    last_used_at REAL NOT NULL,
+    PRIMARY KEY (mailbox, uidvalidity, uid)
+);
+"""
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def body_hash(body):
+    return hashlib.sha256((body or "").encode("utf-8", errors="replace")).hexdigest()
+
+
+def model_version(*parts):
+    """
+    Fingerprint everything that affects a result (model path, variant,
+    generation settings...), so changing any of it misses the cache.
+    """
+    encoded = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def _chunks(values):
+    values = list(values)
+    for start in range(0, len(values), _QUERY_CHUNK):
+        yield values[start : start + _QUERY_CHUNK]
+
+
+class ResultCache:
+    """
+    Persistent cache of per-message NLP results in a local SQLite file.
+
+    A result is stored under (kind, message key, body hash, model version),
+    where the message key is the Message-ID. A changed body or a new model
+    or configuration therefore misses instead of returning a stale result.
+
+    IMAP UIDs are immutable within a UIDVALIDITY. The cache also records
+    which message each UID held, so a message whose results are all cached
+    can be skipped before its body is fetched.
+    """
+
+    def __init__(self, path, max_age_days=DEFAULT_MAX_AGE_DAYS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.skipped_fetches = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.commit()
+
+    def get_many(self, kind, version, keys):
+        """
+        Look up cached results.
+
+        Args:
+            keys (Iterable[tuple]): (message_key, body_hash) pairs.
+
+        Returns:
+            dict: {(message_key, body_hash): result} for the cached keys.
+        """
+        keys = set(keys)
+        found = {}
+        now = time.time()
+        with self._lock:
+            for chunk in _chunks(keys):
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT message_key, body_hash, result FROM results "
+                    f"WHERE kind = ? AND model_version = ? "
+                    f"AND message_key IN ({placeholders})",
+                    [kind, version] + [message_key for message_key, _ in chunk],
+                ).fetchall()
+                for message_key, hashed, result in rows:
+                    if (message_key, hashed) in keys:
+                        found[(message_key, hashed)] = json.loads(result)
+            self._conn.executemany(
+                "UPDATE results SET last_used_at = ? WHERE kind = ? "
+                "AND message_key = ? AND body_hash = ? AND model_version = ?",
+                [(now, kind, message_key, hashed, version) for message_key, hashed in found],
+            )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, kind, version, items):
+        """
+        Store results given as ((message_key, body_hash), result) pairs.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (kind, message_key, hashed, version, json.dumps(result), now, now)
+                    for (message_key, hashed), result in items
+                ],
+            )
+            self._conn.commit()
+
+    def remember_uids(self, mailbox, uidvalidity, entries):
+        """
+        Record which message each UID holds, as (uid, message_key, body_hash).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO message_uids VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (mailbox, uidvalidity, uid, message_key, hashed, now)
+                    for uid, message_key, hashed in entries
+                ],
+            )
+            self._conn.commit()
+
+    def completed_uids(self, mailbox, uidvalidity, uids, versions):
+        """
+        Return the UIDs whose message already has a result for every kind.
+
+        Args:
+            versions (dict): {kind: model version} of the results required.
+        """
+        if not versions:
+            return set()
+        completed = set()
+        now = time.time()
+        required = len(versions)
+        kind_filter = " OR ".join("(r.kind = ? AND r.model_version = ?)" for _ in versions)
+        kind_params = [value for item in versions.items() for value in item]
+        with self._lock:
+            for chunk in _chunks(uids):
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT u.uid FROM message_uids u JOIN results r "
+                    f"ON r.message_key = u.message_key AND r.body_hash = u.body_hash "
+                    f"WHERE u.mailbox = ? AND u.uidvalidity = ? "
+                    f"AND u.uid IN ({placeholders}) AND ({kind_filter}) "
+                    f"GROUP BY u.uid HAVING COUNT(DISTINCT r.kind) = ?",
+                    [mailbox, uidvalidity] + list(chunk) + kind_params + [required],
+                ).fetchall()
+                completed.update(uid for (uid,) in rows)
+            self._conn.executemany(
+                "UPDATE message_uids SET last_used_at = ? "
+                "WHERE mailbox = ? AND uidvalidity = ? AND uid = ?",
+                [(now, mailbox, uidvalidity, uid) for uid in completed],
+            )
+            self._conn.commit()
+            self.hits += len(completed) * required
+            self.skipped_fetches += len(completed)
+        return completed
+
+    def recent_results(self, kind, limit=10, version=None):
+        """
+        Return the newest results of a kind, newest first.
+
+        Args:
+            version (str): Only results of this model version; any version
+                when None.
+
+        Returns:
+            list: Dicts with message_key, result, model_version and
+            created_at.
+        """
+        query = (
+            "SELECT message_key, result, model_version, created_at FROM results "
+            "WHERE kind = ?"
+        )
+        params = [kind]
+        if version is not None:
+            query += " AND model_version = ?"
+            params.append(version)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [
+            {
+                "message_key": message_key,
+                "result": json.loads(result),
+                "model_version": row_version,
+                "created_at": created_at,
+            }
+            for message_key, result, row_version, created_at in rows
+        ]
+
+    def evict(self):
+        """
+        Drop entries unused for max_age, then the least recently used beyond
+        max_entries.
+
+        Returns:
+            int: The number of results removed.
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM results WHERE last_used_at < ?", (cutoff,)
+            ).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM results WHERE rowid IN ("
+                "SELECT rowid FROM results ORDER BY last_used_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM message_uids WHERE last_used_at < ?", (cutoff,)
+            )
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped_fetches": self.skipped_fetches,
+            "entries": entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
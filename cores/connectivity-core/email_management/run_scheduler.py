@@ -1,40 +1,14 @@
-import os
-import schedule
-import time
 import logging
 
-# Setup logging
-log_file = (
-    "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/logs/email_management.log"
-)
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
+# email_management configures logging for the worker on import
+from email_worker import main
 
-logging.basicConfig(
-    filename=log_file,
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-
-
-def run_email_management():
+# The worker runs the email tasks in-process on the cron schedules from the
+# "worker" block of config.json (by default 12am, 6am, 12pm and 6pm) and
+# processes new mail between runs through IMAP IDLE.
+if __name__ == "__main__":
     try:
-        # Run the email_management.py script
-        import subprocess
-        subprocess.run(["python3", "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management.py"])
-        
-        logging.info("Ran email_management.py successfully.")
+        main()
     except Exception as e:
-        logging.error(f"Failed to run email_management.py: {str(e)}")
-
-
-# Schedule the tasks to run at 12am, 6am, 12pm, and 6pm
-schedule.every().day.at("00:00").do(run_email_management)
-schedule.every().day.at("06:00").do(run_email_management)
-schedule.every().day.at("12:00").do(run_email_management)
-schedule.every().day.at("18:00").do(run_email_management)
-
-# Keep the script running
-while True:
-    schedule.run_pending()
-    time.sleep(5)
+        logging.error(f"Email worker exited with an error: {str(e)}")
+        raise
@@ -0,0 +1,309 @@
+"""
+Declarative email sorting rules.
+
+Rules live in config.json under "custom_sorting_rules" as a list of objects,
+each with a "label" and one or more conditions. All conditions of a rule must
+hold; matching is case-insensitive.
+
+    {"label": "Shopping", "subject_contains": ["order confirmation", "purchase"]}
+    {"label": "Work", "from_contains": ["@example.com"]}
+    {"label": "Alerts", "subject_regex": "^\\[alert\\]"}
+    {"label": "Boss", "all": [{"from_contains": ["boss@"]},
+                              {"not": {"subject_contains": ["newsletter"]}}]}
+
+Conditions:
+    subject_contains / from_contains / contains: list of keywords; true if any
+        keyword occurs in the subject, the sender, or either.
+    subject_regex / from_regex: a regular expression searched in that field.
+    all / any: a list of nested conditions.
+    not: a single nested condition.
+
+Every keyword of every rule is compiled into one Aho-Corasick automaton, so a
+message is classified with one pass over its subject and one over its sender
+however many rules there are. Rules made only of keywords are resolved straight
+from the keyword hits; the rest are only evaluated when they can match.
+"""
+
+import logging
+import re
+from collections import deque
+
+DEFAULT_SORTING_RULES = [
+    {"label": "Invoices", "subject_contains": ["invoice"]},
+    {"label": "Newsletters", "subject_contains": ["newsletter"]},
+    {"label": "Shopping", "subject_contains": ["order confirmation", "purchase"]},
+    {"label": "Shipping", "subject_contains": ["shipment", "tracking"]},
+    {"label": "Gaming", "subject_contains": ["game", "gaming"]},
+    {"label": "Promotions", "subject_contains": ["sale", "discount"]},
+    {"label": "Subscriptions", "subject_contains": ["subscription", "renewal"]},
+    {"label": "Support", "subject_contains": ["support", "help"]},
+    {"label": "Social", "subject_contains": ["social", "friend request"]},
+    {"label": "Security", "subject_contains": ["security alert", "password reset"]},
+]
+
+_KEYWORD_FIELDS = {
+    "subject_contains": ("subject",),
+    "from_contains": ("from",),
+    "contains": ("subject", "from"),
+}
+_REGEX_FIELDS = {"subject_regex": "subject", "from_regex": "from"}
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton returning the IDs of every keyword found in a text.
+    """
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        for keyword_id, keyword in enumerate(keywords):
+            self._add(keyword, keyword_id)
+        self._build_failure_links()
+
+    def _add(self, keyword, keyword_id):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+        self._output[state].add(keyword_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def search(self, text):
+        found = set()
+        state = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+class SortingRules:
+    """
+    A compiled set of sorting rules. Use compile_sorting_rules to build one.
+    """
+
+    def __init__(self, labels, automaton, keyword_labels, complex_rules):
+        self.labels = labels
+        self._automaton = automaton
+        self._keyword_labels = keyword_labels
+        self._complex_rules = complex_rules
+
+    def match(self, subject, from_):
+        """
+        Return every label whose rule matches, in rule order.
+        """
+        subject = (subject or "").lower()
+        from_ = (from_ or "").lower()
+        hits = {
+            "subject": self._automaton.search(subject),
+            "from": self._automaton.search(from_),
+        }
+        texts = {"subject": subject, "from": from_}
+
+        matched = set()
+        for field, keyword_ids in hits.items():
+            for keyword_id in keyword_ids:
+                matched |= self._keyword_labels.get((field, keyword_id), set())
+
+        for label, triggers, condition in self._complex_rules:
+            if label in matched:
+                continue
+            if triggers is not None and not any(
+                keyword_id in hits[field] for field, keyword_id in triggers
+            ):
+                continue
+            if condition(hits, texts):
+                matched.add(label)
+
+        return [label for label in self.labels if label in matched]
+
+
+class _RuleCompiler:
+    def __init__(self):
+        self.keywords = []
+        self._keyword_ids = {}
+
+    def keyword_id(self, keyword):
+        keyword = keyword.lower()
+        if keyword not in self._keyword_ids:
+            self._keyword_ids[keyword] = len(self.keywords)
+            self.keywords.append(keyword)
+        return self._keyword_ids[keyword]
+
+    def simple_atoms(self, condition):
+        """Return [(field, keyword_id)] if condition is only keyword lists."""
+        if not condition or any(key not in _KEYWORD_FIELDS for key in condition):
+            return None
+        atoms = []
+        for key, keywords in condition.items():
+            for keyword in self._keywords(key, keywords):
+                atoms.extend(
+                    (field, self.keyword_id(keyword)) for field in _KEYWORD_FIELDS[key]
+                )
+        return atoms
+
+    def compile(self, condition):
+        """
+        Compile a condition into (predicate, triggers).
+
+        triggers is the set of (field, keyword_id) atoms of which at least one
+        must hit for the predicate to be true, or None when that cannot be
+        known ahead of time (regexes and negations).
+        """
+        if not isinstance(condition, dict) or not condition:
+            raise ValueError(f"Invalid sorting rule condition: {condition!r}")
+
+        parts = []
+        for key, value in condition.items():
+            if key in _KEYWORD_FIELDS:
+                atoms = frozenset(
+                    (field, self.keyword_id(keyword))
+                    for keyword in self._keywords(key, value)
+                    for field in _KEYWORD_FIELDS[key]
+                )
+                parts.append(
+                    (
+                        lambda hits, texts, atoms=atoms: any(
+                            keyword_id in hits[field] for field, keyword_id in atoms
+                        ),
+                        set(atoms),
+                    )
+                )
+            elif key in _REGEX_FIELDS:
+                pattern = re.compile(value, re.IGNORECASE)
+                field = _REGEX_FIELDS[key]
+                parts.append(
+                    (
+                        lambda hits, texts, pattern=pattern, field=field: bool(
+                            pattern.search(texts[field])
+                        ),
+                        None,
+                    )
+                )
+            elif key in ("all", "any"):
+                if not isinstance(value, list) or not value:
+                    raise ValueError(f"'{key}' must be a non-empty list of conditions")
+                children = [self.compile(child) for child in value]
+                predicates = [predicate for predicate, _ in children]
+                if key == "all":
+                    known = [triggers for _, triggers in children if triggers is not None]
+                    # Any one child's triggers are required for the conjunction
+                    triggers = min(known, key=len) if known else None
+                    parts.append(
+                        (
+                            lambda hits, texts, predicates=predicates: all(
+                                predicate(hits, texts) for predicate in predicates
+                            ),
+                            triggers,
+                        )
+                    )
+                else:
+                    unknown = any(triggers is None for _, triggers in children)
+                    triggers = (
+                        None
+                        if unknown
+                        else set().union(*(triggers for _, triggers in children))
+                    )
+                    parts.append(
+                        (
+                            lambda hits, texts, predicates=predicates: any(
+                                predicate(hits, texts) for predicate in predicates
+                            ),
+                            triggers,
+                        )
+                    )
+            elif key == "not":
+                predicate, _ = self.compile(value)
+                parts.append(
+                    (lambda hits, texts, predicate=predicate: not predicate(hits, texts), None)
+                )
+            else:
+                raise ValueError(f"Unknown sorting rule condition '{key}'")
+
+        if len(parts) == 1:
+            return parts[0]
+        predicates = [predicate for predicate, _ in parts]
+        known = [triggers for _, triggers in parts if triggers is not None]
+        return (
+            lambda hits, texts: all(predicate(hits, texts) for predicate in predicates),
+            min(known, key=len) if known else None,
+        )
+
+    @staticmethod
+    def _keywords(key, keywords):
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        if not isinstance(keywords, list) or not all(
+            isinstance(keyword, str) and keyword for keyword in keywords
+        ):
+            raise ValueError(f"'{key}' must be a keyword or a list of keywords")
+        return keywords
+
+
+def compile_sorting_rules(rules):
+    """
+    Compile declarative rules into a SortingRules matcher.
+
+    Raises:
+        ValueError: If a rule is malformed.
+    """
+    compiler = _RuleCompiler()
+    labels = []
+    keyword_labels = {}
+    complex_rules = []
+
+    for order, rule in enumerate(rules):
+        if not isinstance(rule, dict) or not isinstance(rule.get("label"), str):
+            raise ValueError(f"Sorting rule {order} needs a 'label': {rule!r}")
+        label = rule["label"]
+        condition = {key: value for key, value in rule.items() if key != "label"}
+        if label not in labels:
+            labels.append(label)
+
+        atoms = compiler.simple_atoms(condition) if len(condition) == 1 else None
+        if atoms is not None:
+            for atom in atoms:
+                keyword_labels.setdefault(atom, set()).add(label)
+        else:
+            predicate, triggers = compiler.compile(condition)
+            complex_rules.append((label, triggers, predicate))
+
+    return SortingRules(
+        labels, KeywordAutomaton(compiler.keywords), keyword_labels, complex_rules
+    )
+
+
+def load_sorting_rules(config):
+    """
+    Compile the rules from config["custom_sorting_rules"], falling back to
+    DEFAULT_SORTING_RULES when they are missing or invalid.
+    """
+    rules = config.get("custom_sorting_rules") or DEFAULT_SORTING_RULES
+    try:
+        return compile_sorting_rules(rules)
+    except (ValueError, re.error) as e:
+        logging.error(f"Invalid custom_sorting_rules, using the defaults: {str(e)}")
+        return compile_sorting_rules(DEFAULT_SORTING_RULES)
@@ -0,0 +1,194 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from imap_utils import parse_uid_search
+
+DEFAULT_SYNC_STATE_PATH = "/home/ncacord/N.E.X.U.S.-Server/cores/connectivity-core/email_management/sync_state.sqlite3"
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS mailbox_sync (
+    account TEXT NOT NULL,
+    mailbox TEXT NOT NULL,
+    consumer TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL,
+    highestmodseq INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (account, mailbox, consumer)
+);
+"""
+
+
+class SyncState:
+    """
+    Per-mailbox sync watermarks in a local SQLite file.
+
+    Each consumer (e.g. "sort", "nlp") keeps its own watermark for an
+    (account, mailbox): the UIDVALIDITY it was recorded under, the highest
+    UID processed and the HIGHESTMODSEQ seen at the end of its last
+    complete run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._conn.commit()
+
+    def get(self, account, mailbox, consumer):
+        """
+        Returns:
+            tuple: (uidvalidity, last_uid, highestmodseq), or None if the
+            mailbox has never been synced by this consumer.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT uidvalidity, last_uid, highestmodseq FROM mailbox_sync "
+                "WHERE account = ? AND mailbox = ? AND consumer = ?",
+                (account, mailbox, consumer),
+            ).fetchone()
+
+    def save(self, account, mailbox, consumer, uidvalidity, last_uid, highestmodseq):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mailbox_sync VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (account, mailbox, consumer, uidvalidity, last_uid, highestmodseq, time.time()),
+            )
+            self._conn.commit()
+
+
+_sync_state = None
+_sync_state_lock = threading.Lock()
+
+
+def get_sync_state(config):
+    """Return the process-wide SyncState at config["sync_state_path"]."""
+    global _sync_state
+    with _sync_state_lock:
+        if _sync_state is None:
+            _sync_state = SyncState(config.get("sync_state_path", DEFAULT_SYNC_STATE_PATH))
+        return _sync_state
+
+
+def default_account():
+    return os.getenv("EMAIL_USER") or "default"
+
+
+def account_of(mail):
+    """Name of the account a connection belongs to."""
+    return getattr(mail, "account_name", None) or default_account()
+
+
+def _response_code(mail, code):
+    _, data = mail.response(code)
+    return int(data[-1]) if data and data[-1] else None
+
+
+class MailboxSync:
+    """
+    One incremental pass over a mailbox for one consumer.
+
+    begin() selects the mailbox (with CONDSTORE where the server supports
+    it) and compares UIDVALIDITY with the stored watermark; a change means
+    the old UIDs are meaningless, so the consumer starts over. new_uids()
+    then only returns messages above the watermark, and changed_uids() the
+    older messages whose MODSEQ moved since the last complete run.
+
+    Callers process UIDs in ascending chunks and call checkpoint() after
+    each, so a crash resumes after the last finished chunk. finish() records
+    the end of a complete run.
+    """
+
+    def __init__(self, state, consumer, mailbox="INBOX", account=None):
+        self.state = state
+        self.consumer = consumer
+        self.mailbox = mailbox
+        self.account = account
+        self.uidvalidity = None
+        self.uidnext = None
+        self.highestmodseq = None
+        self.last_uid = 0
+        self.last_modseq = None
+
+    def begin(self, mail):
+        self.account = self.account or account_of(mail)
+        condstore = "CONDSTORE" in mail.capabilities
+        target = f"{self.mailbox} (CONDSTORE)" if condstore else self.mailbox
+        status, _ = mail.select(target)
+        if status != "OK":
+            raise RuntimeError(f"Failed to select {self.mailbox}")
+        self.uidvalidity = _response_code(mail, "UIDVALIDITY") or 0
+        self.uidnext = _response_code(mail, "UIDNEXT")
+        self.highestmodseq = _response_code(mail, "HIGHESTMODSEQ") if condstore else None
+
+        stored = self.state.get(self.account, self.mailbox, self.consumer)
+        if stored and stored[0] == self.uidvalidity:
+            self.last_uid, self.last_modseq = stored[1], stored[2]
+        else:
+            if stored:
+                logging.warning(
+                    f"UIDVALIDITY of {self.mailbox} changed; "
+                    f"resyncing it for {self.consumer}."
+                )
+            self.last_uid, self.last_modseq = 0, None
+        return self
+
+    def new_uids(self, mail, criteria=None):
+        """
+        Return the UIDs above the watermark, optionally narrowed by extra
+        SEARCH criteria such as "UNSEEN", in ascending order.
+        """
+        query = f"UID {self.last_uid + 1}:*"
+        if criteria:
+            query = f"{query} {criteria}"
+        status, response = mail.uid("SEARCH", None, query)
+        if status != "OK":
+            raise RuntimeError(f"Failed to search {self.mailbox} for new messages")
+        # "n:*" always matches the newest message, even when it is below n
+        return sorted(uid for uid in parse_uid_search(response) if uid > self.last_uid)
+
+    def changed_uids(self, mail, criteria=None):
+        """
+        Return UIDs at or below the watermark whose MODSEQ is newer than the
+        last complete run, or [] without CONDSTORE or a previous run.
+        """
+        if not self.last_uid or self.last_modseq is None or self.highestmodseq is None:
+            return []
+        if self.highestmodseq <= self.last_modseq:
+            return []
+        query = f"UID 1:{self.last_uid} MODSEQ {self.last_modseq + 1}"
+        if criteria:
+            query = f"{query} {criteria}"
+        status, response = mail.uid("SEARCH", None, query)
+        if status != "OK":
+            raise RuntimeError(f"Failed to search {self.mailbox} for changed messages")
+        return sorted(parse_uid_search(response))
+
+    def checkpoint(self, uid):
+        """Record that every new UID up to uid has been processed."""
+        if uid > self.last_uid:
+            self.last_uid = uid
+            self.state.save(
+                self.account, self.mailbox, self.consumer,
+                self.uidvalidity, self.last_uid, self.last_modseq,
+            )
+
+    def finish(self):
+        """
+        Record a complete run: everything below UIDNEXT at select time has
+        been seen, and changes up to HIGHESTMODSEQ have been handled.
+        """
+        if self.uidnext:
+            self.last_uid = max(self.last_uid, self.uidnext - 1)
+        if self.highestmodseq is not None:
+            self.last_modseq = self.highestmodseq
+        self.state.save(
+            self.account, self.mailbox, self.consumer,
+            self.uidvalidity, self.last_uid, self.last_modseq,
+        )
@@ -0,0 +1,44 @@
+import os
+
+# Root of the N.E.X.U.S.-Server checkout on the host
+NEXUS_ROOT = "/home/ncacord/N.E.X.U.S.-Server"
+
+
+def database_settings():
+    """
+    Return the PostgreSQL connection settings from the loaded environment.
+
+    The server and each core load their own .env file before calling this, so
+    the values are read at call time rather than at import time.
+
+    Returns:
+        dict: Keyword arguments accepted by both psycopg2 and asyncpg.
+    """
+    port = os.getenv("DB_PORT")
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": int(port) if port else None,
+        "database": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD"),
+    }
+
+
+def database_pool_settings():
+    """
+    Return the connection pool sizing and health check settings.
+
+    Returns:
+        dict: Keyword arguments accepted by the pools in shared.infrastructure.
+    """
+    return {
+        "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+        "acquire_timeout": float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "10")),
+        "health_check_interval": float(
+            os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")
+        ),
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100")),
+        # Seconds; 0 leaves statements unbounded
+        "statement_timeout": float(os.getenv("DB_STATEMENT_TIMEOUT", "0")),
+    }
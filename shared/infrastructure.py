@@ -0,0 +1,624 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+from shared.config import database_pool_settings, database_settings
+from shared.metrics import REGISTRY, histogram, render_samples
+
+logger = logging.getLogger("infrastructure_logger")
+
+DEFAULT_POOL_NAME = "nexus"
+
+POOL_ACQUIRE_SECONDS = histogram(
+    "nexus_db_pool_acquire_seconds",
+    "Time spent waiting for a pooled database connection.",
+    ["pool", "kind"],
+)
+EXECUTOR_CALL_SECONDS = histogram(
+    "nexus_db_executor_call_seconds",
+    "Time from submitting a blocking database call to its result, including "
+    "the wait for a free thread.",
+    ["executor"],
+)
+
+
+class PoolMetrics:
+    """
+    Thread-safe usage counters for a single connection pool.
+    """
+
+    def __init__(self, pool_name="", kind="sync"):
+        self._lock = threading.Lock()
+        self._wait_histogram = POOL_ACQUIRE_SECONDS.labels(pool=pool_name, kind=kind)
+        self.connections_created = 0
+        self.acquisitions = 0
+        self.acquire_timeouts = 0
+        self.health_check_failures = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.total_wait_seconds = 0.0
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_acquire(self, waited):
+        self._wait_histogram.observe(waited)
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait_seconds += waited
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def record_release(self):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connections_created": self.connections_created,
+                "acquisitions": self.acquisitions,
+                "acquire_timeouts": self.acquire_timeouts,
+                "health_check_failures": self.health_check_failures,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "total_wait_seconds": self.total_wait_seconds,
+            }
+
+
+class _CountingConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that reports every new physical connection."""
+
+    def __init__(self, metrics, *args, **kwargs):
+        self._metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        self._metrics.increment("connections_created")
+        return conn
+
+
+class DatabasePool:
+    """
+    Blocking psycopg2 connection pool shared by the server and the cores.
+
+    Callers borrow connections with getconn()/putconn() or the connection()
+    context manager. Borrowing blocks for up to acquire_timeout seconds when
+    every connection is in use instead of failing immediately, and a
+    connection that has been idle longer than health_check_interval is
+    checked with SELECT 1 before it is handed out.
+    """
+
+    def __init__(
+        self,
+        name,
+        min_size=1,
+        max_size=10,
+        acquire_timeout=10.0,
+        health_check_interval=30.0,
+        statement_cache_size=100,
+        statement_timeout=None,
+        **connect_kwargs,
+    ):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        # psycopg2 has no client-side statement cache; the setting is accepted
+        # so both pool flavours share one configuration.
+        self.statement_cache_size = statement_cache_size
+        self.statement_timeout = statement_timeout
+        self.connect_kwargs = {
+            key: value for key, value in connect_kwargs.items() if value is not None
+        }
+        if statement_timeout:
+            # The server aborts any statement running longer than this
+            self.connect_kwargs["options"] = (
+                f"-c statement_timeout={int(statement_timeout * 1000)}"
+            )
+        self.metrics = PoolMetrics(name, "sync")
+        self._pool = None
+        self._open_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+
+    def open(self):
+        if self._pool is None:
+            with self._open_lock:
+                if self._pool is None:
+                    self._pool = _CountingConnectionPool(
+                        self.metrics,
+                        self.min_size,
+                        self.max_size,
+                        **self.connect_kwargs,
+                    )
+                    logger.info(
+                        f"Database pool '{self.name}' opened "
+                        f"(min={self.min_size}, max={self.max_size})"
+                    )
+        return self._pool
+
+    def getconn(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self.metrics.increment("acquire_timeouts")
+            raise pool.PoolError(
+                f"Timed out after {self.acquire_timeout}s waiting for a connection "
+                f"from pool '{self.name}'"
+            )
+        try:
+            conn = self._checked_connection(self.open())
+        except Exception:
+            self._slots.release()
+            raise
+        self.metrics.record_acquire(time.monotonic() - started)
+        return conn
+
+    def putconn(self, conn, close=False):
+        try:
+            if conn.closed:
+                close = True
+            elif conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # Never hand the next borrower a connection mid-transaction
+                conn.rollback()
+        except psycopg2.Error:
+            close = True
+
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            self._slots.release()
+            self.metrics.record_release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def health_check(self):
+        """
+        Run SELECT 1 on a pooled connection.
+
+        Returns:
+            bool: True if the database answered, False otherwise.
+        """
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            return True
+        except psycopg2.Error as pe:
+            logger.error(f"Health check failed for pool '{self.name}': {str(pe)}")
+            return False
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
+            logger.info(f"Database pool '{self.name}' closed")
+
+    def _checked_connection(self, connection_pool):
+        # Each attempt either returns a healthy connection or discards a dead
+        # one, so max_size + 1 attempts always reach a fresh connection.
+        for _ in range(self.max_size + 1):
+            conn = connection_pool.getconn()
+            last_used = self._last_used.get(id(conn))
+            if (
+                not conn.closed
+                and last_used is not None
+                and time.monotonic() - last_used < self.health_check_interval
+            ):
+                return conn
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+                return conn
+            except psycopg2.Error as pe:
+                self.metrics.increment("health_check_failures")
+                logger.warning(
+                    f"Discarding unhealthy connection from pool '{self.name}': {str(pe)}"
+                )
+                self._last_used.pop(id(conn), None)
+                connection_pool.putconn(conn, close=True)
+        raise pool.PoolError(f"No healthy connection available in pool '{self.name}'")
+
+
+class AsyncDatabasePool:
+    """
+    asyncpg connection pool for code running on the event loop.
+
+    asyncpg keeps a per-connection cache of prepared statements, sized by
+    statement_cache_size, so repeated queries skip the parse/plan step.
+    """
+
+    def __init__(
+        self,
+        name,
+        min_size=1,
+        max_size=10,
+        acquire_timeout=10.0,
+        health_check_interval=30.0,
+        statement_cache_size=100,
+        statement_timeout=None,
+        **connect_kwargs,
+    ):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self.statement_timeout = statement_timeout
+        self.connect_kwargs = {
+            key: value for key, value in connect_kwargs.items() if value is not None
+        }
+        if statement_timeout:
+            self.connect_kwargs["server_settings"] = {
+                "statement_timeout": str(int(statement_timeout * 1000))
+            }
+        self.metrics = PoolMetrics(name, "async")
+        self._pool = None
+        self._open_lock = asyncio.Lock()
+
+    async def open(self):
+        if self._pool is None:
+            async with self._open_lock:
+                if self._pool is None:
+                    # Imported here so the blocking cores never need asyncpg
+                    import asyncpg
+
+                    self._pool = await asyncpg.create_pool(
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        max_inactive_connection_lifetime=self.health_check_interval
+                        * 10,
+                        init=self._on_connect,
+                        **self.connect_kwargs,
+                    )
+                    logger.info(
+                        f"Async database pool '{self.name}' opened "
+                        f"(min={self.min_size}, max={self.max_size})"
+                    )
+        return self._pool
+
+    async def _on_connect(self, conn):
+        self.metrics.increment("connections_created")
+
+    @asynccontextmanager
+    async def connection(self):
+        connection_pool = await self.open()
+        started = time.monotonic()
+        try:
+            conn = await connection_pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.increment("acquire_timeouts")
+            raise
+        self.metrics.record_acquire(time.monotonic() - started)
+        try:
+            yield conn
+        finally:
+            await connection_pool.release(conn)
+            self.metrics.record_release()
+
+    async def health_check(self):
+        """
+        Run SELECT 1 on a pooled connection.
+
+        Returns:
+            bool: True if the database answered, False otherwise.
+        """
+        try:
+            async with self.connection() as conn:
+                await conn.fetchval("SELECT 1")
+            return True
+        except Exception as e:
+            self.metrics.increment("health_check_failures")
+            logger.error(f"Health check failed for pool '{self.name}': {str(e)}")
+            return False
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            logger.info(f"Async database pool '{self.name}' closed")
+
+
+class DatabaseBusyError(RuntimeError):
+    """Raised when too many database calls are already in flight."""
+
+
+class DatabaseExecutor:
+    """
+    Bounded thread pool for running the blocking cores from the event loop.
+
+    At most max_workers calls run at once, one per pooled connection, so a
+    worker thread never waits on the pool. Further calls wait on the event
+    loop, where cancelling them is free; once max_pending calls are in
+    flight, run() fails fast with DatabaseBusyError instead of queueing
+    without bound.
+
+    A call that outlives its timeout raises asyncio.TimeoutError to the
+    caller. Python cannot interrupt the worker thread, so the pool's
+    statement_timeout is what ends the query on the server.
+    """
+
+    def __init__(self, name, max_workers=10, max_pending=100, timeout=10.0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"db-{name}"
+        )
+        self._slots = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._call_histogram = EXECUTOR_CALL_SECONDS.labels(executor=name)
+        self.calls = 0
+        self.timeouts = 0
+        self.rejections = 0
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """
+        Run func(*args, **kwargs) on a database thread and await its result.
+
+        Args:
+            timeout (float): Seconds to wait for a free thread and the call
+                together; defaults to the executor's timeout.
+        """
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop
+            self._slots = asyncio.Semaphore(self.max_workers)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejections += 1
+                raise DatabaseBusyError(
+                    f"{self._pending} database calls already in flight on executor "
+                    f"'{self.name}'"
+                )
+            self._pending += 1
+            self.calls += 1
+
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+
+        async def _run():
+            await self._slots.acquire()
+            try:
+                future = self._executor.submit(call)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is held until the thread finishes, even if the caller
+            # has given up, so no more than max_workers calls ever run
+            future.add_done_callback(lambda _: self._release_slot(loop))
+            return await asyncio.wrap_future(future)
+
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(_run(), timeout or self.timeout)
+            self._call_histogram.observe(time.perf_counter() - started)
+            return result
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            logger.warning(
+                f"Database call {getattr(func, '__name__', func)} timed out after "
+                f"{timeout or self.timeout}s on executor '{self.name}'"
+            )
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _release_slot(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            # The event loop has already closed
+            pass
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "pending": self._pending,
+                "timeouts": self.timeouts,
+                "rejections": self.rejections,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info(f"Database executor '{self.name}' shut down")
+
+
+_pools = {}
+_async_pools = {}
+_registry_lock = threading.Lock()
+_executors = {}
+
+
+def get_pool(name=DEFAULT_POOL_NAME, **overrides):
+    """
+    Return the process-wide blocking pool called name, creating it on first use.
+
+    Connection details come from shared.config unless overridden. The first
+    caller's settings win; later callers share the existing pool.
+    """
+    with _registry_lock:
+        if name not in _pools:
+            settings = {**database_pool_settings(), **database_settings(), **overrides}
+            _pools[name] = DatabasePool(name, **settings)
+        return _pools[name]
+
+
+def get_async_pool(name=DEFAULT_POOL_NAME, **overrides):
+    """
+    Return the process-wide asyncpg pool called name, creating it on first use.
+
+    The pool object is created synchronously; its connections are opened on
+    the first connection() or open() call.
+    """
+    with _registry_lock:
+        if name not in _async_pools:
+            settings = {**database_pool_settings(), **database_settings(), **overrides}
+            _async_pools[name] = AsyncDatabasePool(name, **settings)
+        return _async_pools[name]
+
+
+def get_db_executor(name=DEFAULT_POOL_NAME, **overrides):
+    """
+    Return the process-wide DatabaseExecutor called name, creating it on
+    first use with one thread per connection of the blocking pool.
+    """
+    with _registry_lock:
+        if name not in _executors:
+            settings = {
+                "max_workers": database_pool_settings()["max_size"],
+                **overrides,
+            }
+            _executors[name] = DatabaseExecutor(name, **settings)
+        return _executors[name]
+
+
+def pool_metrics():
+    """
+    Return a snapshot of the metrics of every pool in this process.
+
+    Returns:
+        dict: {"sync": {name: metrics}, "async": {name: metrics},
+        "executors": {name: metrics}}
+    """
+    with _registry_lock:
+        return {
+            "sync": {name: p.metrics.snapshot() for name, p in _pools.items()},
+            "async": {name: p.metrics.snapshot() for name, p in _async_pools.items()},
+            "executors": {name: e.snapshot() for name, e in _executors.items()},
+        }
+
+
+# (metric name, type, help, snapshot key) exported for every pool
+_POOL_SERIES = (
+    ("nexus_db_pool_in_use", "gauge", "Connections currently borrowed.", "in_use"),
+    (
+        "nexus_db_pool_max_in_use",
+        "gauge",
+        "Most connections borrowed at once.",
+        "max_in_use",
+    ),
+    (
+        "nexus_db_pool_acquisitions_total",
+        "counter",
+        "Connections handed out.",
+        "acquisitions",
+    ),
+    (
+        "nexus_db_pool_acquire_timeouts_total",
+        "counter",
+        "Borrowers that gave up waiting for a connection.",
+        "acquire_timeouts",
+    ),
+    (
+        "nexus_db_pool_connections_created_total",
+        "counter",
+        "Physical connections opened.",
+        "connections_created",
+    ),
+    (
+        "nexus_db_pool_health_check_failures_total",
+        "counter",
+        "Pooled connections discarded as unhealthy.",
+        "health_check_failures",
+    ),
+)
+
+_EXECUTOR_SERIES = (
+    ("nexus_db_executor_pending", "gauge", "Calls in flight.", "pending"),
+    ("nexus_db_executor_calls_total", "counter", "Calls submitted.", "calls"),
+    ("nexus_db_executor_timeouts_total", "counter", "Calls that timed out.", "timeouts"),
+    (
+        "nexus_db_executor_rejections_total",
+        "counter",
+        "Calls rejected because too many were in flight.",
+        "rejections",
+    ),
+)
+
+
+def _collect_pool_metrics():
+    snapshot = pool_metrics()
+    lines = []
+    for name, kind, documentation, key in _POOL_SERIES:
+        lines.extend(
+            render_samples(
+                name,
+                kind,
+                documentation,
+                [
+                    ({"pool": pool_name, "kind": pool_kind}, metrics[key])
+                    for pool_kind in ("sync", "async")
+                    for pool_name, metrics in snapshot[pool_kind].items()
+                ],
+            )
+        )
+    for name, kind, documentation, key in _EXECUTOR_SERIES:
+        lines.extend(
+            render_samples(
+                name,
+                kind,
+                documentation,
+                [
+                    ({"executor": executor_name}, metrics[key])
+                    for executor_name, metrics in snapshot["executors"].items()
+                ],
+            )
+        )
+    return lines
+
+
+REGISTRY.register_collector(_collect_pool_metrics)
+
+
+def shutdown_db_executors(wait=True):
+    with _registry_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def close_all_pools():
+    with _registry_lock:
+        for db_pool in _pools.values():
+            db_pool.close()
+        _pools.clear()
+
+
+async def close_all_async_pools():
+    with _registry_lock:
+        async_pools = list(_async_pools.values())
+        _async_pools.clear()
+    for db_pool in async_pools:
+        await db_pool.close()
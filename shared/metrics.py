@@ -0,0 +1,416 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are created once at import time and
+updated from any thread:
+
+    REQUESTS = counter("nexus_requests_total", "Requests handled.", ["cmd"])
+    REQUESTS.labels(cmd="contacts.search").inc()
+
+    LATENCY = histogram("nexus_request_seconds", "Request latency.", ["cmd"])
+    with LATENCY.labels(cmd="contacts.search").time():
+        ...
+
+render() returns every registered metric in the Prometheus text format;
+the server serves it at /metrics and the email worker with
+start_metrics_server().
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram resolution: each power of two is split into this many buckets,
+# so a bucket's upper bound overstates its values by at most 25% (HDR-style
+# log-linear buckets with a fixed relative error instead of hand-picked
+# bounds)
+SUB_BUCKETS = 4
+
+# Default histogram range in seconds: ~7.6us to 128s
+DEFAULT_LOWEST = 2.0**-17
+DEFAULT_HIGHEST = 2.0**7
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        """Return the child for one combination of label values."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self._children[()]
+
+    def _samples(self):
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            yield list(zip(self.labelnames, key)), child
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for labels, child in self._samples():
+            lines.extend(self._render_child(labels, child))
+        return lines
+
+    def _render_child(self, labels, child):
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.get())}"]
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self._value = float(value)
+
+    def get(self):
+        with self._lock:
+            return self._value
+
+
+class Counter(_Metric):
+    """A value that only goes up, such as messages received."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, such as connected clients."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled().dec(amount)
+
+    def set(self, value):
+        self._unlabelled().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, lowest, highest):
+        self._min_exponent = math.frexp(lowest)[1]
+        self._max_exponent = math.frexp(highest)[1]
+        # Bucket 0 holds values <= lowest and the last one values > highest
+        size = (self._max_exponent - self._min_exponent) * SUB_BUCKETS + 2
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+        self._lowest = lowest
+        self._highest = highest
+        self._lock = threading.Lock()
+
+    def _index(self, value):
+        if value <= self._lowest:
+            return 0
+        if value > self._highest:
+            return len(self.counts) - 1
+        mantissa, exponent = math.frexp(value)
+        # Upper bounds are inclusive, so a value on a bound belongs to the
+        # bucket below it
+        sub = math.ceil((mantissa * 2 - 1) * SUB_BUCKETS) - 1
+        return (exponent - self._min_exponent) * SUB_BUCKETS + sub + 1
+
+    def observe(self, value):
+        index = self._index(value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the seconds spent in the with block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def upper_bounds(self):
+        bounds = [self._lowest]
+        for exponent in range(self._min_exponent, self._max_exponent):
+            base = 2.0 ** (exponent - 1)
+            bounds.extend(base * (1 + (sub + 1) / SUB_BUCKETS) for sub in range(SUB_BUCKETS))
+        return bounds + [math.inf]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile (0..1) from the bucket counts, to within the
+        bucket resolution.
+        """
+        counts, _, count = self.snapshot()
+        if not count:
+            return None
+        cumulative = []
+        running = 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        index = bisect.bisect_left(cumulative, q * count)
+        return self.upper_bounds()[min(index, len(counts) - 1)]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values, usually latencies in seconds.
+
+    Buckets are log-linear over [lowest, highest], so every order of
+    magnitude gets the same relative precision and no bounds need tuning.
+    lowest and highest should be powers of two.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        lowest=DEFAULT_LOWEST,
+        highest=DEFAULT_HIGHEST,
+    ):
+        self.lowest = lowest
+        self.highest = highest
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.lowest, self.highest)
+
+    def observe(self, value):
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+    def _render_child(self, labels, child):
+        counts, total, count = child.snapshot()
+        lines = []
+        running = 0
+        for bound, bucket_count in zip(child.upper_bounds(), counts):
+            running += bucket_count
+            bucket_labels = labels + [("le", _format_value(bound))]
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {running}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process.
+
+    Collectors are callables run at render time that return extra lines of
+    exposition text, for values that are cheaper to read on demand (such
+    as pool statistics) than to update on every change.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._constant_labels = ""
+        self._lock = threading.Lock()
+
+    def set_constant_labels(self, labels):
+        """
+        Add labels such as {"worker": "2"} to every sample rendered, so the
+        series of processes running the same code stay apart.
+        """
+        self._constant_labels = _format_labels(sorted(labels.items()))[1:-1]
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), **kwargs):
+        return self._get_or_create(Histogram, name, documentation, labelnames, **kwargs)
+
+    def register_collector(self, collector):
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            lines.extend(collector())
+        if self._constant_labels:
+            lines = [self._add_constant_labels(line) for line in lines]
+        return "\n".join(lines) + "\n"
+
+    def _add_constant_labels(self, line):
+        if line.startswith("#"):
+            return line
+        # Metric names cannot contain "{" or " ", so the first of them ends
+        # the name
+        end = min(
+            (index for index in (line.find("{"), line.find(" ")) if index >= 0),
+            default=len(line),
+        )
+        if line[end : end + 1] == "{":
+            rest = line[end + 1 :]
+            separator = "" if rest.startswith("}") else ","
+            return f"{line[:end]}{{{self._constant_labels}{separator}{rest}"
+        return f"{line[:end]}{{{self._constant_labels}}}{line[end:]}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), **kwargs):
+    return REGISTRY.histogram(name, documentation, labelnames, **kwargs)
+
+
+def render():
+    """Return every metric of this process in the Prometheus text format."""
+    return REGISTRY.render()
+
+
+def set_constant_labels(labels):
+    REGISTRY.set_constant_labels(labels)
+
+
+def render_samples(name, kind, documentation, samples):
+    """
+    Format one metric for a collector.
+
+    Args:
+        samples (Iterable[tuple]): (labels dict, value) pairs.
+    """
+    lines = [f"# HELP {name} {_escape(documentation)}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return lines
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are not worth a log line each
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """
+    Serve /metrics from a daemon thread, for processes without a web server.
+
+    Returns:
+        ThreadingHTTPServer: Call shutdown() on it to stop serving.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,119 @@
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+
+import psutil
+import torch
+
+# Make the shared package importable from the repository root
+sys.path.append("/home/ncacord/N.E.X.U.S.-Server")
+from shared.model_optimization import load_optimized
+
+SAMPLE_EMAIL = (
+    "Hi team, following up on yesterday's meeting: the quarterly report is due "
+    "on Friday and we still need the updated sales figures from the regional "
+    "offices. Please send your numbers by Wednesday so we have time to review. "
+    "Let me know if anything is blocking you. Thanks, Alex"
+)
+
+MODES = {
+    "fp32": {"enabled": False},
+    "int8": {"enabled": True, "quantize_int8": True, "torchscript": False},
+    "int8-torchscript": {"enabled": True, "quantize_int8": True, "torchscript": True},
+}
+
+
+def rss_mib():
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def run_mode(mode, args, results):
+    torch.set_num_threads(args.threads)
+    rss_start = rss_mib()
+
+    started = time.perf_counter()
+    kind = "seq2seq" if args.task == "seq2seq" else "classification"
+    model_class = (
+        "AutoModelForSeq2SeqLM"
+        if kind == "seq2seq"
+        else "AutoModelForSequenceClassification"
+    )
+    tokenizer, model = load_optimized(model_class, args.model_path, MODES[mode], kind)
+    load_seconds = time.perf_counter() - started
+
+    prefix = "summarize: " if kind == "seq2seq" else ""
+    batch = tokenizer(
+        [prefix + SAMPLE_EMAIL] * args.batch_size,
+        max_length=512,
+        truncation=True,
+        padding=True,
+        return_tensors="pt",
+    )
+
+    def infer():
+        if kind == "seq2seq":
+            model.generate(**batch, max_length=100, num_beams=args.num_beams)
+        else:
+            model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"])
+
+    latencies = []
+    with torch.inference_mode():
+        infer()  # Warm-up
+        for _ in range(args.iterations):
+            iteration_start = time.perf_counter()
+            infer()
+            latencies.append(time.perf_counter() - iteration_start)
+
+    latencies.sort()
+    results[mode] = {
+        "load_s": load_seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "emails_per_s": args.batch_size / statistics.mean(latencies),
+        "rss_mib": rss_mib() - rss_start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare fp32 and CPU-optimized inference for the email models."
+    )
+    parser.add_argument(
+        "--model-path",
+        default="/home/ncacord/N.E.X.U.S.-Server/shared/models/t5-large",
+    )
+    parser.add_argument("--task", choices=["seq2seq", "classification"], default="seq2seq")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--num-beams", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    # One process per mode keeps the RSS figures independent of each other
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for mode in args.modes:
+        if mode == "int8-torchscript" and args.task == "seq2seq":
+            continue
+        process = context.Process(target=run_mode, args=(mode, args, results))
+        process.start()
+        process.join()
+
+    print(
+        f"{'mode':<18}{'load s':>8}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'emails/s':>10}{'RSS MiB':>10}"
+    )
+    for mode in args.modes:
+        if mode in results:
+            r = results[mode]
+            print(
+                f"{mode:<18}{r['load_s']:>8.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+                f"{r['emails_per_s']:>10.1f}{r['rss_mib']:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
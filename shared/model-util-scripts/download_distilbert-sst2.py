@@ -0,0 +1,52 @@
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from pathlib import Path
+import torch
+import logging
+
+# Set up logging
+log_file = "/home/ncacord/N.E.X.U.S.-Server/shared/logs/download_distilbert-sst2.log"
+Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+logging.basicConfig(
+    filename=log_file,
+    level=logging.DEBUG,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# The sentiment classifier is small enough to always run on the CPU
+device = torch.device("cpu")
+
+# Define model directory and file names
+model_name = "distilbert-base-uncased-finetuned-sst-2-english"
+model_path = Path("/home/ncacord/N.E.X.U.S.-Server/shared/models/distilbert-sst2")
+
+# Check if the necessary model files exist
+required_files = ["config.json", "tokenizer_config.json", "model.safetensors"]
+model_files_exist = all((model_path / file).exists() for file in required_files)
+
+# Load or download the model and tokenizer
+if not model_files_exist:
+    logging.info(f"Downloading model to {model_path}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+
+    # Save as a single safetensors file so it can be memory-mapped
+    model.save_pretrained(model_path, safe_serialization=True)
+    tokenizer.save_pretrained(model_path)
+else:
+    logging.info(f"Loading model from {model_path}...")
+    tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+
+model = model.to(device).eval()
+
+# Example sentence for sentiment classification
+inputs = tokenizer("Thanks, the delivery arrived early!", return_tensors="pt").to(device)
+
+with torch.inference_mode():
+    logits = model(**inputs).logits
+label = model.config.id2label[logits.argmax(dim=-1).item()]
+logging.info(f"Predicted sentiment: {label}")
+
+# Confirm the model and tokenizer are stored in the appropriate directory
+logging.info(f"Model and tokenizer are stored in {model_path}")
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("model_registry_logger")
+
+# Default ceiling for the estimated size of all cached models, in megabytes
+DEFAULT_MEMORY_BUDGET_MB = 8192
+
+_SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def estimate_size(value):
+    """
+    Estimate the bytes held by a cached value.
+
+    Models are measured by their parameters and buffers; tuples and lists are
+    summed; anything else (e.g. tokenizers) counts as zero.
+    """
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    if hasattr(value, "parameters") and hasattr(value, "buffers"):
+        tensors = list(value.parameters()) + list(value.buffers())
+        seen = set()
+        total = 0
+        for tensor in tensors:
+            if tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+        return total
+    return 0
+
+
+class ModelRegistry:
+    """
+    Process-wide, lazily populated cache of loaded models.
+
+    Each entry is loaded by its loader on the first get() and kept until the
+    estimated size of all entries exceeds the memory budget, at which point
+    the least recently used entries are dropped. Concurrent get() calls for
+    the same name wait for a single load.
+    """
+
+    def __init__(self, memory_budget_bytes):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, loader):
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return self._entries[name][0]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                    return self._entries[name][0]
+                self.misses += 1
+
+            started = time.monotonic()
+            value = loader()
+            size = estimate_size(value)
+            logger.info(
+                f"Loaded model '{name}' ({size / 2**20:.0f} MiB) "
+                f"in {time.monotonic() - started:.1f}s"
+            )
+
+            with self._lock:
+                self._entries[name] = (value, size)
+                self._evict_over_budget(keep=name)
+            return value
+
+    def evict(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def loaded(self):
+        """Return {name: estimated bytes} for the cached entries, LRU first."""
+        with self._lock:
+            return {name: size for name, (_, size) in self._entries.items()}
+
+    def _evict_over_budget(self, keep):
+        total = sum(size for _, size in self._entries.values())
+        for name in list(self._entries):
+            if total <= self.memory_budget_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._entries.pop(name)[1]
+            logger.info(f"Evicted model '{name}' to stay within the memory budget")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """
+    Return the process-wide registry, sized by MODEL_MEMORY_BUDGET_MB.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            budget_mb = int(
+                os.getenv("MODEL_MEMORY_BUDGET_MB", str(DEFAULT_MEMORY_BUDGET_MB))
+            )
+            _registry = ModelRegistry(budget_mb * 2**20)
+        return _registry
+
+
+def load_safetensors_mmap(path):
+    """
+    Map a .safetensors file into tensors without copying the weights.
+
+    The file is mapped copy-on-write, so processes that load the same file
+    share its pages through the page cache instead of each holding a private
+    copy.
+
+    Returns:
+        dict: {tensor name: torch.Tensor} backed by the mapped file.
+    """
+    import torch
+
+    with open(path, "rb") as f:
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+
+    storage = torch.UntypedStorage.from_file(
+        str(path), shared=False, nbytes=os.path.getsize(path)
+    )
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        begin, _ = info["data_offsets"]
+        offset = data_start + begin
+        element_size = torch.empty((), dtype=dtype).element_size()
+        tensor = torch.empty(0, dtype=dtype)
+        tensor.set_(storage, offset // element_size, info["shape"])
+        tensors[name] = tensor
+    return tensors
+
+
+def load_pretrained(model_class_name, model_path, mmap_weights=True):
+    """
+    Load a Hugging Face tokenizer and model from a local directory.
+
+    With mmap_weights, a single-file model.safetensors checkpoint is mapped
+    with load_safetensors_mmap and assigned to the model in place. Checkpoints
+    that are sharded, not safetensors, or do not cover every weight fall back
+    to the regular from_pretrained.
+
+    Args:
+        model_class_name (str): A transformers Auto class, e.g.
+            "AutoModelForSeq2SeqLM".
+        model_path (str): Directory written by save_pretrained.
+
+    Returns:
+        tuple: (tokenizer, model) with the model in eval mode.
+    """
+    import transformers
+
+    model_class = getattr(transformers, model_class_name)
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_path, use_fast=True)
+
+    weights_file = os.path.join(model_path, "model.safetensors")
+    model = None
+    if mmap_weights and os.path.exists(weights_file):
+        try:
+            model = _load_mmap_model(model_class, model_path, weights_file)
+        except Exception as e:
+            logger.warning(
+                f"Memory-mapped load of {model_path} failed, loading normally: {str(e)}"
+            )
+    if model is None:
+        model = model_class.from_pretrained(model_path, low_cpu_mem_usage=True)
+
+    model.eval()
+    return tokenizer, model
+
+
+def _load_mmap_model(model_class, model_path, weights_file):
+    from transformers import AutoConfig
+    from transformers.modeling_utils import no_init_weights
+
+    state_dict = load_safetensors_mmap(weights_file)
+    with no_init_weights():
+        model = model_class.from_config(AutoConfig.from_pretrained(model_path))
+    missing, _ = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    # Tied weights (e.g. T5's shared embeddings) are stored once; anything
+    # else missing would be left uninitialised, so refuse to use the model.
+    mapped = {tensor.data_ptr() for tensor in state_dict.values()}
+    unloaded = [
+        name for name in missing if model.get_parameter(name).data_ptr() not in mapped
+    ]
+    if unloaded:
+        raise ValueError(f"checkpoint is missing {', '.join(unloaded[:5])}")
+    logger.info(f"Memory-mapped weights from {weights_file}")
+    return model
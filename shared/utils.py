@@ -0,0 +1,375 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from shared.metrics import counter
+
+# (low, high) of each field; weekday allows 7 as a second Sunday
+_CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Invalid cron field '{field}'")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A standard five-field cron expression: minute hour day month weekday.
+
+    Fields accept "*", numbers, ranges ("1-5"), lists ("0,30") and steps
+    ("*/15", "9-17/2"). Weekday 0 and 7 are Sunday. As in cron, when both
+    day and weekday are restricted a time matches if either does.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs five fields: '{expression}'")
+        self.expression = expression
+        (self.minutes, self.hours, self.days, self.months, weekdays) = (
+            _parse_cron_field(field, low, high)
+            for field, (low, high) in zip(fields, _CRON_FIELDS)
+        )
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, moment):
+        day_ok = moment.day in self.days
+        # datetime.weekday() is Monday=0; cron is Sunday=0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, after):
+        """
+        Return the first matching minute strictly after the datetime after.
+        """
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                year, month = divmod(moment.month, 12)
+                moment = moment.replace(
+                    year=moment.year + year, month=month + 1, day=1, hour=0, minute=0
+                )
+            elif not self._day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: '{self.expression}'")
+
+
+def next_run_time(schedule, after=None, jitter_seconds=0):
+    """
+    Return the next run of a CronSchedule after after (default now), delayed
+    by a random 0..jitter_seconds so many schedules do not fire together.
+    """
+    after = after or datetime.now()
+    due = schedule.next_after(after)
+    if jitter_seconds:
+        due += timedelta(seconds=random.uniform(0, jitter_seconds))
+    return due
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing rate operations per second on average
+    with bursts of up to burst.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Block until tokens are available, then take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if they are available right now, without waiting."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format each record as one JSON object per line.
+
+    Fields passed with extra= are included alongside the standard ones.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limit the records of chosen loggers.
+
+    Each sampled logger (and its children) may log burst records at once
+    and rate records per second on average; the rest are dropped, and the
+    next record let through reports how many were. Warnings and errors are
+    never dropped. Unlike random sampling, a quiet logger is never thinned
+    out and a noisy one always gets the same share.
+    """
+
+    def __init__(self, rates, burst=None):
+        super().__init__()
+        self._buckets = {
+            name: TokenBucket(rate, burst or max(1, rate)) for name, rate in rates.items()
+        }
+        self._dropped = dict.fromkeys(rates, 0)
+        self._lock = threading.Lock()
+
+    def _sampled_as(self, name):
+        while name:
+            if name in self._buckets:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        sampled = self._sampled_as(record.name)
+        if sampled is None:
+            return True
+        if not self._buckets[sampled].try_acquire():
+            with self._lock:
+                self._dropped[sampled] += 1
+            return False
+        with self._lock:
+            dropped, self._dropped[sampled] = self._dropped[sampled], 0
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+
+LOG_RECORDS_DROPPED = counter(
+    "nexus_log_records_dropped_total",
+    "Log records dropped because the logging queue was full.",
+)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never block the caller on a full queue; drop the record and count it
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def take_dropped(self):
+        """Return the records dropped since the last call and reset the count."""
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        return dropped
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keeps the traceback in exc_text so
+        # the file formatter can put it in its own field
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _LogListener(logging.handlers.QueueListener):
+    # Seconds stop() waits for room on a full queue for its sentinel
+    stop_timeout = 5.0
+
+    def __init__(self, log_queue, *handlers, source=None):
+        super().__init__(log_queue, *handlers)
+        self.source = source
+
+    def handle(self, record):
+        super().handle(record)
+        # Once the backlog has drained, say in the file itself how many
+        # records were lost while it was full
+        if self.queue.empty():
+            self.report_dropped()
+
+    def report_dropped(self):
+        dropped = self.source.take_dropped() if self.source is not None else 0
+        if dropped:
+            super().handle(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "Dropped %d log records because the logging queue was full",
+                (dropped,), None,
+            ))
+
+    def enqueue_sentinel(self):
+        # QueueListener puts the sentinel with put_nowait, which raises
+        # queue.Full at exit exactly when records are being dropped; wait
+        # for the thread to drain some of the queue instead
+        self.queue.put(self._sentinel, timeout=self.stop_timeout)
+
+
+_log_listener = None
+_log_lock = threading.Lock()
+
+
+def configure_logging(
+    log_file,
+    level=logging.INFO,
+    logger_levels=None,
+    sample_rates=None,
+    sample_burst=None,
+    max_bytes=10 * 2**20,
+    backup_count=5,
+    queue_size=10000,
+):
+    """
+    Send this process's logging through a background thread to a rotating
+    file of JSON lines.
+
+    Records are put on a bounded queue by the logging call and written by a
+    QueueListener thread, so no caller waits on disk I/O; if the writer
+    falls queue_size records behind, new records are dropped rather than
+    blocking. Only the first call in a process takes effect, like
+    logging.basicConfig, so a core imported by the server logs to the
+    server's file.
+
+    Args:
+        level: Level of the root logger.
+        logger_levels (dict): {logger name: level} overrides.
+        sample_rates (dict): {logger name: records per second} for loggers
+            to rate-limit with a SamplingFilter.
+
+    Returns:
+        QueueListener: The listener writing the file; it is stopped at exit.
+    """
+    global _log_listener
+    with _log_lock:
+        if _log_listener is not None:
+            return _log_listener
+
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        if sample_rates:
+            queue_handler.addFilter(SamplingFilter(sample_rates, sample_burst))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        for name, logger_level in (logger_levels or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        _log_listener = _LogListener(log_queue, file_handler, source=queue_handler)
+        _log_listener.start()
+        atexit.register(_stop_log_listener)
+        return _log_listener
+
+
+def _stop_log_listener():
+    # Flushes the queue; safe if the listener was already stopped
+    listener = _log_listener
+    if listener is None or listener._thread is None:
+        return
+    try:
+        listener.stop()
+    except queue.Full:
+        # The thread stopped draining the queue; give up on the remaining
+        # records rather than hang the exit
+        listener._thread = None
+    listener.report_dropped()
+
+
+def parse_logger_levels(value):
+    """
+    Parse "name=LEVEL,other=LEVEL" into {name: level} for configure_logging.
+    """
+    levels = {}
+    for item in (value or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels